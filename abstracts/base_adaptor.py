@@ -6,6 +6,63 @@ class Adaptor(ABC):
     def __init__(self):
         super(Adaptor, self).__init__()
 
+    @property
+    def status(self):
+        """ Current status of the adaptor """
+        return getattr(self, "_status", None)
+
+    @status.setter
+    def status(self, value):
+        """ Set the status and notify the listener of the transition, if any """
+        self._status = value
+        listener = getattr(self, "status_listener", None)
+        if listener:
+            listener(self, value)
+
+    def artifacts(self):
+        """ Paths of the files written by the adaptor, kept in the state of the application """
+        return []
+
+    def open(self):
+        """ Open the clients of the backend, kept for the next jobs and queries until close() """
+        pass
+
+    def close(self):
+        """ Close the clients opened by open() """
+        pass
+
+    def bind(self, template):
+        """ Work on template in the next job, keeping the open clients """
+        raise NotImplementedError
+
+    def release(self):
+        """ Drop the template and the translated data once a job is done, keeping the open clients """
+        pass
+
+    def query_cache(self):
+        """ Freshness of the cached data query() answers from, None if it reads the backend """
+        return None
+
+    def translation_inputs(self):
+        """ Paths of the files other than the template which the translation reads """
+        return []
+
+    def translation_state(self):
+        """ The result of the last translation, to be cached """
+        raise NotImplementedError
+
+    def restore_translation(self, state):
+        """ Take a cached translation state as the result of translate() """
+        raise NotImplementedError
+
+    def seed_translation(self, state):
+        """ Start the next translate() from a cached translation state, reusing what did not change """
+        raise NotImplementedError
+
+    def adopt_translation(self, adaptor):
+        """ Take the translation made by another instance as the one the next update() deploys """
+        raise NotImplementedError
+
     @abstractmethod
     def translate(self):
         pass
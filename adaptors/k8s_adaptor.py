@@ -1,18 +1,20 @@
 import os
 import subprocess
 import logging
-import shutil
-import filecmp
-import time
-import copy
+import hashlib
+import json
 
 import kubernetes.client
 import kubernetes.config
 from toscaparser.tosca_template import ToscaTemplate
 
 import utils
+import submitter_tracing as tracing
 from abstracts import base_adaptor
 from abstracts.exceptions import AdaptorCritical
+from adaptors import k8s_apply
+from adaptors import k8s_informer
+from adaptors import k8s_rollout
 
 logger = logging.getLogger("adaptors." + __name__)
 
@@ -22,8 +24,10 @@ TOSCA_TYPES = (DOCKER_CONTAINER, CONTAINER_VOLUME,
                "tosca.relationships.AttachesTo", "Kubernetes")
 
 SUPPORTED_WORKLOADS = ('Pod', 'Job', 'Deployment', 'StatefulSet', 'DaemonSet')
+UNDEPLOY_TIMEOUT = 120
 
 SWARM_PROPERTIES = ['expose']
+RESOURCE_FIELDS = ('kind', 'apiVersion', 'metadata', 'name', 'labels')
 POD_SPEC_FIELDS = ('activeDeadlineSeconds', 'affinity', 'automountServiceAccountToken', 'dnsConfig', 
                    'dnsPolicy', 'enableServiceLinks', 'hostAliases', 'hostIPC', 'hostNetwork', 'hostPID', 
                    'hostname', 'imagePullSecrets', 'initContainers', 'nodeName', 'nodeSelector', 'priority', 
@@ -62,43 +66,116 @@ class KubernetesAdaptor(base_adaptor.Adaptor):
         self.volumes = {}
         self.output = {}
         self.validate = validate
+        self.api_client = None
+        self.node_memo = {}
+        self.translated = False
         logger.info("Kubernetes Adaptor is ready.")
         self.status = "Initialised"
+
+    def open(self):
+        """ Load the kube config and open the API client, once for the life of the adaptor """
+        if self.dryrun or self.api_client is not None:
+            return
+        try:
+            self._client()
+        except Exception as e:
+            logger.warning("Could not open the Kubernetes API client: %s", e)
+
+    def close(self):
+        """ Close the connections of the API client, and stop the informers no other adaptor uses """
+        k8s_informer.release(self)
+        if self.api_client is not None:
+            self.api_client.rest_client.pool_manager.clear()
+        self.api_client = None
+
+    def bind(self, template):
+        """ Work on template in the next job, keeping the API client """
+        if template and not isinstance(template, ToscaTemplate):
+            raise AdaptorCritical("Template is not a valid TOSCAParser object")
+        self.tpl = template
+        self.manifests = []
+        self.services = []
+        self.volumes = {}
+        self.output = {}
+        self.node_memo = {}
+        self.translated = False
+
+    def release(self):
+        """ Drop the template and the manifests, keeping the API client """
+        self.bind(None)
+
+    def translation_state(self):
+        """ Manifests, services and volumes of the last translation, and its translation of each node """
+        return dict(manifests=self.manifests, services=self.services, volumes=self.volumes,
+                    nodes=self.node_memo)
+
+    def restore_translation(self, state):
+        """ Take the cached manifests as the translation and write them as translate() does """
+        self.manifests = state["manifests"]
+        self.services = state["services"]
+        self.volumes = state["volumes"]
+        self.node_memo = state.get("nodes", {})
+        self.translated = True
+        if not self.manifests:
+            logger.info("No nodes to orchestrate with Kubernetes. Do you need this adaptor?")
+            self.status = "Skipped Translation"
+            return
+        if self.validate is False:
+            utils.dump_list_yaml(self.manifests, self.manifest_path)
+        logger.info("Translation restored from cache")
+        self.status = "Translated"
+
+    def seed_translation(self, state):
+        """ Reuse the translation of the nodes of a cached translation in the next translate() """
+        self.node_memo = dict(state.get("nodes") or {})
+
+    def adopt_translation(self, adaptor):
+        """ Take the manifests translated by another instance for the next update() """
+        self.manifests = adaptor.manifests
+        self.services = adaptor.services
+        self.volumes = adaptor.volumes
+        self.node_memo = adaptor.node_memo
+        self.translated = adaptor.translated
+
+    def _client(self):
+        """ Return the API client, loading the kube config the first time """
+        if self.api_client is None:
+            kubernetes.config.load_kube_config()
+            self.api_client = kubernetes.client.ApiClient()
+        return self.api_client
+
     def translate(self, update=False):
         """ Translate the relevant sections of the ADT into a Kubernetes Manifest """
         logger.info("Translating into Kubernetes Manifests")
         self.status = "Translating..."
         tpl_translate = self.tpl
-        nodes = copy.deepcopy(tpl_translate.nodetemplates)
-        repositories = copy.deepcopy(tpl_translate.repositories)
-        
-        for node in sorted(nodes, key=lambda x: x.type, reverse=True):
-            interface = {}
-
-            kube_interface = \
-                [x for x in node.interfaces if KUBERNETES_INTERFACE in x.type]
-            for operation in kube_interface:
-                interface[operation.name] = operation.inputs or {}
-
-            if DOCKER_CONTAINER in node.type and interface:                
-                if '_' in node.name:
-                    logger.error("ERROR: Use of underscores in {} workload name prohibited".format(node.name))
-                    raise AdaptorCritical("ERROR: Use of underscores in {} workload name prohibited".format(node.name))                      
-                self._create_manifests(node, interface, repositories)
-
-            elif CONTAINER_VOLUME in node.type and interface:
-                name = node.get_property_value('name') or node.name
-                if '_' in name:
-                    logger.error("ERROR: Use of underscores in {} volume name prohibited".format(name))
-                    raise AdaptorCritical("ERROR: Use of underscores in {} volume name prohibited".format(name))
-                size = node.get_property_value('size') or '1Gi'
-
-                pv_inputs = interface.get('create', {})
-                labels = self._create_persistent_volume(name, pv_inputs, size)
-                pvc_inputs = interface.get('configure', {})
-                pvc_name = self._create_persistent_volume_claim(name, pvc_inputs, labels, size)
-
-                self.volumes.setdefault(node.name, pvc_name)
+        self.manifests = []
+        self.services = []
+        self.volumes = {}
+        # the helpers only read the templates and build new dicts, the manifests may share
+        # the values they take as they are from the inputs of the templates
+        memo = {}
+        translated = 0
+
+        for node in sorted(tpl_translate.nodetemplates, key=lambda x: x.type, reverse=True):
+            interface = _get_interface(node)
+            if not interface or not (DOCKER_CONTAINER in node.type or CONTAINER_VOLUME in node.type):
+                continue
+            key = self._node_key(node, interface)
+            if key not in self.node_memo:
+                self.node_memo[key] = self._translate_node(node, tpl_translate.repositories)
+                translated += 1
+            manifests, services, volume = memo[key] = self.node_memo[key]
+            self.manifests += manifests
+            self.services += services
+            if volume:
+                self.volumes.setdefault(node.name, volume)
+        logger.debug("%s of %s nodes translated, the others reused", translated, len(memo))
+        span = tracing.current()
+        if span:
+            span.set(nodes_translated=translated, nodes_reused=len(memo) - translated)
+        self.node_memo = memo
+        self.translated = True
 
         if not self.manifests:
             logger.info("No nodes to orchestrate with Kubernetes. Do you need this adaptor?")
@@ -109,11 +186,12 @@ class KubernetesAdaptor(base_adaptor.Adaptor):
             utils.dump_list_yaml(self.manifests, self.manifest_tmp_path)
         elif self.validate is False:
             utils.dump_list_yaml(self.manifests, self.manifest_path)
+        _trace_manifests(self.manifests, self.manifest_tmp_path if update else self.manifest_path)
 
         logger.info("Translation complete")
         self.status = "Translated"
 
-    def execute(self, update=False):
+    def execute(self):
         """ Execute """
         logger.info("Executing Kubernetes Manifests...")
         self.status = "Executing..."
@@ -124,88 +202,121 @@ class KubernetesAdaptor(base_adaptor.Adaptor):
             return
 
         if self.dryrun:
-            logger.info("DRY-RUN: kubectl creates workloads...")
+            logger.info("DRY-RUN: Kubernetes API applies workloads...")
             self.status = "DRY-RUN Deployment"
             return
-        
-        if update:
-            operation = ['kubectl', 'apply', '-n', 'default', '-f', self.manifest_path]
-        else:
-            operation = ['kubectl', 'create', '-n', 'default', '-f', self.manifest_path, '--save-config']
-        try:
-            logger.debug("Executing {}".format(operation))
-            subprocess.run(operation, stderr=subprocess.PIPE, check=True)
 
-        except subprocess.CalledProcessError as e:            
-            logger.error("kubectl: {}".format(e.stderr))
-            raise AdaptorCritical("kubectl: {}".format(e.stderr))
+        logger.debug("Applying %s objects", len(self.manifests))
+        results = k8s_apply.Applier(self._client()).apply_waves(self.manifests)
+        self.status = "Executing... ({})".format(k8s_apply.summary(results))
+        if k8s_apply.failures(results):
+            raise AdaptorCritical("Kubernetes API: {}".format(k8s_apply.summary(results)))
+
+        readiness = self._wait_rollout(self.manifests)
 
         logger.info("Kube objects deployed, trying to get outputs...")
         self._get_outputs()
         logger.info("Execution complete")
-        self.status = "Executed"
+        self.status = "Executed ({})".format(_describe(results, readiness))
+
+    def artifacts(self):
+        """ Manifest file """
+        return [self.manifest_path]
 
     def update(self):
         """ Update """
         logger.info("Updating Kubernetes Manifests")
         self.status = "Updating..."
 
-        logger.debug("Creating tmp translation...")
-        self.manifests = []
-        self.translate(True)
-        
+        # the translation of the job is restored from the cache or made when the template is validated
+        if not self.translated:
+            logger.debug("Creating tmp translation...")
+            self.translate(True)
+        elif self.manifests:
+            utils.dump_list_yaml(self.manifests, self.manifest_tmp_path)
+
         if not self.manifests:
             logger.info("No nodes to orchestrate with Kubernetes. Do you need this adaptor?")
             self.status = "Skipped Update"
             return
 
-        if filecmp.cmp(self.manifest_path, self.manifest_tmp_path):
-            logger.debug("No update - removing {}".format(self.manifest_tmp_path))
+        try:
+            deployed = k8s_apply.load_manifests(self.manifest_path)
+        except OSError:
+            deployed = []
+        changes = k8s_apply.plan(deployed, k8s_apply.load_manifests(self.manifest_tmp_path))
+        counts = "{} to add, {} to change, {} to scale, {} to remove".format(
+            len(changes["add"]), len(changes["change"]), len(changes["scale"]), len(changes["remove"]))
+        if not (changes["add"] or changes["change"] or changes["scale"] or changes["remove"]):
+            logger.debug("No update - removing %s", self.manifest_tmp_path)
             os.remove(self.manifest_tmp_path)
             logger.info("Nothing to update")
             self.status = "Updated (nothing to update)"
-        else:
-            logger.debug("Updating - removing {}".format(self.manifest_path))
-            os.rename(self.manifest_tmp_path, self.manifest_path)
-            self.execute(True)
-            logger.info("Update complete")
-            self.status = "Updated"
+            return
+
+        logger.info("Update plan: %s", counts)
+        for line in k8s_apply.describe(changes):
+            logger.info("  %s", line)
+        logger.debug("Updating - removing %s", self.manifest_path)
+        os.rename(self.manifest_tmp_path, self.manifest_path)
+        if self.dryrun:
+            logger.info("DRY-RUN: Kubernetes API applies the update plan...")
+            self.status = "DRY-RUN Update ({})".format(counts)
+            return
+
+        applier = k8s_apply.Applier(self._client())
+        # workloads whose replicas are all that changed are only scaled, their pods and services
+        # stay as they are and their outputs too
+        results = applier.scale_all(changes["scale"])
+        if not (changes["add"] or changes["change"] or changes["remove"]):
+            if k8s_apply.failures(results):
+                self.status = "Scaling... ({})".format(k8s_apply.summary(results))
+                raise AdaptorCritical("Kubernetes API: {}".format(k8s_apply.summary(results)))
+            logger.info("Update complete, scaled only")
+            self.status = "Scaled ({})".format(k8s_apply.summary(results))
+            return
+
+        results += applier.apply_waves(changes["add"] + changes["change"])
+        results += applier.delete_all(changes["remove"])
+        if k8s_apply.failures(results):
+            self.status = "Updating... ({})".format(k8s_apply.summary(results))
+            raise AdaptorCritical("Kubernetes API: {}".format(k8s_apply.summary(results)))
+        readiness = self._wait_rollout(changes["add"] + changes["change"])
+        self._get_outputs()
+        logger.info("Update complete")
+        self.status = "Updated ({})".format(_describe(results, readiness))
     
     def undeploy(self):
         """ Undeploy """
         logger.info("Undeploying Kubernetes workloads")
         self.status = "Undeploying..."
-        error = False
-        
-        # Try to delete workloads relying on hosted mounts first (WORKAROUND)
-        operation = ["kubectl", "delete", "-n", "default", "-f", self.manifest_path, "-l", "!volume"]
+        if self.dryrun:
+            logger.info("DRY-RUN: Kubernetes API removes all workloads...")
+            self.status = "Undeployed"
+            return
         try:
-            if self.dryrun:
-                logger.info("DRY-RUN: kubectl removes all workloads but hosted volumes...")
-            else:
-                logger.debug("Undeploy {}".format(operation))
-                subprocess.run(operation, stderr=subprocess.PIPE, check=True)
-        except subprocess.CalledProcessError:
-            logger.debug("Got error deleting non-hosted-mount workloads")
-            error = True
-        time.sleep(15)
+            manifests = k8s_apply.load_manifests(self.manifest_path)
+        except OSError as e:
+            raise AdaptorCritical("Could not read the manifest: {}".format(e))
+        hosting = [x for x in manifests if 'volume' in ((x.get('metadata') or {}).get('labels') or {})]
+        others = [x for x in manifests if not any(x is y for y in hosting)]
+        applier = k8s_apply.Applier(self._client())
+
+        # Try to delete workloads relying on hosted mounts first (WORKAROUND)
+        results = applier.delete_all(others)
+        timeout = self.config.get('undeploy_timeout', UNDEPLOY_TIMEOUT)
+        remaining = k8s_apply.wait_pods_gone(self._client(), k8s_apply.pod_selectors(others), timeout)
+        if remaining:
+            logger.warning("Pods still terminating after %ss: %s", timeout, ", ".join(remaining))
 
         # Delete workloads hosting volumes
-        operation = ["kubectl", "delete", "-n", "default", "-f", self.manifest_path, "-l", "volume"]
-        try:
-            if self.dryrun:
-                logger.info("DRY-RUN: kubectl removes remaining workloads...")
-            else:
-                logger.debug("Undeploy {}".format(operation))
-                subprocess.run(operation, stderr=subprocess.PIPE, check=True)          
-        except subprocess.CalledProcessError:
-            logger.debug("Had some trouble removing hosted volume workload...")
-            error = True
+        results += applier.delete_all(hosting)
 
-        if error:            
-            raise AdaptorCritical("Had some trouble removing workloads!")
+        if k8s_apply.failures(results):
+            self.status = "Undeploying... ({})".format(k8s_apply.summary(results))
+            raise AdaptorCritical("Had some trouble removing workloads: {}".format(k8s_apply.summary(results)))
         logger.info("Undeployment complete")
-        self.status = "Undeployed"
+        self.status = "Undeployed ({})".format(k8s_apply.summary(results))
 
     def cleanup(self):
         """ Cleanup """
@@ -222,67 +333,148 @@ class KubernetesAdaptor(base_adaptor.Adaptor):
                 logger.info("DRY-RUN: cleaning up old manifests...")
             else:
                 operation = ["docker ps -f label=io.kubernetes.container.name=occopus-redis -q"]
-                occo_id = subprocess.check_output(operation, stderr=subprocess.PIPE, shell=True).decode('utf-8').strip()
+                with tracing.span("docker", command=operation[0]):
+                    occo_id = subprocess.check_output(operation, stderr=subprocess.PIPE, shell=True).decode('utf-8').strip()
                 operation = ["docker exec " + occo_id + " redis-cli FLUSHALL"]
-                subprocess.run(operation, stderr=subprocess.PIPE, shell=True, check=True)
+                with tracing.span("docker", command=operation[0]):
+                    subprocess.run(operation, stderr=subprocess.PIPE, shell=True, check=True)
         except subprocess.CalledProcessError:
             logger.warning("Could not flush occopus_redis")
 
         self.status = "Clean!"
 
+    def _wait_rollout(self, manifests):
+        """ Wait for the workloads of manifests to be ready as rollout_wait says, describe their readiness """
+        policy = self.config.get('rollout_wait', k8s_rollout.READY)
+        if policy == k8s_rollout.NONE or not k8s_rollout.workloads(manifests):
+            return None
+        timeout = self.config.get('rollout_timeout', k8s_rollout.ROLLOUT_TIMEOUT)
+
+        def report(rollout):
+            self.status = "Rolling out... ({})".format(rollout.describe())
+
+        rollout = k8s_rollout.Rollout(self._client(), manifests)
+        rollout.wait(timeout, report)
+        if rollout.failed() or rollout.pending():
+            if policy == k8s_rollout.STRICT:
+                raise AdaptorCritical("Workloads not ready after {}s: {}".format(timeout, rollout.describe()))
+            logger.warning("Workloads not ready after %ss: %s", timeout, rollout.describe())
+        return rollout.describe()
+
     def query(self, query):
         """ Query """
-        logger.info("Query ID {}".format(self.ID))
-        kubernetes.config.load_kube_config()
-        
+        logger.info("Query ID %s", self.ID)
+
         if query == 'nodes':
-            client = kubernetes.client.CoreV1Api()
-            return [x.metadata.to_dict() for x in client.list_node().items if not x.spec.taints]
+            nodes = self._query_objects("nodes", lambda api: kubernetes.client.CoreV1Api(api).list_node)
+            return [x.metadata.to_dict() for x in nodes if not x.spec.taints]
         elif query == 'services':
-            client = kubernetes.client.ExtensionsV1beta1Api()
-            return [x.metadata.to_dict() for x in client.list_namespaced_deployment("default").items]
+            deployments = self._query_objects(
+                "deployments", lambda api: kubernetes.client.ExtensionsV1beta1Api(api).list_namespaced_deployment,
+                namespace="default")
+            return [x.metadata.to_dict() for x in deployments]
+
+    def query_cache(self):
+        """ Freshness of the informers the queries are answered from """
+        return k8s_informer.freshness()
+
+    def _query_objects(self, name, list_method, **kwargs):
+        """ Return the objects of a list method of the API, from its informer if query_cache is on """
+        api_client = self._client()
+        if self.config.get('query_cache'):
+            informer = k8s_informer.shared(
+                name, lambda: k8s_informer.Informer(name, list_method(kubernetes.client.ApiClient()), **kwargs),
+                owner=self)
+            if informer.wait_synced():
+                return informer.items()
+            logger.warning("Informer %s not synced yet, listing from the API", name)
+        with tracing.span("kubernetes." + list_method(api_client).__name__, **kwargs):
+            return list_method(api_client)(**kwargs).items
 
     def _get_outputs(self):
         """ Get outputs and their resultant attributes """
         logger.info("Fetching outputs...")
 
-        def get_attribute(service, query):
-            kubernetes.config.load_kube_config()
-            if query == 'port':
-                for svc in self.services:
-                    if svc.get('node') == service:
-                        name = svc.get('name')
-                        namespace = svc.get('namespace')
-                        client = kubernetes.client.CoreV1Api()
-                        result = [x.to_dict() for x in client.read_namespaced_service(name, namespace).spec.ports]
-                        self.output.setdefault(service, []).append(result)
-
+        # the services of the nodes whose port is an output, read all at once
+        wanted = []
         for output in self.tpl.outputs:
             node = output.value.get_referenced_node_template()
             if node.type == DOCKER_CONTAINER:
-                service = node.name
-                logger.debug("Inspect service: {}".format(service))
-                query = output.value.attribute_name
-                get_attribute(service, query)
+                logger.debug("Inspect service: %s", node.name)
+                if output.value.attribute_name == 'port':
+                    wanted += [svc for svc in self.services if svc.get('node') == node.name]
             else:
-                logger.warning("{} is not a Docker container!".format(node.name))
-        
+                logger.warning("%s is not a Docker container!", node.name)
+        if not wanted:
+            return
+
+        found = k8s_apply.read_services(self._client(), {(svc['namespace'], svc['name']) for svc in wanted},
+                                        selector="app={}".format(self.short_id))
+        for svc in wanted:
+            service = found.get((svc['namespace'], svc['name']))
+            if service is None:
+                logger.warning("Service %s of %s not found", svc['name'], svc['node'])
+                continue
+            result = [x.to_dict() for x in service.spec.ports]
+            self.output.setdefault(svc['node'], []).append(result)
+
+    def _node_key(self, node, interface):
+        """ Hash of what the translation of a node depends on: its template, its interface inputs,
+        the volumes it mounts and the hosts it runs on """
+        hosts = sorted(host.name for host, rel in node.related.items()
+                       if rel.type == 'tosca.relationships.HostedOn')
+        volumes = {x.name: self.volumes.get(x.name) for x in node.related_nodes}
+        document = dict(name=node.name, type=node.type, tpl=node.entity_tpl,
+                        properties={key: val.value for key, val in node.get_properties().items()},
+                        interface=interface, hosts=hosts, volumes=volumes, app=self.short_id,
+                        repositories=self.tpl.tpl.get('repositories'))
+        return hashlib.sha256(json.dumps(document, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _translate_node(self, node, repositories):
+        """ Translate a container or volume node, returning its manifests, services and claim name """
+        first_manifest, first_service = len(self.manifests), len(self.services)
+        interface = _get_interface(node)
+        volume = None
+        if DOCKER_CONTAINER in node.type:
+            if '_' in node.name:
+                logger.error("ERROR: Use of underscores in %s workload name prohibited", node.name)
+                raise AdaptorCritical("ERROR: Use of underscores in {} workload name prohibited".format(node.name))
+            self._create_manifests(node, interface, repositories)
+
+        elif CONTAINER_VOLUME in node.type:
+            name = node.get_property_value('name') or node.name
+            if '_' in name:
+                logger.error("ERROR: Use of underscores in %s volume name prohibited", name)
+                raise AdaptorCritical("ERROR: Use of underscores in {} volume name prohibited".format(name))
+            size = node.get_property_value('size') or '1Gi'
+
+            pv_inputs = interface.get('create', {})
+            labels = self._create_persistent_volume(name, pv_inputs, size)
+            pvc_inputs = interface.get('configure', {})
+            volume = self._create_persistent_volume_claim(name, pvc_inputs, labels, size)
+
+        manifests = self.manifests[first_manifest:]
+        services = self.services[first_service:]
+        del self.manifests[first_manifest:]
+        del self.services[first_service:]
+        return manifests, services, volume
+
     def _create_manifests(self, node, interface, repositories):
         """ Create the manifest from the given node """
         workload_inputs = interface.get('create', {})
         pod_inputs = interface.get('configure', {})
         properties = {key:val.value for key, val in node.get_properties().items()}
 
-        resource = self._get_resource(node.name, workload_inputs)
+        resource, workload_inputs = self._get_resource(node.name, workload_inputs)
         kind = resource.get('kind')
         if kind not in SUPPORTED_WORKLOADS:
-            logger.warning('Kubernetes *kind: {}* is unsupported - no manifest created'.format(kind))
+            logger.warning('Kubernetes *kind: %s* is unsupported - no manifest created', kind)
             return
         resource_metadata = resource.get('metadata', {})
         resource_namespace = resource_metadata.get('namespace')
 
         # Get container spec
-        container = _get_container(node, properties, repositories, pod_inputs)
+        container, pod_inputs = _get_container(node, properties, repositories, pod_inputs)
         
         # Create services
         self._get_service_manifests(node, container, resource, pod_inputs)
@@ -290,14 +482,12 @@ class KubernetesAdaptor(base_adaptor.Adaptor):
         # Get and set volume info
         volumes, volume_mounts = self._get_volumes(node)
         if volumes:
-            vol_list = pod_inputs.setdefault('volumes', [])
-            vol_list += volumes
+            pod_inputs['volumes'] = pod_inputs.get('volumes', []) + volumes
         if volume_mounts:
-            vol_list = container.setdefault('volumeMounts', []) 
-            vol_list += volume_mounts
+            container['volumeMounts'] = container.get('volumeMounts', []) + volume_mounts
 
         # Get pod metadata from container or resource
-        pod_metadata = pod_inputs.pop('metadata', {})
+        pod_metadata = dict(pod_inputs.pop('metadata', {}))
         pod_metadata.setdefault('labels', {'run': node.name})
         pod_labels = pod_metadata.get('labels')
         pod_metadata.setdefault('namespace', resource_namespace)
@@ -307,7 +497,7 @@ class KubernetesAdaptor(base_adaptor.Adaptor):
         pod_inputs.update(node_affinity)
 
         # Separate data for pod.spec
-        pod_data = _separate_data(POD_SPEC_FIELDS, workload_inputs)
+        pod_data, workload_inputs = _separate_data(POD_SPEC_FIELDS, workload_inputs)
         pod_inputs.update(pod_data)
 
         # Cleanup metadata and spec inputs
@@ -329,7 +519,7 @@ class KubernetesAdaptor(base_adaptor.Adaptor):
             spec = {'selector': selector, 'template': template, **workload_inputs}
 
         # Build manifests
-        resource.setdefault('spec', spec)
+        resource['spec'] = spec
         self.manifests.append(resource)
         return
 
@@ -434,15 +624,13 @@ class KubernetesAdaptor(base_adaptor.Adaptor):
     def _create_persistent_volume(self, name, inputs, size):
         """ Create a PV """
         name = inputs.get('metadata', {}).get('name', inputs.get('name')) or '{}-pv'.format(name)
-        inputs.setdefault('metadata', {}).setdefault('labels', {}).setdefault('volume', name)
-        manifest = self._get_resource(name, inputs, 'PersistentVolume')        
-        manifest.setdefault('spec', inputs)
+        manifest, spec = self._get_resource(name, _with_volume_label(inputs, name), 'PersistentVolume')
         labels = manifest.get('metadata', {}).get('labels', {})
 
-        spec = manifest.get('spec')
-        spec.setdefault('capacity', {}).setdefault('storage', size)
-        spec.setdefault('accessModes', []).append('ReadWriteMany')
-        spec.setdefault('persistentVolumeReclaimPolicy', 'Retain')        
+        spec['capacity'] = {'storage': size, **spec.get('capacity', {})}
+        spec['accessModes'] = spec.get('accessModes', []) + ['ReadWriteMany']
+        spec.setdefault('persistentVolumeReclaimPolicy', 'Retain')
+        manifest['spec'] = spec
 
         self.manifests.append(manifest)
         return labels
@@ -450,34 +638,65 @@ class KubernetesAdaptor(base_adaptor.Adaptor):
     def _create_persistent_volume_claim(self, name, inputs, labels, size):
         """ Create a PVC """
         name = inputs.get('metadata', {}).get('name', inputs.get('name')) or '{}-pvc'.format(name)
-        inputs.setdefault('metadata', {}).setdefault('labels', {}).setdefault('volume', name)
-
-        manifest = self._get_resource(name, inputs, 'PersistentVolumeClaim')
-        manifest.setdefault('spec', inputs)
+        manifest, spec = self._get_resource(name, _with_volume_label(inputs, name), 'PersistentVolumeClaim')
 
-        spec = manifest.get('spec')
-        spec.setdefault('resources', {}).setdefault('requests', {}).setdefault('storage', size)
-        spec.setdefault('accessModes', []).append('ReadWriteMany')
-        spec.setdefault('selector', {}).setdefault('matchLabels', labels)
+        resources = dict(spec.get('resources', {}))
+        resources['requests'] = {'storage': size, **resources.get('requests', {})}
+        spec['resources'] = resources
+        spec['accessModes'] = spec.get('accessModes', []) + ['ReadWriteMany']
+        spec['selector'] = {'matchLabels': labels, **spec.get('selector', {})}
+        manifest['spec'] = spec
 
         self.manifests.append(manifest)
         return name
 
     def _get_resource(self, name, inputs, kind='Deployment'):
-        """ Build and return the basic data for the workload """
+        """ Build the basic data for the workload, return it and the inputs left for its spec """
+        resource_inputs, inputs = _separate_data(RESOURCE_FIELDS, inputs)
+
         # kind and apiVersion
-        kind = inputs.pop('kind', kind)
-        api_version = inputs.pop('apiVersion', _get_api(kind))
+        kind = resource_inputs.get('kind', kind)
+        api_version = resource_inputs.get('apiVersion', _get_api(kind))
 
         # metadata 
-        metadata = inputs.pop('metadata', {})
-        metadata.setdefault('name', inputs.pop('name', name))
-        metadata.setdefault('labels', inputs.pop('labels', {}))
-        metadata.setdefault('labels', {}).setdefault('app', self.short_id)
+        metadata = dict(resource_inputs.get('metadata', {}))
+        metadata.setdefault('name', resource_inputs.get('name', name))
+        labels = metadata.get('labels', resource_inputs.get('labels', {}))
+        metadata['labels'] = {'app': self.short_id, **labels}
         
         resource = {'apiVersion': api_version, 'kind': kind, 'metadata': metadata}
 
-        return resource
+        return resource, inputs
+
+def _with_volume_label(inputs, name):
+    """ Return the inputs of a volume with the volume label in their metadata """
+    metadata = dict(inputs.get('metadata', {}))
+    metadata['labels'] = {'volume': name, **metadata.get('labels', {})}
+    return {**inputs, 'metadata': metadata}
+
+def _get_interface(node):
+    """ Return the inputs of each operation of the Kubernetes interface of a node """
+    interface = {}
+    kube_interface = \
+        [x for x in node.interfaces if KUBERNETES_INTERFACE in x.type]
+    for operation in kube_interface:
+        interface[operation.name] = operation.inputs or {}
+    return interface
+
+
+def _describe(results, readiness):
+    """ Describe the results of the API calls and the readiness of the workloads """
+    summary = k8s_apply.summary(results)
+    return "{}; ready {}".format(summary, readiness) if readiness else summary
+
+def _trace_manifests(manifests, path):
+    """ Add the number of manifests and the size of their file to the current span """
+    span = tracing.current()
+    if span is None:
+        return
+    span.set(manifests=len(manifests))
+    if os.path.isfile(path):
+        span.set(file_size=os.path.getsize(path))
 
 def _get_api(kind):
     """ Return the apiVersion according to kind """
@@ -491,7 +710,7 @@ def _get_api(kind):
         if kind.lower() == resource.lower():
             return api
     
-    logger.warning("Unknown kind: {}. Not supported...".format(kind))
+    logger.warning("Unknown kind: %s. Not supported...", kind)
     return 'unknown'
     
 
@@ -500,7 +719,7 @@ def _build_service(service_name, service, resource, node_name, inputs):
     # Check for ports
     ports = service.get('ports')
     if not ports:
-        logger.warning('No ports in service {}. Will not be created'.format(service_name))
+        logger.warning('No ports in service %s. Will not be created', service_name)
         return None, None
 
     # Get resource metadata
@@ -513,7 +732,7 @@ def _build_service(service_name, service, resource, node_name, inputs):
     pod_labels = metadata.get('labels', {'run': node_name})
 
     # Set service metadata
-    metadata = service.get('metadata', {})
+    metadata = dict(service.get('metadata') or {})
     metadata.setdefault('name', service_name)
     metadata.setdefault('namespace', resource_namespace)
     metadata.setdefault('labels', resource_labels)
@@ -545,7 +764,8 @@ def _build_service(service_name, service, resource, node_name, inputs):
     return manifest, service_info
 
 def _get_container(node, properties, repositories, inputs):
-    """ Return container spec """        
+    """ Return container spec, and the pod inputs with the pod data of the properties """        
+    inputs = dict(inputs)
 
     # Get image
     image = _get_image(node.entity_tpl, repositories)
@@ -556,7 +776,7 @@ def _get_container(node, properties, repositories, inputs):
     # Remove any known swarm-only keys
     for key in SWARM_PROPERTIES:
         if properties.pop(key, None):
-            logger.warning('Removed Swarm-option {}'.format(key))
+            logger.warning('Removed Swarm-option %s', key)
 
     # Translate common properties
     properties.setdefault('name', properties.pop('container_name', node.name))
@@ -571,13 +791,15 @@ def _get_container(node, properties, repositories, inputs):
     # Translate other properties
     docker_labels = properties.pop('labels', None)
     if docker_labels:
-        inputs.setdefault('metadata', {}).setdefault('labels', {}).update(docker_labels)
+        metadata = dict(inputs.get('metadata', {}))
+        metadata['labels'] = {**metadata.get('labels', {}), **docker_labels}
+        inputs['metadata'] = metadata
     docker_grace = properties.pop('stop_grace_period', None)
     if docker_grace:
         inputs.setdefault('terminationGracePeriodSeconds', docker_grace)
     docker_priv = properties.pop('privileged', None)
     if docker_priv:
-        properties.setdefault('securityContext', {}).setdefault('privileged', docker_priv)
+        properties['securityContext'] = {'privileged': docker_priv, **properties.get('securityContext', {})}
     docker_pid = properties.pop('pid', None)
     if docker_pid == 'host':
         inputs.setdefault('hostPID', True)
@@ -587,17 +809,13 @@ def _get_container(node, properties, repositories, inputs):
     properties.setdefault('stdin', properties.pop('stdin_open', None))
     properties.setdefault('livenessProbe', properties.pop('healthcheck', None))
 
-    return {key:val for key, val in properties.items() if val}
+    return {key:val for key, val in properties.items() if val}, inputs
 
-def _separate_data(key_names, container):
-    """ Separate workload specific data from the container spec """
-    data = {}
-    for x in key_names:
-            try:
-                data[x] = container.pop(x)
-            except KeyError:
-                pass
-    return data
+def _separate_data(key_names, inputs):
+    """ Separate the data of key_names from the inputs, return both as new dicts """
+    data = {key:val for key, val in inputs.items() if key in key_names}
+    rest = {key:val for key, val in inputs.items() if key not in key_names}
+    return data, rest
 
 def _get_image(node, repositories):
     """ Return the full path to the Docker container image """
@@ -638,7 +856,7 @@ def _build_port_spec(port, node_name):
     target = port.get("targetPort", port.get("target"))
     publish = int(port.get("port", port.get("published", target)))
     if not publish and not target:
-        logger.warning("No port in ports of {}".format(node_name))
+        logger.warning("No port in ports of %s", node_name)
         return
     if isinstance(target, str) and target.isdigit():
         target = int(target)
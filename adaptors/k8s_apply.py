@@ -0,0 +1,441 @@
+"""
+MiCADO Submitter Engine Kubernetes Apply
+----------------------------------------
+Apply and delete the objects of a manifest through the Kubernetes API with
+the Python client, one request per object over the connections of a single
+ApiClient, instead of running kubectl for each operation.
+
+Objects are applied server-side (a PATCH of type apply-patch+yaml, owned by
+the submitter field manager). A server without server-side apply gets the
+object created, or merge-patched if it exists. apply_waves() applies them in
+waves of the kinds the next ones depend on (namespaces, volumes, claims,
+configuration and services, then workloads), the objects of a wave at once.
+
+Updates go through plan(), which compares the objects of two manifests by a
+hash of each object, so that only the added and changed objects are applied
+and only the removed ones deleted. Workloads whose replicas are all that
+changed are scaled through their scale subresource instead.
+
+Once workloads are deleted, wait_pods_gone() watches their pods until they
+have terminated.
+
+read_services() gets the services of an app with one list request per
+namespace, reading concurrently those the list doesn't give.
+"""
+import hashlib
+import json
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import ruamel.yaml as yaml
+import kubernetes.client
+import kubernetes.watch
+from kubernetes.client.rest import ApiException
+
+import submitter_metrics as metrics
+import submitter_tracing as tracing
+
+logger = logging.getLogger("adaptors." + __name__)
+
+FIELD_MANAGER = "micado-submitter"
+DEFAULT_NAMESPACE = "default"
+READ_WORKERS = 8
+APPLY_WORKERS = 8
+WORKLOADS = ("Deployment", "StatefulSet", "DaemonSet", "ReplicaSet", "Job", "ReplicationController")
+SCALABLE = ("Deployment", "StatefulSet", "ReplicaSet", "ReplicationController")
+ACTIONS = (APPLIED, CREATED, CONFIGURED, SCALED, DELETED, NOT_FOUND, FAILED) = \
+          ("applied", "created", "configured", "scaled", "deleted", "not found", "failed")
+
+# kind: (plural of the resource, namespaced)
+KINDS = {
+    "Namespace": ("namespaces", False),
+    "PersistentVolume": ("persistentvolumes", False),
+    "StorageClass": ("storageclasses", False),
+    "ClusterRole": ("clusterroles", False),
+    "ClusterRoleBinding": ("clusterrolebindings", False),
+    "PersistentVolumeClaim": ("persistentvolumeclaims", True),
+    "ConfigMap": ("configmaps", True),
+    "Secret": ("secrets", True),
+    "ServiceAccount": ("serviceaccounts", True),
+    "Service": ("services", True),
+    "Endpoints": ("endpoints", True),
+    "Pod": ("pods", True),
+    "ReplicationController": ("replicationcontrollers", True),
+    "Deployment": ("deployments", True),
+    "StatefulSet": ("statefulsets", True),
+    "DaemonSet": ("daemonsets", True),
+    "ReplicaSet": ("replicasets", True),
+    "Job": ("jobs", True),
+    "CronJob": ("cronjobs", True),
+    "Ingress": ("ingresses", True),
+    "NetworkPolicy": ("networkpolicies", True),
+    "HorizontalPodAutoscaler": ("horizontalpodautoscalers", True),
+    "Role": ("roles", True),
+    "RoleBinding": ("rolebindings", True),
+}
+
+
+# the kinds applied before the others, by wave; any other kind is in the last wave
+WAVES = (
+    ("Namespace",),
+    ("StorageClass", "PersistentVolume"),
+    ("PersistentVolumeClaim",),
+    ("ConfigMap", "Secret", "ServiceAccount", "ClusterRole", "ClusterRoleBinding", "Role", "RoleBinding",
+     "Service", "Endpoints"),
+)
+
+
+def load_manifests(path):
+    """ Return the objects of a manifest file """
+    with open(path) as manifest:
+        return [item for item in yaml.safe_load_all(manifest) if item]
+
+
+def identify(manifest):
+    """ Return the kind, namespace and name of an object """
+    metadata = manifest.get("metadata") or {}
+    namespaced = KINDS.get(manifest.get("kind"), (None, True))[1]
+    namespace = (metadata.get("namespace") or DEFAULT_NAMESPACE) if namespaced else None
+    return manifest.get("kind"), namespace, metadata.get("name")
+
+
+def resource_path(manifest, collection=False):
+    """ Return the API path of an object, or of the collection it belongs to """
+    kind, namespace, name = identify(manifest)
+    if kind not in KINDS:
+        raise ValueError("unsupported kind {}".format(kind))
+    api_version = manifest.get("apiVersion", "v1")
+    path = "/api/v1" if api_version == "v1" else "/apis/" + api_version
+    if namespace:
+        path += "/namespaces/" + namespace
+    path += "/" + KINDS[kind][0]
+    return path if collection else path + "/" + name
+
+
+def object_key(manifest):
+    """ Return the kind/namespace/name of an object, without namespace for cluster objects """
+    kind, namespace, name = identify(manifest)
+    return "/".join(part for part in (kind, namespace, name) if part)
+
+
+def object_hash(manifest):
+    """ Return a hash of the content of an object, the same whatever the order of its keys """
+    return hashlib.sha256(json.dumps(manifest, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def replicas_only(old, new):
+    """ Return whether the replicas of a scalable workload are all that differ between two versions """
+    if new.get("kind") not in SCALABLE:
+        return False
+    old_spec, new_spec = old.get("spec") or {}, new.get("spec") or {}
+    if old_spec.get("replicas", 1) == new_spec.get("replicas", 1):
+        return False
+    without = [dict(manifest, spec={key: value for key, value in spec.items() if key != "replicas"})
+               for manifest, spec in ((old, old_spec), (new, new_spec))]
+    return object_hash(without[0]) == object_hash(without[1])
+
+
+def plan(old, new):
+    """ Compare the objects of two manifests by key and hash
+
+        Return the objects to add, to change and to scale, in the order of the new manifest, the
+        objects to remove, in the reverse order of the old one, and the keys of the unchanged objects.
+    """
+    old_objects = {object_key(manifest): manifest for manifest in old}
+    new_keys = {object_key(manifest) for manifest in new}
+    changes = dict(add=[], change=[], scale=[], remove=[], unchanged=[])
+    for manifest in new:
+        key = object_key(manifest)
+        if key not in old_objects:
+            changes["add"].append(manifest)
+        elif object_hash(old_objects[key]) == object_hash(manifest):
+            changes["unchanged"].append(key)
+        elif replicas_only(old_objects[key], manifest):
+            changes["scale"].append(manifest)
+        else:
+            changes["change"].append(manifest)
+    changes["remove"] = [manifest for manifest in reversed(old) if object_key(manifest) not in new_keys]
+    return changes
+
+
+def describe(changes):
+    """ Return a line per object to add (+), change (~), scale (^) or remove (-) """
+    return ["{} {}".format(sign, object_key(manifest))
+            for sign, group in (("+", "add"), ("~", "change"), ("^", "scale"), ("-", "remove"))
+            for manifest in changes.get(group, [])]
+
+
+def waves(manifests):
+    """ Group the objects by wave, keeping their order within a wave and leaving out the empty waves """
+    groups = [[] for _ in range(len(WAVES) + 1)]
+    for manifest in manifests:
+        kind = manifest.get("kind")
+        groups[next((index for index, kinds in enumerate(WAVES) if kind in kinds), len(WAVES))].append(manifest)
+    return [group for group in groups if group]
+
+
+def pod_selectors(manifests):
+    """ Return the namespace and label selector of the pods of each workload, without duplicates """
+    selectors = []
+    for manifest in manifests:
+        kind, namespace, _ = identify(manifest)
+        spec = manifest.get("spec") or {}
+        if kind == "Pod":
+            labels = (manifest.get("metadata") or {}).get("labels")
+        elif kind in WORKLOADS:
+            labels = (spec.get("selector") or {}).get("matchLabels") or \
+                     ((spec.get("template") or {}).get("metadata") or {}).get("labels")
+        else:
+            continue
+        if not labels:
+            continue
+        selector = (namespace, ",".join("{}={}".format(key, value) for key, value in sorted(labels.items())))
+        if selector not in selectors:
+            selectors.append(selector)
+    return selectors
+
+
+def wait_pods_gone(api_client, selectors, timeout):
+    """ Wait until no pod matches the selectors, for at most timeout seconds
+
+        Return the names of the pods still there at the deadline.
+    """
+    core = kubernetes.client.CoreV1Api(api_client)
+    deadline = time.time() + timeout
+    with tracing.span("kubernetes.wait_pods_gone", selectors=len(selectors), timeout=timeout) as span:
+        for namespace, selector in selectors:
+            remaining = _watch_pods_gone(core, namespace, selector, deadline)
+            if remaining:
+                span.set(remaining=len(remaining))
+                return remaining
+    return []
+
+
+def _watch_pods_gone(core, namespace, selector, deadline):
+    """ List the pods of a selector, then watch them until they are all deleted or the deadline """
+    remaining = None
+    while time.time() < deadline:
+        pods = core.list_namespaced_pod(namespace, label_selector=selector)
+        remaining = {pod.metadata.name for pod in pods.items}
+        if not remaining:
+            return []
+        logger.debug("waiting for %s pods of %s to terminate", len(remaining), selector)
+        watch = kubernetes.watch.Watch()
+        try:
+            for event in watch.stream(core.list_namespaced_pod, namespace, label_selector=selector,
+                                      resource_version=pods.metadata.resource_version,
+                                      timeout_seconds=max(1, int(deadline - time.time()))):
+                if event["type"] == "DELETED":
+                    remaining.discard(event["object"].metadata.name)
+                if not remaining or time.time() >= deadline:
+                    watch.stop()
+                    break
+        except ApiException as e:
+            # e.g. 410 Gone when the resource version is too old: list again
+            logger.debug("watch of the pods of %s ended: %s", selector, e.status)
+        if not remaining:
+            return []
+    return sorted(remaining or [])
+
+
+def read_services(api_client, services, selector=None, workers=READ_WORKERS):
+    """ Return the services named by (namespace, name) pairs, None for those not found
+
+        The services of each namespace are listed once, filtered by the label selector. Those
+        missing from the list, or all of them where listing is forbidden, are read concurrently.
+    """
+    return _read_services(kubernetes.client.CoreV1Api(api_client), services, selector, workers)
+
+
+def _read_services(core, services, selector, workers):
+    wanted = dict()
+    for namespace, name in services:
+        wanted.setdefault(namespace, set()).add(name)
+    found = dict()
+    for namespace, names in sorted(wanted.items()):
+        try:
+            with metrics.KUBERNETES_SECONDS.time(operation="list"), \
+                    tracing.span("kubernetes.list_namespaced_service", namespace=namespace, selector=selector):
+                items = core.list_namespaced_service(namespace, label_selector=selector or "").items
+        except ApiException as e:
+            logger.debug("cannot list the services of %s (%s), reading them one by one", namespace, e.status)
+            items = []
+        for item in items:
+            if item.metadata.name in names:
+                found[(namespace, item.metadata.name)] = item
+
+    missing = [(namespace, name) for namespace, names in sorted(wanted.items())
+               for name in sorted(names) if (namespace, name) not in found]
+    if missing:
+        parent = tracing.current()
+
+        def read(key):
+            with tracing.attach(parent):
+                return _read_service(core, *key)
+
+        with ThreadPoolExecutor(max_workers=min(workers, len(missing))) as pool:
+            found.update(zip(missing, pool.map(read, missing)))
+    return found
+
+
+def _read_service(core, namespace, name):
+    """ Read a service, None if not found """
+    with metrics.KUBERNETES_SECONDS.time(operation="read"), \
+            tracing.span("kubernetes.read_namespaced_service", namespace=namespace, service=name):
+        try:
+            return core.read_namespaced_service(name, namespace)
+        except ApiException as e:
+            if e.status != 404:
+                raise
+            return None
+
+
+def failures(results):
+    """ Return the results of the objects which failed """
+    return [result for result in results if result["action"] == FAILED]
+
+
+def summary(results):
+    """ Describe the results in a line, naming the objects which failed """
+    counts = dict()
+    for result in results:
+        counts[result["action"]] = counts.get(result["action"], 0) + 1
+    text = ", ".join("{} {}".format(count, action) for action, count in sorted(counts.items()))
+    failed = ["{kind}/{name}: {error}".format(**result) for result in failures(results)]
+    return text + ("; " + "; ".join(failed) if failed else "")
+
+
+class Applier(object):
+    """ Apply and delete objects through one ApiClient, returning a result for each object """
+
+    def __init__(self, api_client, field_manager=FIELD_MANAGER, workers=APPLY_WORKERS):
+        self.api_client = api_client
+        self.field_manager = field_manager
+        self.workers = workers
+        self.server_side = True
+
+    def apply_all(self, manifests):
+        return [self.apply(manifest) for manifest in manifests]
+
+    def apply_waves(self, manifests):
+        """ Apply the objects wave by wave, those of a wave concurrently
+
+            A wave starts once the objects of the previous one are accepted. The waves after one
+            with a failure are not applied, as their objects may depend on the failed ones.
+        """
+        results = []
+        groups = waves(manifests)
+        with tracing.span("kubernetes.apply_waves", waves=len(groups), objects=len(manifests)):
+            for index, group in enumerate(groups):
+                results += self._concurrently(self.apply, group)
+                if failures(results):
+                    skipped = sum(len(later) for later in groups[index + 1:])
+                    if skipped:
+                        logger.error("not applying the %s objects of the next waves after a failure", skipped)
+                    break
+        return results
+
+    def delete_all(self, manifests):
+        return [self.delete(manifest) for manifest in manifests]
+
+    def apply(self, manifest):
+        """ Apply an object server-side """
+        return self._run("apply", manifest, self._apply)
+
+    def delete(self, manifest):
+        """ Delete an object, an object already gone is not an error """
+        return self._run("delete", manifest, self._delete)
+
+    def scale_all(self, manifests):
+        """ Scale the workloads concurrently """
+        return self._concurrently(self.scale, manifests)
+
+    def scale(self, manifest):
+        """ Set the replicas of a workload through its scale subresource, leaving the rest alone """
+        return self._run("scale", manifest, self._scale)
+
+    def _concurrently(self, method, manifests):
+        """ Run method on each object in a thread pool, returning the results in order """
+        if len(manifests) < 2 or self.workers < 2:
+            return [method(manifest) for manifest in manifests]
+        parent = tracing.current()
+
+        def run(manifest):
+            with tracing.attach(parent):
+                return method(manifest)
+
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(manifests))) as pool:
+            return list(pool.map(run, manifests))
+
+    def _run(self, operation, manifest, method):
+        kind, namespace, name = identify(manifest)
+        result = dict(kind=kind, namespace=namespace, name=name, action=None, error=None)
+        with metrics.KUBERNETES_SECONDS.time(operation=operation), \
+                tracing.span("kubernetes." + operation, kind=kind, namespace=namespace, object=name) as span:
+            try:
+                result["action"] = method(manifest)
+            except ApiException as e:
+                result.update(action=FAILED, error="{} {}".format(e.status, _reason(e)))
+            except Exception as e:
+                result.update(action=FAILED, error=str(e))
+            span.set(action=result["action"], error=result["error"])
+        if result["error"]:
+            logger.error("%s of %s/%s failed: %s", operation, kind, name, result["error"])
+        else:
+            logger.debug("%s/%s %s", kind, name, result["action"])
+        return result
+
+    def _apply(self, manifest):
+        # plain JSON types, as the client serializes the bodies of the json content types itself
+        body = json.loads(json.dumps(manifest, default=str))
+        if self.server_side:
+            try:
+                self._call(resource_path(manifest), "PATCH", json.dumps(body), "application/apply-patch+yaml",
+                           [("fieldManager", self.field_manager), ("force", "true")])
+                return APPLIED
+            except ApiException as e:
+                if e.status != 415:
+                    raise
+                logger.warning("server-side apply not supported, falling back to create or patch")
+                self.server_side = False
+        try:
+            self._call(resource_path(manifest, collection=True), "POST", body, "application/json",
+                       [("fieldManager", self.field_manager)])
+            return CREATED
+        except ApiException as e:
+            if e.status != 409:
+                raise
+        self._call(resource_path(manifest), "PATCH", body, "application/merge-patch+json",
+                   [("fieldManager", self.field_manager)])
+        return CONFIGURED
+
+    def _scale(self, manifest):
+        replicas = (manifest.get("spec") or {}).get("replicas", 1)
+        self._call(resource_path(manifest) + "/scale", "PATCH", {"spec": {"replicas": replicas}},
+                   "application/merge-patch+json", [("fieldManager", self.field_manager)])
+        return SCALED
+
+    def _delete(self, manifest):
+        try:
+            self._call(resource_path(manifest), "DELETE", {"propagationPolicy": "Background"},
+                       "application/json", [])
+        except ApiException as e:
+            if e.status != 404:
+                raise
+            return NOT_FOUND
+        return DELETED
+
+    def _call(self, path, method, body, content_type, query_params):
+        return self.api_client.call_api(
+            path, method, query_params=query_params, body=body,
+            header_params={"Content-Type": content_type, "Accept": "application/json"},
+            response_type="object", auth_settings=["BearerToken"], _return_http_data_only=True)
+
+
+def _reason(exception):
+    """ Return the message of the Status returned by the API, or the HTTP reason """
+    try:
+        return json.loads(exception.body).get("message") or exception.reason
+    except (TypeError, ValueError, AttributeError):
+        return exception.reason
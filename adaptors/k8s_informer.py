@@ -0,0 +1,183 @@
+"""
+MiCADO Submitter Engine Kubernetes Informer
+-------------------------------------------
+A local store of the objects of one kind, kept up to date by a background
+thread which lists them once, then watches their changes from the resource
+version of the list. The watch resumes from the last resource version it saw,
+and the objects are listed again only when it can't (410 Gone) or fails.
+
+Informers are shared by name in a process, so that the queries of every app
+read the same store instead of listing the objects from the API server. An
+informer is stopped and forgotten once the last of its owners releases it.
+"""
+import threading
+import time
+import logging
+
+import kubernetes.watch
+from kubernetes.client.rest import ApiException
+
+import submitter_tracing as tracing
+
+logger = logging.getLogger("adaptors." + __name__)
+
+WATCH_SECONDS = 300
+RETRY_SECONDS = 5
+SYNC_TIMEOUT = 10
+
+_INFORMERS = dict()
+_OWNERS = dict()
+_LOCK = threading.Lock()
+
+
+def shared(name, factory, owner=None):
+    """ Return the running informer of that name, made by factory and started the first time
+
+        The informer is kept for owner until release(owner), or until stop_all() if owner is None.
+    """
+    with _LOCK:
+        informer = _INFORMERS.get(name)
+        if informer is None:
+            informer = _INFORMERS[name] = factory()
+            informer.start()
+        if owner is not None:
+            _OWNERS.setdefault(name, set()).add(owner)
+    return informer
+
+
+def release(owner):
+    """ Release the informers of owner, stopping and forgetting the ones no other owner uses """
+    stopped = []
+    with _LOCK:
+        for name in [name for name, owners in _OWNERS.items() if owner in owners]:
+            _OWNERS[name].discard(owner)
+            if not _OWNERS[name]:
+                del _OWNERS[name]
+                stopped.append(_INFORMERS.pop(name))
+    for informer in stopped:
+        informer.stop()
+    return len(stopped)
+
+
+def freshness():
+    """ Return the freshness of the informers of this process, by name """
+    with _LOCK:
+        informers = dict(_INFORMERS)
+    return {name: informer.freshness() for name, informer in informers.items()}
+
+
+def stop_all():
+    """ Stop and forget the informers of this process """
+    with _LOCK:
+        informers = list(_INFORMERS.values())
+        _INFORMERS.clear()
+        _OWNERS.clear()
+    for informer in informers:
+        informer.stop()
+
+
+def _key(item):
+    return item.metadata.namespace, item.metadata.name
+
+
+class Informer(object):
+    """ Keep the objects returned by a list function of the API, by namespace and name """
+
+    def __init__(self, name, list_function, watch_seconds=WATCH_SECONDS, **kwargs):
+        self.name = name
+        self.list_function = list_function
+        self.kwargs = kwargs
+        self.watch_seconds = watch_seconds
+        self.resource_version = None
+        self.last_list = None
+        self.last_event = None
+        self.lists = 0
+        self.events = 0
+        self.error = None
+        self._objects = dict()
+        self._lock = threading.Lock()
+        self._synced = threading.Event()
+        self._stopped = threading.Event()
+        self._watch = None
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="informer-" + self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._watch:
+            self._watch.stop()
+
+    def wait_synced(self, timeout=SYNC_TIMEOUT):
+        """ Wait for the first list, return whether it is done """
+        return self._synced.wait(timeout)
+
+    def items(self):
+        """ Return the objects of the store """
+        with self._lock:
+            return list(self._objects.values())
+
+    def freshness(self):
+        """ Describe how current the store is: when it was last listed and last changed """
+        with self._lock:
+            last = max(self.last_list or 0, self.last_event or 0)
+            return dict(synced=self._synced.is_set(), objects=len(self._objects),
+                        resource_version=self.resource_version, last_list=self.last_list,
+                        last_event=self.last_event, age=round(time.time() - last, 3) if last else None,
+                        lists=self.lists, events=self.events, error=self.error)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                if self.resource_version is None:
+                    self._list()
+                self._watch_changes()
+            except ApiException as e:
+                self.resource_version = None
+                if e.status != 410:
+                    self._failed(e)
+            except Exception as e:
+                self.resource_version = None
+                self._failed(e)
+
+    def _failed(self, error):
+        self.error = str(error)
+        logger.warning("informer %s failed, listing again in %ss: %s", self.name, RETRY_SECONDS, error)
+        self._stopped.wait(RETRY_SECONDS)
+
+    def _list(self):
+        with tracing.span("kubernetes.informer_list", informer=self.name):
+            result = self.list_function(**self.kwargs)
+        with self._lock:
+            self._objects = {_key(item): item for item in result.items}
+            self.resource_version = result.metadata.resource_version
+            self.last_list = time.time()
+            self.lists += 1
+            self.error = None
+        self._synced.set()
+        logger.debug("informer %s listed %s objects at %s", self.name, len(result.items), self.resource_version)
+
+    def _watch_changes(self):
+        self._watch = kubernetes.watch.Watch()
+        for event in self._watch.stream(self.list_function, resource_version=self.resource_version,
+                                        timeout_seconds=self.watch_seconds, **self.kwargs):
+            self._handle(event)
+            if self._stopped.is_set():
+                self._watch.stop()
+
+    def _handle(self, event):
+        """ Apply a watch event to the store """
+        if event["type"] == "ERROR":
+            status = event.get("raw_object") or {}
+            raise ApiException(status=status.get("code"), reason=status.get("message"))
+        item = event["object"]
+        with self._lock:
+            if event["type"] == "DELETED":
+                self._objects.pop(_key(item), None)
+            elif event["type"] in ("ADDED", "MODIFIED"):
+                self._objects[_key(item)] = item
+            self.resource_version = item.metadata.resource_version
+            self.last_event = time.time()
+            self.events += 1
@@ -0,0 +1,153 @@
+"""
+MiCADO Submitter Engine Kubernetes Rollout
+------------------------------------------
+Follow the rollout of the workloads of a manifest once they are applied, the
+way kubectl rollout status does: each workload is listed, then watched from
+the resource version of the list until it is ready, has failed, or the
+deadline passes. The readiness of every workload (ready and desired replicas,
+or succeeded and wanted completions for a Job) is reported as it changes.
+"""
+import collections
+import time
+import logging
+
+import kubernetes.client
+import kubernetes.watch
+from kubernetes.client.rest import ApiException
+
+import submitter_tracing as tracing
+from adaptors import k8s_apply
+
+logger = logging.getLogger("adaptors." + __name__)
+
+POLICIES = (NONE, READY, STRICT) = ("none", "ready", "strict")
+ROLLOUT_TIMEOUT = 300
+
+# kind: (API class, list method)
+WORKLOAD_APIS = {
+    "Deployment": ("AppsV1Api", "list_namespaced_deployment"),
+    "StatefulSet": ("AppsV1Api", "list_namespaced_stateful_set"),
+    "DaemonSet": ("AppsV1Api", "list_namespaced_daemon_set"),
+    "Job": ("BatchV1Api", "list_namespaced_job"),
+    "Pod": ("CoreV1Api", "list_namespaced_pod"),
+}
+
+
+def workloads(manifests):
+    """ Return the objects of a manifest whose rollout can be followed """
+    return [manifest for manifest in manifests if manifest.get("kind") in WORKLOAD_APIS]
+
+
+def readiness(kind, workload):
+    """ Return the ready and desired counts of a workload, as the API returns it, and if it is done or failed """
+    spec = workload.get("spec") or {}
+    status = workload.get("status") or {}
+    metadata = workload.get("metadata") or {}
+    observed = status.get("observedGeneration", 0) >= metadata.get("generation", 0)
+    failed = False
+    if kind == "Deployment":
+        desired = spec.get("replicas", 1)
+        ready = status.get("availableReplicas", 0)
+        done = observed and status.get("updatedReplicas", 0) >= desired and ready >= desired \
+            and status.get("replicas", 0) <= desired
+    elif kind == "StatefulSet":
+        desired = spec.get("replicas", 1)
+        ready = status.get("readyReplicas", 0)
+        done = observed and ready >= desired and status.get("updatedReplicas", desired) >= desired
+    elif kind == "DaemonSet":
+        desired = status.get("desiredNumberScheduled", 0)
+        ready = status.get("numberAvailable", 0)
+        done = observed and ready >= desired and status.get("updatedNumberScheduled", 0) >= desired
+    elif kind == "Job":
+        desired = spec.get("completions", 1)
+        ready = status.get("succeeded", 0)
+        done = ready >= desired
+        failed = any(condition.get("type") == "Failed" and condition.get("status") == "True"
+                     for condition in status.get("conditions") or [])
+    else:
+        desired = 1
+        ready_condition = any(condition.get("type") == "Ready" and condition.get("status") == "True"
+                              for condition in status.get("conditions") or [])
+        ready = int(ready_condition or status.get("phase") == "Succeeded")
+        done = bool(ready)
+        failed = status.get("phase") == "Failed"
+    return dict(ready=ready, desired=desired, done=done, failed=failed)
+
+
+class Rollout(object):
+    """ The readiness of the workloads of a manifest, followed through one ApiClient """
+
+    def __init__(self, api_client, manifests):
+        self.api_client = api_client
+        self.states = collections.OrderedDict()
+        for manifest in workloads(manifests):
+            kind, namespace, name = k8s_apply.identify(manifest)
+            self.states[(kind, namespace, name)] = dict(kind=kind, namespace=namespace, name=name, ready=0,
+                                                        desired=None, done=False, failed=False)
+
+    def wait(self, timeout, on_change=None):
+        """ Watch the workloads until they are all done or failed, for at most timeout seconds
+
+            on_change is called with the rollout whenever the readiness of a workload changes.
+            Return the states of the workloads not done.
+        """
+        deadline = time.time() + timeout
+        with tracing.span("kubernetes.rollout", workloads=len(self.states), timeout=timeout) as span:
+            for key in self.states:
+                if time.time() >= deadline:
+                    break
+                self._follow(key, deadline, on_change)
+            span.set(pending=len(self.pending()), failed=len(self.failed()))
+        return self.pending()
+
+    def pending(self):
+        return [state for state in self.states.values() if not state["done"]]
+
+    def failed(self):
+        return [state for state in self.states.values() if state["failed"]]
+
+    def describe(self):
+        """ Describe the readiness of each workload in a line """
+        return ", ".join("{} {}/{}{}".format(state["name"], state["ready"],
+                                             "?" if state["desired"] is None else state["desired"],
+                                             " failed" if state["failed"] else "")
+                         for state in self.states.values())
+
+    def update(self, key, workload, on_change=None):
+        """ Take the readiness of a workload from the object returned by the API """
+        state = self.states[key]
+        changed = readiness(state["kind"], workload)
+        if any(state[field] != value for field, value in changed.items()):
+            state.update(changed)
+            logger.debug("%s/%s %s/%s ready", state["kind"], state["name"], state["ready"], state["desired"])
+            if on_change:
+                on_change(self)
+
+    def _follow(self, key, deadline, on_change):
+        """ List a workload, then watch it until it is done, failed or the deadline passes """
+        kind, namespace, name = key
+        api_class, method = WORKLOAD_APIS[kind]
+        list_function = getattr(getattr(kubernetes.client, api_class)(self.api_client), method)
+        selector = "metadata.name={}".format(name)
+        state = self.states[key]
+        while time.time() < deadline:
+            result = list_function(namespace, field_selector=selector)
+            for item in result.items:
+                self.update(key, self.api_client.sanitize_for_serialization(item), on_change)
+            if state["done"] or state["failed"]:
+                return
+            watch = kubernetes.watch.Watch()
+            try:
+                for event in watch.stream(list_function, namespace, field_selector=selector,
+                                          resource_version=result.metadata.resource_version,
+                                          timeout_seconds=max(1, int(deadline - time.time()))):
+                    if event["type"] in ("ADDED", "MODIFIED"):
+                        self.update(key, event["raw_object"], on_change)
+                    if state["done"] or state["failed"] or time.time() >= deadline:
+                        watch.stop()
+                        break
+            except ApiException as e:
+                # e.g. 410 Gone when the resource version is too old: list again
+                logger.debug("watch of %s/%s ended: %s", kind, name, e.status)
+            if state["done"] or state["failed"]:
+                return
@@ -6,6 +6,8 @@ import ruamel.yaml as yaml
 import time
 import requests
 import utils
+import submitter_metrics as metrics
+import submitter_tracing as tracing
 
 import jinja2
 
@@ -45,12 +47,11 @@ class OccopusAdaptor(abco.Adaptor):
 
         self.node_data = {}
         self.node_def = {}
+        self.infra_def = None
 
         self.created = False
         self.client = None
         self.occopus = None
-        if not self.dryrun:
-                self._init_docker()
 
         self.occopus_address = "occopus:5000"
         self.auth_data_file = "/var/lib/micado/occopus/data/auth_data.yaml"
@@ -58,12 +59,74 @@ class OccopusAdaptor(abco.Adaptor):
         self.occo_infra_path = "/var/lib/micado/occopus/submitter/{}-infra.yaml".format(self.ID)
         logger.info("Occopus Adaptor initialised")
 
+    def open(self):
+        """
+        Connect to Docker and find the Occopus container, once for the life of the adaptor
+        """
+        if not self.dryrun and not self.created:
+            self._init_docker()
+
+    def close(self):
+        """
+        Close the connection to Docker
+        """
+        if self.client is not None:
+            self.client.close()
+        self.client = None
+        self.occopus = None
+        self.created = False
+
+    def bind(self, template):
+        """
+        Work on template in the next job, keeping the Docker connection
+        """
+        if template and not isinstance(template, ToscaTemplate):
+            raise AdaptorCritical("Template is not a valid TOSCAParser object")
+        self.template = template
+        self.node_data = {}
+        self.node_def = {}
+        self.infra_def = None
+
+    def release(self):
+        """
+        Drop the template and the node definitions, keeping the Docker connection
+        """
+        self.bind(None)
+
+    def translation_inputs(self):
+        """
+        Infrastructure descriptor and cloud-init files read by the translation,
+        the last descriptor written included
+        """
+        return [self.infra_def_path_input, self.infra_def_path_output, self.cloudinit_path]
+
+    def translation_state(self):
+        """
+        Node definitions and infrastructure definition of the last translation
+        """
+        return dict(node_def=self.node_def, infra_def=self.infra_def)
+
+    def restore_translation(self, state):
+        """
+        Take the cached definitions as the translation and write them as translate() does
+        """
+        if state["node_def"] and state["infra_def"] is None and self.validate is False:
+            raise NotImplementedError("no infrastructure definition cached to write")
+        self.node_def = state["node_def"]
+        self.infra_def = state["infra_def"]
+        if self.node_def and self.validate is False:
+            utils.dump_order_yaml(self.node_def, self.node_path)
+            with open(self.infra_def_path_output, 'w') as ofile:
+                yaml.round_trip_dump(self.infra_def, ofile)
+        self.status = "translated"
+
     def translate(self, tmp=False):
         """
         Translate the self.tpl subset to Occopus node definition and infrastructure format
         The adaptor create a mapping between TOSCA and Occopus template descriptor.
         """
         self.node_def = {}
+        self.infra_def = None
         logger.info("Starting OccoTranslation")
         self.status = "translating"
 
@@ -100,6 +163,9 @@ class OccopusAdaptor(abco.Adaptor):
             elif self.validate is False:
                 utils.dump_order_yaml(self.node_def, self.node_path)
 
+        span = tracing.current()
+        if span:
+            span.set(nodes=len(self.node_def))
         self.status = "translated"
 
     def execute(self):
@@ -107,7 +173,7 @@ class OccopusAdaptor(abco.Adaptor):
         Import Occopus node definition, and build up the infrastructure
         through occopus container.
         """
-        logger.info("Starting Occopus execution {}".format(self.ID))
+        logger.info("Starting Occopus execution %s", self.ID)
         self.status = "executing"
         if self.dryrun:
                 logger.info("DRY-RUN: Occopus execution in dry-run mode...")
@@ -120,33 +186,38 @@ class OccopusAdaptor(abco.Adaptor):
                 while not run and i < 5:
                     try:
                         logger.debug("Occopus import starting...")
-                        result = self.occopus.exec_run("occopus-import {0}".format(self.occo_node_path))
+                        with tracing.span("docker.exec_run", command="occopus-import"):
+                            result = self.occopus.exec_run("occopus-import {0}".format(self.occo_node_path))
                         logger.debug("Occopus import has been successful")
                         run = True
                     except Exception as e:
                         i += 1
-                        logger.debug("{0}. Try {1} of 5.".format(str(e), i))
+                        logger.debug("%s. Try %s of 5.", str(e), i)
                         time.sleep(5)
                 logger.debug(result)
                 if "Successfully imported" in result[1].decode("utf-8"):
                     try:
                         logger.debug("Occopus build starting...")
-                        exit_code, out = self.occopus.exec_run("occopus-build {} -i {} --auth_data_path {} --parallelize"
-                                                          .format(self.occo_infra_path,
-                                                                  self.worker_infra_name,
-                                                                  self.auth_data_file))
+                        with metrics.OCCOPUS_BUILD_SECONDS.time(), \
+                                tracing.span("docker.exec_run", command="occopus-build"):
+                            exit_code, out = self.occopus.exec_run("occopus-build {} -i {} --auth_data_path {} --parallelize"
+                                                              .format(self.occo_infra_path,
+                                                                      self.worker_infra_name,
+                                                                      self.auth_data_file))
                         if exit_code == 1:
                             raise AdaptorCritical(out)
-                        occo_api_call = requests.post("http://{0}/infrastructures/{1}/attach"
-                                                  .format(self.occopus_address, self.worker_infra_name))
+                        url = "http://{0}/infrastructures/{1}/attach".format(self.occopus_address, self.worker_infra_name)
+                        with tracing.span("http", method="POST", url=url) as span:
+                            occo_api_call = requests.post(url)
+                            span.set(status_code=occo_api_call.status_code)
                         if occo_api_call.status_code != 200:
                             raise AdaptorCritical("Cannot submit infra to Occopus API!")
                         logger.debug("Occopus build has been successful")
                         
                     except docker.errors.APIError as e:
-                        logger.error("{0}. Error caught in calling Docker container".format(str(e)))
+                        logger.error("%s. Error caught in calling Docker container", str(e))
                     except requests.exceptions.RequestException as e:
-                        logger.error("{0}. Error caught in call to occopus API".format(str(e)))
+                        logger.error("%s. Error caught in call to occopus API", str(e))
                 else:
                     logger.error("Occopus import was unsuccessful!")
             else:
@@ -159,11 +230,13 @@ class OccopusAdaptor(abco.Adaptor):
         Undeploy Occopus infrastructure through Occopus rest API
         """
         self.status = "undeploying"
-        logger.info("Undeploy {} infrastructure".format(self.ID))
+        logger.info("Undeploy %s infrastructure", self.ID)
         if self.dryrun:
                 logger.info("DRY-RUN: deleting infrastructure...")
         else:
-            requests.delete("http://{0}/infrastructures/{1}".format(self.occopus_address, self.worker_infra_name))
+            url = "http://{0}/infrastructures/{1}".format(self.occopus_address, self.worker_infra_name)
+            with tracing.span("http", method="DELETE", url=url):
+                requests.delete(url)
             # self.occopus.exec_run("occopus-destroy --auth_data_path {0} -i {1}"
             # .format(self.auth_data_file, self.worker_infra_name))
         self.status = "undeployed"
@@ -172,7 +245,7 @@ class OccopusAdaptor(abco.Adaptor):
         """
         Remove the generated files under "files/output_configs/"
         """
-        logger.info("Cleanup config for ID {}".format(self.ID))
+        logger.info("Cleanup config for ID %s", self.ID)
         try:
             os.remove(self.node_path)
             os.remove(self.infra_def_path_output)
@@ -188,7 +261,7 @@ class OccopusAdaptor(abco.Adaptor):
         self.status = "updating"
         self.min_instances = 1
         self.max_instances = 1
-        logger.info("Updating the component config {}".format(self.ID))
+        logger.info("Updating the component config %s", self.ID)
         self.translate(True)
 
         if not self._differentiate(self.node_path,self.node_path_tmp):
@@ -216,6 +289,12 @@ class OccopusAdaptor(abco.Adaptor):
             except OSError as e:
                 logger.warning(e)
 
+    def artifacts(self):
+        """
+        Node definition and infrastructure definition files
+        """
+        return [self.node_path, self.infra_def_path_output]
+
     def _node_data_get_interface(self, node, key):
         """
         Get cloud relevant information from tosca
@@ -224,7 +303,7 @@ class OccopusAdaptor(abco.Adaptor):
         try:
             occo_inf = [inf for inf in interfaces if inf.type == "Occopus"][0]
         except (IndexError, AttributeError):
-            logger.debug("No interface for Occopus in {}".format(node.name))
+            logger.debug("No interface for Occopus in %s", node.name)
         else:
             cloud_inputs = occo_inf.inputs
             self.node_data.setdefault(key, {}).setdefault("type", cloud_inputs["interface_cloud"])
@@ -435,6 +514,7 @@ class OccopusAdaptor(abco.Adaptor):
                     infra_def = yaml.round_trip_load(f, preserve_quotes=True)
                 infra_def.setdefault('nodes', [])
                 infra_def["nodes"].append(node_infra)
+                self.infra_def = infra_def
             except OSError as e:
                 logger.error(e)
 
@@ -456,7 +536,7 @@ class OccopusAdaptor(abco.Adaptor):
                 self.created = True
             except Exception as e:
                 i += 1
-                logger.error("{0}. Try {1} of 5.".format(str(e), i))
+                logger.error("%s. Try %s of 5.", str(e), i)
                 time.sleep(5)
 
     def _get_host_properties(self, node):
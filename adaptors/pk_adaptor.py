@@ -6,6 +6,7 @@ from toscaparser.tosca_template import ToscaTemplate
 from abstracts import base_adaptor as abco
 from abstracts.exceptions import AdaptorCritical
 import ruamel.yaml as yaml
+import submitter_tracing as tracing
 
 logger = logging.getLogger("adaptor."+__name__)
 
@@ -34,8 +35,46 @@ class PkAdaptor(abco.Adaptor):
         except Exception as e:
             logger.error(e)
         self.tpl = template
+        self.session = None
         logger.info("Pk adaptor initialised")
 
+    def open(self):
+        """ Open an HTTP session to the Policy Keeper, reused by the next jobs """
+        if self.session is None:
+            self.session = requests.Session()
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+        self.session = None
+
+    def bind(self, template):
+        """ Work on template in the next job, keeping the HTTP session """
+        if template and not isinstance(template, ToscaTemplate):
+            raise AdaptorCritical("Template is not a valid TOSCAParser object")
+        self.tpl = template
+        self.pk_data = {}
+
+    def release(self):
+        """ Drop the template and the translated policies, keeping the HTTP session """
+        self.bind(None)
+
+    def translation_state(self):
+        """ Policies of the last translation """
+        return self.pk_data
+
+    def restore_translation(self, state):
+        """ Take the cached policies as the translation and write them as translate() does """
+        self.pk_data = state
+        if self.validate is False:
+            self._yaml_write(self.path)
+            logger.info("PK file restored from cache")
+        self.status = "translated"
+
+    def _http(self):
+        """ The open session, or the requests module if the adaptor was not opened """
+        return self.session or requests
+
     def translate(self, tmp=False):
         self.status = "translating"
         logger.info("Starting PK translation")
@@ -61,7 +100,7 @@ class PkAdaptor(abco.Adaptor):
                     service = {"name": target.name, "hosts": relations.get(target.name, [])}
                     service.update(self._pk_scaling_properties(policy))
                     self.pk_data[SCALING][SERVICES].append(service)
-            logger.info("Policy of {0} is translated".format(target.name))
+            logger.info("Policy of %s is translated", target.name)
 
         if tmp:
             self._yaml_write(self.tmp_path)
@@ -83,10 +122,12 @@ class PkAdaptor(abco.Adaptor):
             try:
                 with open(self.path, 'rb') as data:
                     try:
-                        requests.post("http://{0}/policy/start".format(self.config['endpoint']), data=data, headers=headers)
+                        url = "http://{0}/policy/start".format(self.config['endpoint'])
+                        with tracing.span("http", method="POST", url=url, file_size=os.path.getsize(self.path)):
+                            self._http().post(url, data=data, headers=headers)
                     except Exception as e:
                         logger.error(e)
-                    logger.info("Policy with {0} id is sent.".format(self.ID))
+                    logger.info("Policy with %s id is sent.", self.ID)
             except Exception as e:
                 logger.error(e)
         self.status = "executed"
@@ -94,28 +135,30 @@ class PkAdaptor(abco.Adaptor):
 
     def undeploy(self):
         self.status = "undeploying"
-        logger.info("Removing the policy in Pk service with id {0}".format(self.ID))
+        logger.info("Removing the policy in Pk service with id %s", self.ID)
         if self.dryrun:
                 logger.info("DRY-RUN: PK deletion in process...")
         else:
             try:
-                requests.post("http://{0}/policy/stop".format(self.config['endpoint']))
+                url = "http://{0}/policy/stop".format(self.config['endpoint'])
+                with tracing.span("http", method="POST", url=url):
+                    self._http().post(url)
             except Exception as e:
                 logger.error(e)
-        logger.info("Policy {0} removed.".format(self.ID))
+        logger.info("Policy %s removed.", self.ID)
         self.status = "undeployed"
 
 
     def cleanup(self):
 
-        logger.info("Cleanup config for ID {0}".format(self.ID))
+        logger.info("Cleanup config for ID %s", self.ID)
         try:
             os.remove(self.path)
         except OSError as e:
             logger.warning(e)
 
     def update(self):
-        logger.info("Updating the component config {0}".format(self.ID))
+        logger.info("Updating the component config %s", self.ID)
         # If update
         logger.info("Starting the update...")
         logger.debug("Creating temporary template...")
@@ -136,6 +179,9 @@ class PkAdaptor(abco.Adaptor):
                 logger.warning(e)
         
 
+    def artifacts(self):
+        return [self.path]
+
     def _pk_scaling_properties(self, policy):
         policy_prop = {}
         properties = policy.get_properties()
@@ -1,5 +1,10 @@
-from flask import request, url_for, Flask, jsonify, render_template, flash, redirect
+from flask import request, url_for, Flask, jsonify, render_template, flash, redirect, Response, stream_with_context, g, send_from_directory
 from submitter_engine import SubmitterEngine
+from submitter_events import STATUS, QUEUE, ERROR, DONE, STORE_POLL
+from submitter_webhooks import WebhookSender, valid_callback
+from submitter_store import QUEUED, RUNNING
+import submitter_metrics as metrics
+import submitter_tracing as tracing
 from toscaparser.common.exception import *
 import os
 app = Flask(__name__)
@@ -13,57 +18,255 @@ import queue
 import time
 import urllib.request
 import json
+import fcntl
 
 JSON_FILE = "system/ids.json"
+STREAM_KEEPALIVE = 15
+MAX_WAIT = 60
+JOB_POLL = 1
+HEARTBEAT_TIMEOUT = 30
+METRICS_DUMP = 5
 
 def __init__():
 
-    global logger, submitter, queue_exception, queue_threading
+    global logger, submitter, queue_exception, local_jobs, local_jobs_lock, webhooks, runner, heartbeat, manager, watcher
             
     logger =  logging.getLogger("submitter."+__name__)     
     submitter = SubmitterEngine()
+    webhooks = WebhookSender()
     queue_exception = queue.Queue()
-    queue_threading = queue.Queue()
-    thread = threading.Thread(target=threads_management)
-    thread.start()
+    local_jobs = dict()
+    local_jobs_lock = threading.Lock()
+    runner = False
+    heartbeat = time.time()
+    metrics.REGISTRY.directory = os.path.join(os.path.dirname(submitter.store.path) or ".", "metrics")
+    os.makedirs(metrics.REGISTRY.directory, exist_ok=True)
+    manager = threading.Thread(target=threads_management, daemon=True)
+    manager.start()
+    watcher = threading.Thread(target=watch_store, daemon=True)
+    watcher.start()
 
 
 
 class ExecSubmitterThread(threading.Thread):
-    def __init__(self, q, *args, **kwargs):
+    def __init__(self, q, *args, app_id=None, action=None, callback=None, queued_at=None, trace_id=None,
+                 profile=None, **kwargs):
         super(ExecSubmitterThread, self).__init__(*args, **kwargs)
 
         self.q = q
+        self.app_id = app_id
+        self.action = action
+        self.callback = callback
+        self.queued_at = queued_at or time.time()
+        self.trace_id = trace_id
+        self.profile = profile
+        self.error = None
 
     def run(self):
+        started_at = time.time()
         try:
-            self._target(*self._args, **self._kwargs)
+            profile = submitter.profiler.claim() if self.profile is None else self.profile or None
+            with tracing.trace(self.app_id, self.action, trace_id=self.trace_id,
+                               stage="run", queued=round(started_at - self.queued_at, 3)), \
+                    submitter.profiler.profile(self.app_id, self.action, profile):
+                self._target(*self._args, **self._kwargs)
         except Exception as e:
-            exception = {"name":self.getName(), "exception": e}
+            self.error = e
+            exception = {"name":self.getName(), "app_id": self.app_id, "exception": e}
             self.q.put(exception)
+        finally:
+            submitter.memory.save(self.app_id)
+            if self.callback:
+                self._notify(started_at, self.error)
+
+    def _notify(self, started_at, error):
+        """ Send the result of the job to its callback URL """
+        document = submitter.job_report(self.app_id)
+        document["timings"] = dict(queue=round(started_at - self.queued_at, 3), **document["timings"])
+        document.update(action=self.action,
+                        success=error is None,
+                        error=str(error) if error else None)
+        webhooks.send(self.callback, document)
+
+
+def get_callback():
+    """ Return the callback URL of the request, raising RequestError if it is not usable """
+    callback = request.form.get('callback')
+    if callback and not valid_callback(callback):
+        raise RequestError("callback must be an http(s) URL", payload=dict(status_code=400, data=[]))
+    return callback or None
+
+
+def queue_job(action, id_app, target, args, callback=None, trace_id=None, profile=None, **payload):
+    """ Queue a submitter job in the state store and tell the streaming clients where each job stands
+
+        The payload is what the runner needs to redo the job if it is another process. When this
+        process is the runner, it keeps the prepared thread and skips parsing the template again.
+        The job continues the trace of its request when trace_id is given, and is profiled in the
+        given mode when the request was (False if it was not, None if it is decided when it runs).
+    """
+    thread = ExecSubmitterThread(q=queue_exception, target=target, args=args, daemon=True,
+                                 app_id=id_app, action=action, callback=callback, trace_id=trace_id,
+                                 profile=profile)
+    thread.setName("{}_{}".format(action, id_app))
+    # the runner claims and takes the prepared thread under the same lock, so never in between
+    with local_jobs_lock:
+        seq = submitter.store.enqueue(id_app, action, dict(payload, callback=callback, trace_id=trace_id,
+                                                           profile=profile))
+        if runner:
+            local_jobs[seq] = thread
+    publish_queue_positions()
+    return thread
+
+
+def prepare_job(job):
+    """ Build the thread of a job queued by another process, from its stored payload """
+    payload = job["payload"]
+    thread = ExecSubmitterThread(q=queue_exception, target=run_stored_job,
+                                 args=(job["action"], job["app_id"], payload), daemon=True,
+                                 app_id=job["app_id"], action=job["action"],
+                                 callback=payload.get("callback"), queued_at=job["queued_at"],
+                                 trace_id=payload.get("trace_id"), profile=payload.get("profile"))
+    thread.setName("{}_{}".format(job["action"], job["app_id"]))
+    return thread
+
+
+def run_stored_job(action, id_app, payload):
+    """ Validate the template again if needed, then run the job on the engine """
+    if action == "launch":
+        template, dict_object_adaptors = submitter._validate(payload["path"], payload["dryrun"], False,
+                                                             id_app, payload.get("params"))
+        submitter.launch(template, dict_object_adaptors, id_app, payload["dryrun"])
+    elif action == "update":
+        template, dict_object_adaptors = submitter._validate(payload["path"], payload["dryrun"], True,
+                                                             id_app, payload.get("params"))
+        submitter.update(id_app, template, dict_object_adaptors)
+    elif action == "undeploy":
+        submitter.undeploy(id_app, payload.get("force", False))
+
+
+def publish_queue_positions():
+    """ Publish the position of every waiting job, 1 being the next one to run """
+    for position, item in enumerate(submitter.store.jobs(QUEUED), 1):
+        submitter.events.publish(item["app_id"], QUEUE, action=item["action"], position=position)
+
+
+def acquire_runner_lock():
+    """ Block until this process holds the runner lock, and return the locked file
+
+        Only one process, the runner, executes the jobs of the queue. Another one
+        takes over as soon as the runner is gone.
+    """
+    lock_file = open(runner_lock_path(), "w")
+    fcntl.flock(lock_file, fcntl.LOCK_EX)
+    return lock_file
+
+
+def runner_lock_path():
+    return os.path.join(os.path.dirname(submitter.store.path) or ".", "runner.lock")
+
+
+def runner_alive():
+    """ Return True if some process holds the runner lock, without waiting for it """
+    if runner:
+        return True
+    try:
+        with open(runner_lock_path(), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH | fcntl.LOCK_NB)
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+    except BlockingIOError:
+        return True
+    except OSError as e:
+        logger.warning("cannot check the runner lock: %s", e)
+    return False
 
 
 
 def threads_management():
-    global current_thread, last_error
-    last_error = ''
+    global current_thread, runner, heartbeat, _runner_lock
     current_thread = ''
+    # stays open for the life of the process, closing it would release the runner lock
+    _runner_lock = acquire_runner_lock()
+    logger.info("this process (%s) is now running the jobs", os.getpid())
+    interrupted = submitter.store.fail_running("interrupted, the submitter running it stopped")
+    if interrupted:
+        logger.warning("%s job(s) interrupted by the previous runner", interrupted)
+    submitter.reload()
+    runner = True
     while True:
-        time.sleep(3)
-        if not queue_threading.empty():
-           thread = queue_threading.get()
+        time.sleep(JOB_POLL)
+        heartbeat = time.time()
+        with local_jobs_lock:
+            job = submitter.store.claim()
+            thread = local_jobs.pop(job["seq"], None) if job else None
+        if job:
+           thread = thread or prepare_job(job)
            current_thread = thread.getName()
+           metrics.JOB_QUEUE_SECONDS.observe(time.time() - job["queued_at"], action=job["action"])
+           submitter.events.publish(thread.app_id, QUEUE, action=thread.action, position=0)
+           publish_queue_positions()
            thread.start()
            thread.join()
+           submitter.store.finish(job["seq"], thread.error)
+           submitter.store.prune()
+           metrics.JOBS.inc(action=job["action"], result="failed" if thread.error else "done")
+           metrics.REGISTRY.dump()
+           current_thread = ''
         try:
            if not queue_exception.empty():
                exception = queue_exception.get()
-               logger.error("exception caught on thread {}".format(exception["name"]))
+               logger.error("exception caught on thread %s", exception["name"])
+               submitter.events.publish(exception["app_id"], ERROR, job=exception["name"],
+                                        message=str(exception["exception"]))
                raise exception["exception"]
 
         except Exception as e:
-            last_error = e
-            logger.info("{}".format(e))
+            logger.info("%s", e)
+
+
+def watch_store():
+    """ Reload the settings changed by another process, and forward the changes made by the
+        runner to the applications and streams of this process when it is not the runner
+    """
+    known = set(submitter.store.apps())
+    versions = submitter.store.versions()
+    errors = dict()
+    version = submitter.store.version()
+    settings = submitter.store.settings_version()
+    dumped = time.time()
+    while True:
+        time.sleep(STORE_POLL)
+        if time.time() - dumped > METRICS_DUMP:
+            metrics.REGISTRY.dump()
+            dumped = time.time()
+        current = submitter.store.settings_version()
+        if current != settings:
+            settings = current
+            submitter.profiler.refresh()
+            submitter.memory.refresh()
+        current = submitter.store.version()
+        if runner or current == version:
+            version = current
+            continue
+        version = current
+        changed = submitter.store.versions()
+        for app_id, app_version in changed.items():
+            if versions.get(app_id) == app_version:
+                continue
+            record = submitter.store.app(app_id)
+            submitter.refresh(app_id, record)
+            if record is not None:
+                known.add(app_id)
+                submitter.events.publish(app_id, STATUS, status=record.get("status", {}))
+            elif app_id in known:
+                known.discard(app_id)
+                submitter.events.publish(app_id, DONE, action="undeploy")
+            error = submitter.store.last_error(app_id)
+            if error and errors.get(app_id) != error:
+                submitter.events.publish(app_id, ERROR, message=error)
+            errors[app_id] = error
+        versions = changed
+        publish_queue_positions()
 
 
 __init__()
@@ -86,24 +289,78 @@ class RequestError(Exception):
 def keyboardInterrupt():
     logger.info('Ctrl+C - Exiting.')
     for i in manager.process_table.iterkeys():
-        logger.info("Infrastructure left running: {}".format(i))
+        logger.info("Infrastructure left running: %s", i)
 
 @app.errorhandler(Exception)
 def unhandle_request_error(error):
     import traceback as tb
-    logger.error("An unhandle exception occured:{}".format(error))
+    logger.error("An unhandle exception occured:%s", error)
     response = jsonify(dict(message=str(error)))
     response.status_code= 500
     return response
 
 @app.errorhandler(RequestError)
 def handle_request_error(error):
-    logger.error("an exception occured {}".format(error))
+    logger.error("an exception occured %s", error)
     response = jsonify(error.to_dict())
     return response
 
 
 
+@app.before_request
+def start_timer():
+    g.started_at = time.time()
+
+
+@app.after_request
+def record_request(response):
+    """ Count the request and observe its latency, by route rather than by URL """
+    endpoint = request.url_rule.rule if request.url_rule else "unknown"
+    metrics.HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    if "started_at" in g:
+        metrics.HTTP_SECONDS.observe(time.time() - g.started_at, endpoint=endpoint, method=request.method)
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """ Metrics of the submitter in the Prometheus text format, added up over the worker processes """
+    metrics.QUEUE_DEPTH.set(submitter.store.count(QUEUED))
+    metrics.RUNNING_APPS.set(len(submitter.store.apps()))
+    return Response(metrics.REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """ Liveness of this worker process: its job and store watching threads are running
+
+        When this process runs the jobs, its job loop must have ticked recently or be busy with a job.
+    """
+    checks = dict(manager=manager.is_alive(), watcher=watcher.is_alive())
+    if runner:
+        checks["heartbeat"] = bool(current_thread) or time.time() - heartbeat < HEARTBEAT_TIMEOUT
+    healthy = all(checks.values())
+    response = jsonify(dict(status="ok" if healthy else "failing", runner=runner, checks=checks))
+    response.status_code = 200 if healthy else 503
+    return response
+
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """ Readiness to take requests: state store answering, adaptors loaded and a job runner present """
+    store_ok = submitter.store.ping()
+    checks = dict(store=store_ok,
+                  plugins=bool(submitter.adaptors_class_name) and all(submitter.adaptors_class_name),
+                  runner=runner_alive())
+    ready = all(checks.values())
+    data = dict(status="ok" if ready else "not ready", checks=checks,
+                queue_depth=submitter.store.count(QUEUED) if store_ok else None,
+                running=current_thread if runner else None)
+    response = jsonify(data)
+    response.status_code = 200 if ready else 503
+    return response
+
+
 @app.route('/v1.0/app/launch/', methods=['POST'])
 def launch():
     """ API functions to launch a application
@@ -113,9 +370,13 @@ def launch():
 
         :params params: dictionary with the update of input.
         :type params: dictionary
+
+        :params callback: optional URL receiving the result of the launch as a JSON POST
+        :type callback: string
     """
     response = dict(status_code="", message="", data=[])
     path_to_file = None
+    callback = get_callback()
 
     try:
         dryrun = request.form['dryrun']
@@ -126,7 +387,8 @@ def launch():
     except Exception:
         dryrun = False
 
-    if submitter.app_list.keys():
+    apps = submitter.store.apps()
+    if apps.keys():
         response["message"] = "An application is already running, MiCADO doesn't currently support multiple applications"
         response["status_code"] = 400
         return jsonify(response)
@@ -164,25 +426,25 @@ def launch():
         template.save("{}/files/templates/{}.yaml".format(app.root_path,id_app))
         path_to_file = "files/templates/{}.yaml".format(id_app)
 
-    if id_app in submitter.app_list.keys():
+    if id_app in apps.keys():
         response["message"] = "id already register on this service"
         response["status_code"] = 400
         return jsonify(response)
 
+    profile = submitter.profiler.claim()
     try:
-        template, dict_object_adaptors = submitter._validate(path_to_file, dryrun, False, id_app, parsed_params)
+        with tracing.trace(id_app, "launch", stage="validate") as root, \
+                submitter.profiler.profile(id_app, "launch-validate", profile):
+            template, dict_object_adaptors = submitter._validate(path_to_file, dryrun, False, id_app, parsed_params)
     except Exception as e:
         response["message"]= "The application is not valid: {}".format(e)
         response["status_code"]= 422
         return jsonify(response)
-    thread = ExecSubmitterThread(q=queue_exception, target=submitter.launch, args=(template, dict_object_adaptors, id_app, dryrun), daemon=True)
-    thread.setName("launch_{}".format(id_app))
-    queue_threading.put(thread)
+    queue_job("launch", id_app, submitter.launch, (template, dict_object_adaptors, id_app, dryrun), callback,
+              root.trace_id, profile or False, path=path_to_file, params=parsed_params, dryrun=dryrun)
 
     response["message"] = "Thread to deploy application launched. To check the progress: curl --insecure -u <MICADO_ADMIN_USER>:<MICADO_ADMIN_PASS> https://<MICADO_MASTER_IP>:<MICADO_MASTER_PORT>/toscasubmitter/v1.0/app/{}/status".format(id_app)
     response["status_code"]= 200
-    global last_error
-    last_error = ''
     return jsonify(response)
 
 @app.route('/v1.0/app/validate/', methods=['POST'])
@@ -231,11 +493,10 @@ def undeploy(id_app):
     """ API function to undeploy the application with a specific ID
     """
     response = dict(status_code="", message="", data=[])
+    callback = get_callback()
     try:
         if 'force' in request.form:
-            thread = ExecSubmitterThread(q=queue_exception, target=submitter.undeploy, args=(id_app, True), daemon=True)
-            thread.setName("undeploy_{}".format(id_app))
-            queue_threading.put(thread)
+            queue_job("undeploy", id_app, submitter.undeploy, (id_app, True), callback, force=True)
             logger.info("force flag found")
             response["status_code"]=200
             response["message"]= "correctly send force undeploy command to MiCADO master."
@@ -243,31 +504,28 @@ def undeploy(id_app):
     except Exception:
         logger.debug("no force flag found")
     
-    if not submitter.app_list.keys():
+    apps = submitter.store.apps()
+    if not apps.keys():
         response["message"] = "There is no running applications to undelploy"
         response["status_code"] = 400
         return jsonify(response)
-    elif id_app not in submitter.app_list.keys():
+    elif id_app not in apps.keys():
         logger.warning("Trying to undeploy an application with a non-existing id")
         response["message"] = "There is no running application with ID={}, please use a correct application ID".format(id_app)
         response["status_code"] = 400
         return jsonify(response)
 
-    for item in queue_threading.queue:
-        if "undeploy_{}".format(id_app) in item.getName():
+    for item in submitter.store.jobs(QUEUED):
+        if "undeploy_{}".format(id_app) == item["name"]:
             logger.debug("The application with id={} has already undeploy action pending")
             response["message"] = "this application has already undeploy action pending."
             response['status_code'] = 400
             return jsonify(response)
-    thread = ExecSubmitterThread(q=queue_exception, target=submitter.undeploy, args=(id_app,), daemon=True)
-    thread.setName("undeploy_{}".format(id_app))
-    queue_threading.put(thread)
+    queue_job("undeploy", id_app, submitter.undeploy, (id_app,), callback, force=False)
 
-    logger.debug("successfully send undeploy request for {} to MiCADO master".format(id_app))
+    logger.debug("successfully send undeploy request for %s to MiCADO master", id_app)
     response["message"] = "successfully send undeployed for {} to MiCADO master".format(id_app)
     response["status_code"] = 200
-    global last_error
-    last_error = ''
     return jsonify(response)
 
 
@@ -277,18 +535,20 @@ def update(id_app):
 
     response = dict(status_code="", message="", data=[])
     path_to_file = None
+    callback = get_callback()
 
-    if not submitter.app_list.keys():
+    apps = submitter.store.apps()
+    if not apps.keys():
         response["message"] = "There is no running applications to update"
         response["status_code"] = 400
         return jsonify(response)
-    elif id_app not in submitter.app_list.keys():
+    elif id_app not in apps.keys():
         response["message"] = "There is no running application with ID={}, please use a correct application ID to update".format(id_app)
         response["status_code"] = 400
         return jsonify(response)
 
-    for item in queue_threading.queue:
-        if "update_{}".format(id_app) in item.getName():
+    for item in submitter.store.jobs(QUEUED):
+        if "update_{}".format(id_app) == item["name"]:
             response["message"] = "this application has already an update pending, please wait for it to be completed before sending a new one."
             response["status_code"] = 400
             return jsonify(response)
@@ -313,21 +573,21 @@ def update(id_app):
         template.save("{}/files/templates/{}.yaml".format(app.root_path,id_app))
         path_to_file = "files/templates/{}.yaml".format(id_app)
     try:
-        dryrun = submitter.app_list[id_app]["dry_run"]
-        template, dict_object_adaptors = submitter._validate(path_to_file, dryrun, True, id_app, parsed_params)
+        dryrun = apps[id_app]["dry_run"]
+        profile = submitter.profiler.claim()
+        with tracing.trace(id_app, "update", stage="validate") as root, \
+                submitter.profiler.profile(id_app, "update-validate", profile):
+            template, dict_object_adaptors = submitter._validate(path_to_file, dryrun, True, id_app, parsed_params)
 
     except Exception as e:
         response["message"]= "The application is not valid: {}".format(e)
         response["status_code"]= 422
         return jsonify(response)
     try:
-        thread = ExecSubmitterThread(q=queue_exception, target=submitter.update, args=(id_app, template, dict_object_adaptors), daemon=True)
-        thread.setName("update_{}".format(id_app))
-        queue_threading.put(thread)
+        queue_job("update", id_app, submitter.update, (id_app, template, dict_object_adaptors), callback,
+                  root.trace_id, profile or False, path=path_to_file, params=parsed_params, dryrun=dryrun)
         response["message"] = "Thread to update the application is launch. To check process curl http://YOUR_HOST/v1.0/app/{}/status ".format(id_app)
         response["status_code"]= 200
-        global last_error
-        last_error = ''
         return jsonify(response)
     except Exception:
         response["message"] = "{} update failed".format(id_app)
@@ -335,27 +595,90 @@ def update(id_app):
         return jsonify(response)
 
 
+def conditional_response(id_app, build, queued=False):
+    """ Answer with the JSON document returned by build(), unless the client already has it
+
+        The ETag is the version of id_app (the global version if id_app is None), bumped by
+        the engine on every state transition. A document embedding the job queue (queued)
+        also changes with the jobs of the other applications: its ETag holds the global
+        version too. A request whose If-None-Match is the current ETag gets a 304, after
+        blocking up to ?wait= seconds for a newer version. The serialized document is kept
+        until the version changes.
+    """
+    scope = None if queued else id_app
+    base = submitter.events.version(scope)
+    version = _version(id_app, queued)
+    wait = min(request.args.get('wait', 0, type=float), MAX_WAIT)
+    if wait > 0 and (not request.if_none_match or
+                     request.if_none_match.contains(_etag(version))):
+        submitter.events.wait(scope, base, wait)
+        version = _version(id_app, queued)
+    etag = _etag(version)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    cached = serialized_responses.get(id_app)
+    if cached and cached[0] == version:
+        body = cached[1]
+    else:
+        document = build()
+        if document.get("status_code") != 200:
+            return jsonify(document)
+        body = json.dumps(document)
+        serialized_responses[id_app] = (version, body)
+    response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    return response
+
+
+def _version(id_app, queued=False):
+    """ Return the version of the documents of id_app, with the global one if they embed the job queue """
+    version = str(submitter.events.version(id_app))
+    if queued and id_app is not None:
+        version += ".{}".format(submitter.events.version())
+    return version
+
+
+def _etag(version):
+    """ Return the ETag of a version, unique to the state store of the submitter """
+    return "{}-{}".format(submitter.store.instance_id, version)
+
+
+serialized_responses = dict()
+
+
 @app.route('/v1.0/app/<id_app>/status', methods=['GET'])
 def info_app(id_app):
-    """ API function to get the information on a given id """
+    """ API function to get the information on a given id
+
+        Supports If-None-Match and the long-polling ?wait=<seconds> parameter
+    """
+    return conditional_response(id_app, lambda: _app_info(id_app), queued=True)
+
+
+def _app_info(id_app):
+    """ Build the information document of a given id """
     response = dict(status_code="", message="", data=[])
     try:
-        this_app = submitter.app_list[id_app]
-        this_app_status = submitter.get_status(id_app) or 'Could not get status'
-        q_t = queue_threading.queue
+        this_app = submitter.store.apps()[id_app]
+        this_app_status = this_app.get("status") or 'Could not get status'
+        running = [item["name"] for item in submitter.store.jobs(RUNNING)]
 
-        if not "launch_{}".format(id_app) in current_thread:
-            for item in q_t:
-                if "launch_{}".format(id_app) in item.getName():
+        if not "launch_{}".format(id_app) in running:
+            for item in submitter.store.jobs(QUEUED):
+                if "launch_{}".format(id_app) == item["name"]:
                     this_app_status = "pending, other application in the queue."
 
     except KeyError:
         response["status_code"]=404
         response["message"]="App with ID {} does not exist".format(id_app)
+        last_error = submitter.store.last_error(id_app)
         if last_error:
             response["data"].append('Error on last threaded action: {}'.format(last_error))
 
-        return jsonify(response)
+        return response
     else:
         response["status_code"]=200
         response["message"]="Detail application {}".format(id_app)
@@ -365,8 +688,120 @@ def info_app(id_app):
                                 components=this_app.get("components"),
                                 status=this_app_status)
 
+        return response
+
+
+@app.route('/v1.0/app/<id_app>/status/stream', methods=['GET'])
+def stream_app(id_app):
+    """ API function streaming the status transitions of a given id as server-sent events
+
+        The first event is the current status, followed by adaptor status changes,
+        job queue positions and errors until the application is undeployed.
+    """
+    record = submitter.store.app(id_app)
+    jobs = [item for item in submitter.store.jobs(QUEUED) + submitter.store.jobs(RUNNING)
+            if item["app_id"] == id_app]
+    if record is None and not jobs:
+        response = dict(status_code=404, message="App with ID {} does not exist".format(id_app), data=[])
         return jsonify(response)
 
+    events = submitter.events.subscribe(id_app)
+    status = (record or {}).get("status", {})
+
+    def generate():
+        try:
+            yield _server_sent_event(dict(event=STATUS, id=id_app, time=time.time(), status=status))
+            for position, item in enumerate(submitter.store.jobs(QUEUED), 1):
+                if item["app_id"] == id_app:
+                    yield _server_sent_event(dict(event=QUEUE, id=id_app, time=time.time(),
+                                                  action=item["action"], position=position))
+            while True:
+                try:
+                    event = events.get(timeout=STREAM_KEEPALIVE)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _server_sent_event(event)
+                if event["event"] == DONE and event.get("action") == "undeploy":
+                    break
+        finally:
+            submitter.events.unsubscribe(id_app, events)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers=headers)
+
+
+def _server_sent_event(event):
+    """ Format an event for a text/event-stream response """
+    return "event: {}\ndata: {}\n\n".format(event["event"], json.dumps(event, default=str))
+
+
+@app.route('/v1.0/admin/profiling', methods=['GET', 'POST', 'DELETE'])
+def profiling():
+    """ API function to profile the next jobs (POST jobs=N and/or seconds=T, mode=cprofile|sampling),
+        to stop profiling (DELETE), or to see what is armed and the profiles written (GET)
+    """
+    response = dict(status_code=200, message="Profiling", data=[])
+    if request.method == 'POST':
+        try:
+            state = submitter.profiler.arm(jobs=request.form.get('jobs', 0, type=int),
+                                           seconds=request.form.get('seconds', 0, type=float),
+                                           mode=request.form.get('mode', 'cprofile'))
+        except ValueError as e:
+            raise RequestError(str(e), payload=dict(status_code=400, data=[]))
+        response["message"] = "Profiling armed"
+    elif request.method == 'DELETE':
+        state = submitter.profiler.disarm()
+        response["message"] = "Profiling disarmed"
+    else:
+        state = submitter.profiler.state()
+    response["data"] = dict(state, directory=submitter.profiler.directory,
+                            profiles=submitter.profiler.profiles())
+    return jsonify(response)
+
+
+@app.route('/v1.0/admin/profiling/<name>', methods=['GET'])
+def profile_file(name):
+    """ API function to download a profile written by the profiler """
+    return send_from_directory(os.path.abspath(submitter.profiler.directory), name, as_attachment=True)
+
+
+@app.route('/v1.0/admin/memory', methods=['GET', 'POST'])
+def memory():
+    """ API function to get the memory of this worker and the memory report of the last job of each app,
+        or to turn the tracemalloc snapshots of the next jobs on or off (POST tracemalloc=true|false,
+        frames=N, top=N)
+    """
+    response = dict(status_code=200, message="Memory", data=[])
+    if request.method == 'POST':
+        enabled = request.form.get('tracemalloc', 'false').lower() == 'true'
+        submitter.memory.configure(enabled, request.form.get('frames', type=int), request.form.get('top', type=int))
+        response["message"] = "tracemalloc snapshots turned {} for the next jobs".format("on" if enabled else "off")
+    app_id = request.args.get('app')
+    reports = submitter.memory.reports()
+    response["data"] = dict(process=dict(submitter.memory.process(), pid=os.getpid(), runner=runner),
+                            settings=submitter.memory.settings(),
+                            jobs={app_id: reports.get(app_id, {})} if app_id else reports)
+    return jsonify(response)
+
+
+@app.route('/v1.0/app/<id_app>/trace', methods=['GET'])
+def trace_app(id_app):
+    """ API function to get the trace of the last job of a given id, or of all its jobs with ?all=true
+
+        Each trace lists its spans (parsing, validation, mapping, adaptor operations and the
+        calls they made) with their start, duration, parent span and attributes.
+    """
+    traces = tracing.TRACER.traces(id_app)
+    if not traces:
+        response = dict(status_code=404, message="No trace for the app with ID {}".format(id_app), data=[])
+        return jsonify(response)
+    if request.args.get('all', 'false').lower() == 'true':
+        response = dict(status_code=200, message="Traces of the jobs of {}".format(id_app), data=traces)
+    else:
+        response = dict(status_code=200, message="Trace of the last job of {}".format(id_app), data=traces[-1])
+    return jsonify(response)
+
 
 @app.route('/v1.0/app/query/<id_app>', methods=['GET'])
 def query(id_app):
@@ -375,6 +810,9 @@ def query(id_app):
     response = dict(status_code=200, message="Query: {}".format(query), data=[])
     for result in submitter.query(query, id_app):
         response['data'].append(result)
+    cache = submitter.query_cache(id_app)
+    if cache:
+        response['cache'] = cache
     return jsonify(response)
 
 
@@ -384,9 +822,10 @@ def list_thread():
     response = dict(status_code=200, message="Info on Thread", data=[])
     try:
         q_t=list()
-        for item in queue_threading.queue:
-            q_t.append(item.getName())
-        response['data']={"thread being executed": current_thread , "list of threads waiting" : q_t}
+        for item in submitter.store.jobs(QUEUED):
+            q_t.append(item["name"])
+        running = [item["name"] for item in submitter.store.jobs(RUNNING)]
+        response['data']={"thread being executed": running[0] if running else '', "list of threads waiting" : q_t}
     except Exception as e:
         logger.info(e)
         response["status_code"] = 500
@@ -395,14 +834,23 @@ def list_thread():
 
 @app.route('/v1.0/list_app', methods=['GET'])
 def list_app():
-    """ API function to list all the running aplications"""
+    """ API function to list all the running aplications
+
+        Supports If-None-Match and the long-polling ?wait=<seconds> parameter
+    """
+    return conditional_response(None, _app_list)
+
+
+def _app_list():
+    """ Build the document listing the running applications """
     response = dict(status_code=200, message="List running applications", data=[])
-    if not submitter.app_list.keys():
+    apps = submitter.store.apps()
+    if not apps.keys():
         response["message"] = "There are no running applications"
         response["status_code"] = 200
-        return jsonify(response)
+        return response
 
-    for key, value in submitter.app_list.items():
+    for key, value in apps.items():
         #if dryrun:
         #    response["message"]="Application {} deployed in DRY-RUN mode".format(key)
         response["data"].append(dict(type="application",
@@ -410,7 +858,7 @@ def list_app():
                                     outputs=value.get("output"),
                                     components=value.get("components"),
                                     dryrun=value.get("dry_run")))
-    return jsonify(response)
+    return response
 
 if __name__ == "__main__":
     __init__()
@@ -0,0 +1,18 @@
+"""
+Production serving mode of the submitter
+
+Run with: gunicorn --config gunicorn.conf.py api:app
+
+Every worker process serves the read endpoints from the shared state store,
+while a single one of them (the holder of system/runner.lock) runs the jobs.
+"""
+import os
+
+bind = "0.0.0.0:{}".format(os.environ.get("SUBMITTER_PORT", "5000"))
+workers = int(os.environ.get("SUBMITTER_WORKERS", "4"))
+# Threads keep long-polling and streaming clients from blocking a whole worker
+worker_class = "gthread"
+threads = int(os.environ.get("SUBMITTER_THREADS", "16"))
+timeout = 300
+graceful_timeout = 30
+accesslog = "-"
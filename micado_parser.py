@@ -5,6 +5,7 @@ import toscaparser.utils.urlutils
 import sys
 import logging
 import micado_validator as Validator
+import submitter_tracing as tracing
 
 import inspect
 import traceback
@@ -38,11 +39,18 @@ class MiCADOParser(object):
     | parsed_params: dictionary containing the input to change
     | path: local or remote path to the file to parse (it needs to be reachable.)
     """
+    with tracing.span("MiCADOParser.set_template", path=path) as span:
+      template = self._set_template(path, parsed_params, span)
+    return template
+
+  def _set_template(self, path, parsed_params, span):
+    """ parse and validate the template, adding its size and node counts to the span """
     self.path = path
     isfile = False
     if os.path.isfile(self.path):
       logger.debug("check if the input file is local")
       isfile = True
+      span.set(file_size=os.path.getsize(self.path))
       #return ToscaTemplate(self.path, parsed_params, isfile)
     else:
       try:
@@ -54,15 +62,19 @@ class MiCADOParser(object):
         raise Exception("Cannot find input file {}".format(e))
 
     try:
-        template = ToscaTemplate(self.path, parsed_params, isfile)
+        with tracing.span("ToscaTemplate", remote=not isfile):
+            template = ToscaTemplate(self.path, parsed_params, isfile)
     except AttributeError as e:
-        logger.error("error happened: {}, This might be due to the wrong type in the TOSCA template, check if all the type exist or that the import section is correct.".format(e))
+        logger.error("error happened: %s, This might be due to the wrong type in the TOSCA template, check if all the type exist or that the import section is correct.", e)
         raise Exception("An error occured while parsing, This might be due to the a wrong type in the TOSCA template, check if all the types exist, or that the import section is correct.")
 
 
 
 
-    Validator.validation(template)
+    span.set(nodes=len(template.nodetemplates), policies=len(template.policies),
+             repositories=len(template.repositories or []))
+    with tracing.span("validation"):
+      Validator.validation(template)
 
 
     #    raise Exception("an error happened most likely with the policy, check if import section is right")
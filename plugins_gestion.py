@@ -29,13 +29,13 @@ class PluginsGestion(object):
                     if module_extension == os.extsep + "py":
                         try:
                             module_hdl, path_name, description = imp.find_module(module_name)
-                            logger.debug("trying to import the module {}".format(module_name))
+                            logger.debug("trying to import the module %s", module_name)
                             plugin_module = imp.load_module(module_name, module_hdl, path_name,
                                                         description)
-                            logger.debug("inspect the plugin class {}".format(plugin_module))
+                            logger.debug("inspect the plugin class %s", plugin_module)
                             plugin_classes = inspect.getmembers(plugin_module, inspect.isclass)
                             for plugin_class in plugin_classes:
-                                logger.debug("check if {} is subclass of Abstract Adaptor".format(plugin_class))
+                                logger.debug("check if %s is subclass of Abstract Adaptor", plugin_class)
                                 if issubclass(plugin_class[1], Adaptor):
                                     # Load only those plugins defined in the current module
                                     # (i.e. don't instantiate any parent plugins)
@@ -50,17 +50,17 @@ class PluginsGestion(object):
     def get_plugin(self, plugin_name):
         """Given the name of a plugin, returns the plugin's class and an instance of the plugin,
         or (None, None) if the plugin isn't listed in the available plugins."""
-        logger.debug("plugin wanted: {}".format(plugin_name))
+        logger.debug("plugin wanted: %s", plugin_name)
         plugin_class = None
         plugin_instance = None
         available_plugins = self._load_plugins()
         plugin_names = [plugin[0] for plugin in available_plugins]
         plugin_classes = [plugin[1] for plugin in available_plugins]
-        logger.debug("check if {} is in the plugin list".format(plugin_name))
+        logger.debug("check if %s is in the plugin list", plugin_name)
         if plugin_name in plugin_names:
             plugin_class = plugin_classes[plugin_names.index(plugin_name)]
             #plugin_instance = plugin_class()
             #plugin_instance.data = self.data
         #return plugin_class, plugin_instance
-        logger.debug("return {}".format(plugin_class))
+        logger.debug("return %s", plugin_class)
         return plugin_class
@@ -0,0 +1,128 @@
+"""
+MiCADO Submitter Engine Translation Cache
+-----------------------------------------
+The translations of the adaptors, kept by a key made of the digest of the
+template, the adaptor ID and name, the digest of its adaptor_config section
+and the digest of its code, so that translating the same template again
+restores the result instead of computing it.
+
+Entries are pickled to a directory shared by the worker processes, with the
+most recent ones also kept in memory.
+"""
+import collections
+import hashlib
+import json
+import os
+import pickle
+import sys
+import threading
+import logging
+
+import utils
+
+logger = logging.getLogger("submitter."+__name__)
+
+MEMORY_ENTRIES = 64
+DISK_ENTRIES = 512
+
+
+def template_digest(template):
+    """ Digest of the parsed template, inputs included """
+    document = dict(tpl=template.tpl, params=getattr(template, "parsed_params", None))
+    return _digest(document)
+
+
+def config_digest(config):
+    """ Digest of an adaptor_config section, the matched types reduced to their names """
+    config = dict(config)
+    if isinstance(config.get("types"), list):
+        config["types"] = [next(iter(item)) if isinstance(item, dict) else item
+                           for item in config["types"]]
+    return _digest(config)
+
+
+def code_version(adaptor):
+    """ Digest of the source of the module of the adaptor """
+    module = sys.modules.get(type(adaptor).__module__)
+    return utils.file_digest(getattr(module, "__file__", None) or "")
+
+
+def _digest(document):
+    return hashlib.sha256(json.dumps(document, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class TranslationCache(object):
+    """ Keep the translation state of the adaptors by key, in memory and in a directory """
+
+    def __init__(self, directory, memory_entries=MEMORY_ENTRIES, disk_entries=DISK_ENTRIES):
+        self.directory = directory
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self._memory = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, template_digest, adaptor):
+        """ Return the key of the translation of a template by an adaptor """
+        parts = [template_digest, type(adaptor).__name__, getattr(adaptor, "ID", None),
+                 config_digest(getattr(adaptor, "config", None) or {}), code_version(adaptor)]
+        parts += [utils.file_digest(path) for path in adaptor.translation_inputs()]
+        return _digest(parts)
+
+    def get(self, key):
+        """ Return a copy of the translation state kept for key, or None """
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+        if data is None:
+            try:
+                with open(self._path(key), "rb") as entry:
+                    data = entry.read()
+            except OSError:
+                return None
+            self._remember(key, data)
+        try:
+            return pickle.loads(data)
+        except Exception as e:
+            logger.warning("cannot read the cached translation %s: %s", key, e)
+            return None
+
+    def put(self, key, state):
+        """ Keep the translation state for key, ignoring states which can't be pickled """
+        try:
+            data = pickle.dumps(state, pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            logger.debug("translation %s not cached: %s", key, e)
+            return
+        self._remember(key, data)
+        path = self._path(key)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path + ".tmp", "wb") as entry:
+                entry.write(data)
+            os.replace(path + ".tmp", path)
+            self._prune()
+        except OSError as e:
+            logger.warning("cannot write the cached translation %s: %s", key, e)
+
+    def _remember(self, key, data):
+        with self._lock:
+            self._memory[key] = data
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".pickle")
+
+    def _prune(self):
+        """ Remove the oldest entries of the directory beyond disk_entries """
+        names = [name for name in os.listdir(self.directory) if name.endswith(".pickle")]
+        if len(names) <= self.disk_entries:
+            return
+        paths = sorted((os.path.join(self.directory, name) for name in names), key=os.path.getmtime)
+        for path in paths[:len(paths) - self.disk_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -7,6 +7,7 @@ import ruamel.yaml as yaml
 import re
 import collections
 import utils
+import submitter_tracing as tracing
 from os import path
 basepath = path.dirname(__file__)
 CONFIG_FILE = "{}/system/key_config.yml".format(basepath)
@@ -50,7 +51,7 @@ class SubmitterConfig():
       for key, value in self._reading_config()["adaptor_config"].items():
           adaptor_list.append(key)
 
-      logger.debug("adaptors:  {}".format(adaptor_list))
+      logger.debug("adaptors:  %s", adaptor_list)
       return adaptor_list
 
 
@@ -75,7 +76,7 @@ class SubmitterConfig():
                dic_types=yaml.round_trip_load(stream.read(), preserve_quotes=True)
           except OSError as exc:
              
-              logger.error("Error while reading file, error: %s" % exc)
+              logger.error("Error while reading file, error: %s", exc)
       logger.debug("return dictionary of types from config file")
       return dic_types
 
@@ -106,6 +107,20 @@ class SubmitterConfig():
       return output
 
   def mapping(self, template=None):
+      """map the types of the config to the template, return the adaptors with a type found in it"""
+      with tracing.span("SubmitterConfig.mapping") as span:
+          matched = self._matched_adaptors(self._mapping(template))
+          span.set(nodes=len(template.nodetemplates) if template else 0,
+                   matched=sorted(matched))
+      return matched
+
+  def _matched_adaptors(self, adaptor_config):
+      """return the adaptors with a type matched in a mapped config"""
+      return [key for key, value in adaptor_config.items()
+              if isinstance(value, dict) and
+              any(isinstance(item, dict) for item in value.get("types", []))]
+
+  def _mapping(self, template=None):
       if template:
           self._find_get_input(template.tpl, template)
       logger.debug("set dictionary")
@@ -119,9 +134,9 @@ class SubmitterConfig():
                       for item in value_inter:
                           if self._check_re(item, template):
                               for item_inter in self._list_for_re(item, template):
-                                  logger.debug("item_inter {}".format(item_inter))
+                                  logger.debug("item_inter %s", item_inter)
                                   obj = self._look_through_template(item_inter, template)
-                                  logger.debug("\t\tobject: {}".format(obj))
+                                  logger.debug("\t\tobject: %s", obj)
                                   if obj is not None:
                                       _list_inter.append({item_inter: obj})
                           else:
@@ -141,15 +156,16 @@ class SubmitterConfig():
                       _list_inter = list()
                       for item in value_inter:
                           _list_inter.append(item)
-                      logger.debug("key_inter is: {}".format(_list_inter))
+                      logger.debug("key_inter is: %s", _list_inter)
                       _for_dic[key_inter] = _list_inter
                       #_for_dic['dry_run'] = self.main_config['dry_run']
                       tmp_dic[key] = _for_dic
                   else:
                       tmp_dic[key][key_inter] = value_inter
 
-      logger.debug("the config is: {}".format(tmp_dic))
+      logger.debug("the config is: %s", tmp_dic)
       self.adaptor_config = tmp_dic
+      return tmp_dic
 
 
 
@@ -195,14 +211,14 @@ class SubmitterConfig():
               if template.parsed_params[key]:
                   return template.parsed_params[key]
       except KeyError as j:
-          logger.error("{} no {} in parsed_params".format(j,key))
+          logger.error("%s no %s in parsed_params", j, key)
 
       try:
           logger.debug("ready to get the result")
           result=self._contains_inputs(template.inputs, lambda x: x.name == key)
           return result.default
       except TypeError as e:
-          logger.error("{}".format(e))
+          logger.error("%s", e)
 
 
   def _contains_inputs(self, list_object, filter):
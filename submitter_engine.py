@@ -7,28 +7,36 @@ import utils
 import json
 import ruamel.yaml as yaml
 import os
+import threading
 import time
+from contextlib import contextmanager
+from types import MappingProxyType
 from random import randint
 from submitter_config import SubmitterConfig
+from submitter_events import EventBroker, STATUS, DONE
+from submitter_store import StateStore
+from submitter_pool import AdaptorPool, close as close_adaptor
+from submitter_cache import TranslationCache, template_digest
+import submitter_metrics as metrics
+import submitter_tracing as tracing
+from submitter_profiler import Profiler
+from submitter_memory import MemoryTracker
 import logging
+import submitter_logging
 """ set up of Logging """
 config = SubmitterConfig()
 LEVEL = config.main_config['log_level']
 FILENAME = config.main_config['path_log']
-logging.basicConfig(filename=FILENAME, level=LEVEL, format="%(asctime)s - %(lineno)d - %(name)s - %(levelname)s - %(message)s")
+STORE_FILE = config.main_config.get('state_store', "system/submitter.db")
+TRACE_FILE = config.main_config.get('trace_file', "system/traces.jsonl")
+PROFILE_DIR = config.main_config.get('profile_dir', "system/profiles")
+PROFILE_JOBS = config.main_config.get('profile_jobs', 0)
+TRANSLATION_CACHE = config.main_config.get('translation_cache', "system/translations")
+""" log file and console written by a listener thread, optionally as JSON and rate limited per module """
+submitter_logging.setup(LEVEL, FILENAME, config.main_config.get('log_format', 'text'),
+                        config.main_config.get('log_rate_limit', 0))
 logger=logging.getLogger("submitter."+__name__)
 
-"""define the Handler which write message to sys.stderr"""
-console = logging.StreamHandler()
-console.setLevel(LEVEL)
-""" set format which is simpler for console use"""
-formatter = logging.Formatter('%(name)-12s: %(levelname)-8s %(message)s')
-
-console.setFormatter(formatter)
-
-""" add the handler to the root logger"""
-logging.getLogger('').addHandler(console)
-
 JSON_FILE = "system/ids.json"
 
 
@@ -42,13 +50,23 @@ class SubmitterEngine(object):
         super(SubmitterEngine, self).__init__()
         logger.debug("init of submitter engine class")
 
-        try:
-            with open(JSON_FILE, 'r') as json_data:
-                logger.debug("instantiation of dictionary app_list with {}".format(JSON_FILE))
-                self.app_list = json.load(json_data)
-        except FileNotFoundError:
-            logger.debug("file {} doesn't exist so isntantiation of empty directory of app_list".format(JSON_FILE))
-            self.app_list = dict()
+        self.store = StateStore(STORE_FILE)
+        tracing.TRACER.path = TRACE_FILE
+        self._snapshot = MappingProxyType({})
+        self._publish_lock = threading.Lock()
+        self._app_locks = dict()
+        self.pool = AdaptorPool()
+        self.translations = TranslationCache(TRANSLATION_CACHE)
+        self.reload()
+        if not self.app_list:
+            try:
+                with open(JSON_FILE, 'r') as json_data:
+                    logger.debug("migration of the applications of %s to the state store", JSON_FILE)
+                    self._publish_all(json.load(json_data))
+            except FileNotFoundError:
+                logger.debug("file %s doesn't exist so isntantiation of empty directory of app_list", JSON_FILE)
+            for app_id in self.app_list:
+                self._save_state(app_id)
         logger.debug("load configurations")
         self.object_config = SubmitterConfig()
         self.adaptors_class_name = []
@@ -56,6 +74,12 @@ class SubmitterEngine(object):
 
         self.translated_adaptors = {}
         self.executed_adaptors = {}
+        self.events = EventBroker(store=self.store)
+        self.profiler = Profiler(PROFILE_DIR, store=self.store)
+        self.memory = MemoryTracker(store=self.store)
+        if PROFILE_JOBS and not self.profiler.state()["active"]:
+            self.profiler.arm(jobs=PROFILE_JOBS)
+        self.timings = {}
         
 
     #def launch(self, path_to_file, id_app, dry_run=False, parsed_params=None):
@@ -82,11 +106,19 @@ class SubmitterEngine(object):
         #dict_object_adaptors = self._instantiate_adaptors(id_app, dryrun, template)
         #logger.debug("list of objects adaptor: {}".format(dict_object_adaptors))
         #self._save_file(id_app, path_to_file)
-        self.app_list.update({id_app: {"components":list(dict_object_adaptors.keys()), "adaptors_object": dict_object_adaptors, "dry_run":dry_run}})
-        self._update_json()
-        logger.debug("dictionnaty of id is: {}".format(self.app_list))
+        with self._app_lock(id_app):
+            self._publish(id_app, {"components":list(dict_object_adaptors.keys()), "adaptors_object": dict_object_adaptors, "dry_run":dry_run})
+        self._save_state(id_app)
+        logger.debug("dictionnaty of id is: %s", self.app_list)
 
-        self._engine(dict_object_adaptors, template, id_app)
+        try:
+            with self._phase(id_app, "open"):
+                self._open(dict_object_adaptors)
+            with self._phase(id_app, "execute"):
+                self._engine(dict_object_adaptors, template, id_app)
+        finally:
+            self._compact(id_app, dict_object_adaptors)
+        self.events.publish(id_app, DONE, action="launch", status=self.get_status(id_app))
 
         logger.info("launched process done")
         logger.info("*********************")
@@ -99,6 +131,8 @@ class SubmitterEngine(object):
         :type: string
         """
         logger.info("****** proceding to the undeployment of the application *****")
+        self.timings[id_app] = {}
+        self.memory.start_job(id_app)
 
         try:
             if id_app not in self.app_list.keys() and not force:
@@ -111,16 +145,20 @@ class SubmitterEngine(object):
                 logger.info("force flag detected, preceeding to undeploy")
         
        
-        dict_object_adaptors = self._instantiate_adaptors(id_app, self.app_list[id_app]['dry_run'])
-        logger.debug("{}".format(dict_object_adaptors))
+        dict_object_adaptors = self._rehydrate(id_app)
+        logger.debug("%s", dict_object_adaptors)
 
 
-        self._undeploy(dict_object_adaptors)
+        with self._phase(id_app, "undeploy"):
+            self._undeploy(dict_object_adaptors)
 
-        self._cleanup(id_app, dict_object_adaptors)
-        if self.app_list:
-            self.app_list.pop(id_app)
-            self._update_json()
+        with self._phase(id_app, "cleanup"):
+            self._cleanup(id_app, dict_object_adaptors)
+        self.pool.close(id_app)
+        with self._app_lock(id_app):
+            self._publish(id_app, None)
+        self._save_state(id_app)
+        self.events.publish(id_app, DONE, action="undeploy")
         logger.info("undeploy process done")
         logger.info("*********************")
 
@@ -140,18 +178,27 @@ class SubmitterEngine(object):
 
         """
 
-        logger.info("****** proceding to the update of the application {}******".format(id_app))
+        logger.info("****** proceding to the update of the application %s******", id_app)
 
         #template = self._micado_parser_upload(path_to_file, parsed_params)
         self.object_config.mapping(template)
         dry_run = self.app_list[id_app]['dry_run']
         
         #dict_object_adaptors = self._instantiate_adaptors(id_app, dry_run, False, template)
-        logger.debug("list of adaptor created: {}".format(dict_object_adaptors))
-        self.app_list.update({id_app: {"components":list(dict_object_adaptors.keys()), "adaptors_object": dict_object_adaptors, "dry_run": dry_run}})
-        self._update(dict_object_adaptors, id_app)
+        dict_object_adaptors = self._bind(id_app, template, dict_object_adaptors)
+        logger.debug("list of adaptor created: %s", dict_object_adaptors)
+        with self._app_lock(id_app):
+            # the outputs and the deployed translations stay until the adaptors replace them
+            self._publish(id_app, dict(self.app_list[id_app], components=list(dict_object_adaptors.keys()), adaptors_object=dict_object_adaptors, dry_run=dry_run))
+        try:
+            with self._phase(id_app, "open"):
+                self._open(dict_object_adaptors)
+            with self._phase(id_app, "update"):
+                self._update(dict_object_adaptors, id_app)
+        finally:
+            self._compact(id_app, dict_object_adaptors)
         logger.info("update process done")
-        self._update_json()
+        self.events.publish(id_app, DONE, action="update", status=self.get_status(id_app))
         logger.info("*******************")
 
     def _validate(self, path_to_file, dry_run=False, validate=False, app_id=None, parsed_params=None):
@@ -168,20 +215,29 @@ class SubmitterEngine(object):
             tuple -- template and dictionary of adaptors
         """
         # MiCADO Validation
-        logger.info("****** Starting the validation process of {} *****".format(path_to_file))
-        template = self._micado_parser_upload(path_to_file, parsed_params)
-        self.object_config.mapping(template)
+        logger.info("****** Starting the validation process of %s *****", path_to_file)
+        if app_id is not None:
+            self.timings[app_id] = {}
+            self.memory.start_job(app_id)
+        with self._phase(app_id, "parse"):
+            template = self._micado_parser_upload(path_to_file, parsed_params)
+        with self._phase(app_id, "mapping"):
+            names = self.object_config.mapping(template)
+        # an update keeps the adaptors of the running app, to take down what the new template drops
+        names += [name for name in self.app_list.get(app_id, {}).get("components") or [] if name not in names]
         #if validate is True:
         #    dry_run = True
         # Adaptors instantiation
         logger.debug("Instantiating the required adaptors")
-        dict_object_adaptors = self._instantiate_adaptors(app_id, dry_run, validate, template)
+        with self._phase(app_id, "instantiate"):
+            dict_object_adaptors = self._instantiate_adaptors(app_id, dry_run, validate, template, names)
         logger.info("Adaptors are successfully instantiated")
-        logger.debug("list of objects adaptor: {}".format(dict_object_adaptors))
+        logger.debug("list of objects adaptor: %s", dict_object_adaptors)
 
         # Adaptors translation
         try:
-            self._translate(dict_object_adaptors)
+            with self._phase(app_id, "translate"):
+                self._translate(dict_object_adaptors, template, app_id)
         except MultiError:
             raise
         except AdaptorCritical:
@@ -216,15 +272,59 @@ class SubmitterEngine(object):
             if self.translated_adaptors:
                 logger.info("Starting clean-up on translated files")
                 self._cleanup(app_id, self.translated_adaptors)
-            if self.app_list:
+            if app_id in self.app_list:
                 logger.info("Removing application ID from deployment")
-                self.app_list.pop(app_id)
-                self._update_json()
+                with self._app_lock(app_id):
+                    self._publish(app_id, None)
+                self._save_state(app_id)
 
             logger.info("The deployment wasn't successful...")
             logger.info("*******************")
             raise
 
+    @contextmanager
+    def _phase(self, app_id, phase):
+        """ Time, trace and account for the memory of a phase of the job of app_id, adding up repeated phases """
+        start = time.time()
+        try:
+            with tracing.span(phase):
+                if app_id is None:
+                    yield
+                else:
+                    with self.memory.phase(app_id, phase):
+                        yield
+        finally:
+            duration = time.time() - start
+            metrics.PHASE_SECONDS.observe(duration, phase=phase)
+            if app_id is not None:
+                timings = self.timings.setdefault(app_id, {})
+                timings[phase] = round(timings.get(phase, 0) + duration, 3)
+
+    @contextmanager
+    def _adaptor_step(self, adaptor, operation):
+        """ Measure and trace one operation of an adaptor, counting the ones which raise """
+        start = time.time()
+        try:
+            with tracing.span("{}.{}".format(adaptor, operation), adaptor=adaptor):
+                yield
+        except Exception:
+            metrics.ADAPTOR_FAILURES.inc(adaptor=adaptor, operation=operation)
+            raise
+        finally:
+            metrics.ADAPTOR_SECONDS.observe(time.time() - start, adaptor=adaptor, operation=operation)
+
+    def job_report(self, app_id):
+        """ Return the phase timings, memory, adaptor status and outputs of the last job of app_id """
+        try:
+            status = self.get_status(app_id)
+        except KeyError:
+            status = {}
+        return dict(id=app_id,
+                    timings=self.timings.get(app_id, {}),
+                    memory=self.memory.report(app_id),
+                    status=status,
+                    outputs=self.app_list.get(app_id, {}).get("output", {}))
+
     def _micado_parser_upload(self, path, parsed_params):
         """ Parse the file and retrieve the object """
         logger.debug("Instantiation of the submitter and retrieving the template")
@@ -241,17 +341,18 @@ class SubmitterEngine(object):
         PG=PluginsGestion()
         for k in adaptor_list:
             adaptor = PG.get_plugin(k)
-            logger.debug("adaptor found {}".format(adaptor))
+            logger.debug("adaptor found %s", adaptor)
             self.adaptors_class_name.append(adaptor)
-        logger.debug("list of adaptors instantiated: {}".format(self.adaptors_class_name))
+        logger.debug("list of adaptors instantiated: %s", self.adaptors_class_name)
 
 
-    def _instantiate_adaptors(self, app_id, dry_run=False, validate=False, template = None):
+    def _instantiate_adaptors(self, app_id, dry_run=False, validate=False, template = None, names=None):
         """ Instantiate the list of adaptors from the adaptors class list
 
             :params app_id: id of the application
             :params app_ids: list of ids to specify the adaptors (can be None)
             :params template: template of the application
+            :params names: names of the adaptors to instantiate, all of them if None
 
             if provide list of adaptors object and app_id
 
@@ -259,106 +360,219 @@ class SubmitterEngine(object):
 
         """
         adaptors = dict()
+        classes = [adaptor for adaptor in self.adaptors_class_name
+                   if names is None or adaptor.__name__ in names]
         if template is not None:
-            for adaptor in self.adaptors_class_name:
-                logger.debug("instantiate {}, template".format(adaptor))
+            for adaptor in classes:
+                logger.debug("instantiate %s, template", adaptor)
                 if app_id:
                     adaptor_id="{}_{}".format(app_id, adaptor.__name__)
                 else:
                     adaptor_id = adaptor.__name__
                 obj = adaptor(adaptor_id, self.object_config.adaptor_config[adaptor.__name__], dry_run, validate, template = template)
+                self._listen_status(app_id, obj)
                 adaptors[adaptor.__name__] = obj
                 #adaptors.append(obj)
             return adaptors
 
         elif template is None:
-            for adaptor in self.adaptors_class_name:
-                logger.debug("instantiate {}, no template".format(adaptor))
+            for adaptor in classes:
+                logger.debug("instantiate %s, no template", adaptor)
                 if app_id:
                     adaptor_id="{}_{}".format(app_id, adaptor.__name__)
                 else:
                     adaptor_id = adaptor.__name__
                 obj = adaptor(adaptor_id,self.object_config.adaptor_config[adaptor.__name__], dry_run, validate)
+                self._listen_status(app_id, obj)
                 #adaptors.append(obj)
                 adaptors[adaptor.__name__] = obj
 
-                logger.debug("done instntiation of {}".format(adaptor))
+                logger.debug("done instntiation of %s", adaptor)
 
             return adaptors
 
 
-    def _translate(self, adaptors):
-        """ Launch the translate engine """
+    def _listen_status(self, app_id, adaptor):
+        """ Publish the status transitions of an adaptor as events of its application """
+        if app_id is None:
+            return
+        adaptor.status_listener = \
+            lambda obj, status: self._on_status(app_id, obj, status)
+
+    def _on_status(self, app_id, adaptor, status):
+        """ Publish the new status of an adaptor, and store it if the adaptor is live for app_id """
+        name = type(adaptor).__name__
+        self.events.publish(app_id, STATUS, adaptor=name, status=status)
+        live = self.app_list.get(app_id, {}).get("adaptors_object", {})
+        if live.get(name) is adaptor:
+            self.store.update_status(app_id, name, status)
+
+    def _translate(self, adaptors, template=None, app_id=None):
+        """ Launch the translate engine, restoring the translations found in the cache
+
+            When app_id is running, the adaptors start from the translations it deployed,
+            to translate again only what the template changes.
+        """
         logger.debug("launch of translate method")
         logger.info("translate method called in all the adaptors")
         self.translated_adaptors = {}
+        digest = template_digest(template) if template is not None else None
+        deployed = self.app_list.get(app_id, {}).get("translations") or {} if app_id else {}
 
         for step in self.object_config.step_config['translate']:
-            logger.info("translating method call from {}".format(step))
+            if step not in adaptors:
+                logger.debug("%s has nothing to translate, skipping...", step)
+                continue
+            logger.info("translating method call from %s", step)
+            key = self.translations.key(digest, adaptors[step]) if digest else None
+            adaptors[step].translation_key = key
+            self.translated_adaptors[step] = adaptors[step]
+            if key and self._restore_translation(step, adaptors[step], key):
+                continue
+            if deployed.get(step):
+                self._seed_translation(step, adaptors[step], deployed[step])
             while True:
                 try:
-                    self.translated_adaptors[step] = adaptors[step]
-                    adaptors[step].translate()
+                    with self._adaptor_step(step, "translate"):
+                        adaptors[step].translate()
                 except AdaptorError:
                     continue
                 break
+            if key:
+                try:
+                    self.translations.put(key, adaptors[step].translation_state())
+                except NotImplementedError:
+                    pass
+
+    def _restore_translation(self, step, adaptor, key):
+        """ Restore the cached translation of an adaptor, return False if there is none """
+        state = self.translations.get(key)
+        if state is None:
+            metrics.TRANSLATION_CACHE.inc(adaptor=step, result="miss")
+            return False
+        try:
+            with self._adaptor_step(step, "restore"):
+                adaptor.restore_translation(state)
+        except NotImplementedError:
+            metrics.TRANSLATION_CACHE.inc(adaptor=step, result="miss")
+            return False
+        metrics.TRANSLATION_CACHE.inc(adaptor=step, result="hit")
+        logger.info("translation of %s restored from the cache", step)
+        return True
+
+    def _seed_translation(self, step, adaptor, key):
+        """ Give an adaptor the cached translation it deployed, to reuse what did not change """
+        state = self.translations.get(key)
+        if state is None:
+            return
+        try:
+            adaptor.seed_translation(state)
+        except NotImplementedError:
+            return
+        logger.debug("%s translates from its deployed translation", step)
 
     def _execute(self, app_id, adaptors):
         """ method called by the engine to launch the adaptors execute methods """
         logger.info("launch of the execute methods in each adaptors in a serial way")
         self.executed_adaptors = {}
-        self.app_list.setdefault(app_id, {}).setdefault("output", {})
         for step in self.object_config.step_config['execute']:
+            if step not in adaptors:
+                logger.debug("%s has nothing to execute, skipping...", step)
+                continue
             self.executed_adaptors[step] = adaptors[step]
-            adaptors[step].execute()
-            output = getattr(adaptors[step], "output", None)
-            if output:
-                self.app_list[app_id]["output"].update({step:output})
+            with self._adaptor_step(step, "execute"):
+                adaptors[step].execute()
+            self._deployed(app_id, step, adaptors[step])
 
-        self._update_json()
+        self._save_state(app_id)
 
     def _undeploy(self, adaptors):
         """ method called by the engine to launch the adaptor undeploy method of a specific component identified by its ID"""
         logger.info("undeploying component")
         for step in self.object_config.step_config['undeploy']:
+            if step not in adaptors:
+                logger.debug("%s not in initialised/executed adaptors, skipping...", step)
+                continue
             try:
-                adaptors[step].undeploy()
-            except KeyError as e:
-                logger.debug("{} not in initialised/executed adaptors, skipping...".format(e))
+                with self._adaptor_step(step, "undeploy"):
+                    adaptors[step].undeploy()
             except Exception as e:
-                logger.error("error: {}; proceeding to undepployment of the other adaptors".format(e))
+                logger.error("error: %s; proceeding to undepployment of the other adaptors", e)
 
     def _update(self, adaptors, app_id):
         """ method that will translate first the new component and then see if there's a difference, and then execute"""
         logger.info("update of each component related to the application wanted")
-        self.app_list.setdefault(app_id, {}).setdefault("output", {})
+        deployed = self.app_list.get(app_id, {}).get("translations") or {}
         for step in self.object_config.step_config['update']:
-            adaptors[step].update()
-            output = getattr(adaptors[step], "output", None)
+            if step not in adaptors:
+                logger.debug("%s has nothing to update, skipping...", step)
+                continue
+            key = getattr(adaptors[step], "translation_key", None)
+            if key and deployed.get(step) == key:
+                logger.info("%s: same template and adaptor as deployed, nothing to update", step)
+                adaptors[step].status = "Updated (nothing to update)"
+                continue
+            with self._adaptor_step(step, "update"):
+                adaptors[step].update()
+            self._deployed(app_id, step, adaptors[step])
+
+    def _deployed(self, app_id, step, adaptor):
+        """ Record the outputs of an adaptor and the key of the translation it deployed """
+        output = getattr(adaptor, "output", None)
+        key = getattr(adaptor, "translation_key", None)
+        with self._writing(app_id) as app:
             if output:
-                self.app_list[app_id]["output"].update({step:output})
+                app["output"][step] = output
+            app["translations"] = dict(app.get("translations") or {}, **{step: key})
 
     def query(self, query, app_id, dry_run=False):
         """ query """
-        for adaptor in self._instantiate_adaptors(app_id, dry_run).values():
-            try:
-                result = adaptor.query(query)
-            except AttributeError:
-                continue
-            else:
-                return result
+        if app_id not in self.app_list:
+            # saved by the job runner in another process, and not seen by this one yet
+            record = self.store.app(app_id)
+            if record is not None:
+                self.refresh(app_id, record)
+        pooled = app_id in self.app_list
+        if pooled:
+            adaptors = self._rehydrate(app_id)
         else:
-            raise AdaptorCritical("No query method available")
+            adaptors = self._instantiate_adaptors(app_id, dry_run)
+        try:
+            for adaptor in adaptors.values():
+                try:
+                    result = adaptor.query(query)
+                except AttributeError:
+                    continue
+                else:
+                    return result
+            else:
+                raise AdaptorCritical("No query method available")
+        finally:
+            if not pooled:
+                for adaptor in adaptors.values():
+                    close_adaptor(adaptor)
+
+    def query_cache(self, app_id):
+        """ Freshness of the caches the queries of app_id are answered from, by adaptor """
+        result = dict()
+        for name, adaptor in self.pool.get(app_id).items():
+            freshness = adaptor.query_cache()
+            if freshness is not None:
+                result[name] = freshness
+        return result
 
     def get_status(self, app_id):
-        """ method to retrieve the status of the differents adaptor"""
+        """ method to retrieve the status of the differents adaptor, live while a job runs on the app """
         try:
+            app = self.app_list[app_id]
+            if "adaptors_object" not in app:
+                return dict(app.get("status") or {})
             result = dict()
-            for key, value in self.app_list[app_id].get("adaptors_object", {}).items():
+            for key, value in app["adaptors_object"].items():
                 result[key] = value.status
 
         except KeyError:
-            logger.error("application id {} doesn't exist".format(app_id))
+            logger.error("application id %s doesn't exist", app_id)
             raise KeyError
         return result
 
@@ -368,37 +582,175 @@ class SubmitterEngine(object):
 
         logger.info("cleaning up the file after undeployment")
         for step in self.object_config.step_config['cleanup']:
+            if step not in adaptors:
+                logger.debug("%s not in initialised/translated adaptors, skipping...", step)
+                continue
             try:
-                adaptors[step].cleanup()
-            except KeyError as e:
-                logger.debug("{} not in initialised/translated adaptors, skipping...".format(e))
+                with self._adaptor_step(step, "cleanup"):
+                    adaptors[step].cleanup()
             except Exception as e:
-                logger.error("error: {}; proceeding to cleanup of the other adaptors".format(e))
+                logger.error("error: %s; proceeding to cleanup of the other adaptors", e)
+
+
+    def _compact(self, app_id, adaptors):
+        """ Once a job of app_id is done, replace its adaptor objects (and their template, manifests
+        and translated data) by a compact record: the adaptor IDs, the paths and sha256 of the files
+        they wrote, and their status. The adaptors are released to the pool, working from these
+        files in the next queries and jobs, or closed if the app is gone.
+
+        """
+        self.translated_adaptors = {}
+        self.executed_adaptors = {}
+        if "adaptors_object" not in self.app_list.get(app_id, {}):
+            for adaptor in adaptors.values():
+                close_adaptor(adaptor)
+            return
+        with self._writing(app_id) as app:
+            adaptors = app.pop("adaptors_object")
+            app["status"] = self.get_status(app_id)
+            app["adaptors"] = {name: getattr(adaptor, "ID", None) for name, adaptor in adaptors.items()}
+            app["artifacts"] = {name: {path: utils.file_digest(path) for path in adaptor.artifacts()}
+                                for name, adaptor in adaptors.items()}
+        self._save_state(app_id)
+        self.pool.put(app_id, adaptors)
+
+    def _rehydrate(self, app_id):
+        """ Return the pooled adaptors app_id was deployed with, instantiating and opening the missing
+        ones without template, to work from the files they wrote
 
+        """
+        app = self.app_list.get(app_id, {})
+        names = app.get("components")
+        if names is None:
+            names = [adaptor.__name__ for adaptor in self.adaptors_class_name]
+        with self.pool.lock(app_id):
+            pooled = self.pool.get(app_id)
+            missing = [name for name in names if name not in pooled]
+            if missing:
+                for name, artifacts in app.get("artifacts", {}).items():
+                    for path, digest in artifacts.items():
+                        if name in missing and digest and utils.file_digest(path) != digest:
+                            logger.warning("%s of %s changed on disk since its last job", path, name)
+                adaptors = self._instantiate_adaptors(app_id, app.get("dry_run", False), names=missing)
+                self._open(adaptors)
+                self.pool.put(app_id, adaptors)
+                pooled.update(adaptors)
+        return {name: pooled[name] for name in names if name in pooled}
+
+    def _open(self, adaptors):
+        """ Open the clients of the adaptors, which keep them while they are pooled """
+        for name, adaptor in adaptors.items():
+            with self._adaptor_step(name, "open"):
+                adaptor.open()
+
+    def _bind(self, app_id, template, adaptors):
+        """ Swap in the pooled adaptors of app_id, bound to template, for the fresh ones of an update
+
+            The pooled adaptors take the translation of the fresh ones when they can. Adaptors
+            which can't be bound to a new template keep their fresh instance.
+        """
+        pooled = self.pool.get(app_id)
+        bound = dict(adaptors)
+        for name in adaptors:
+            if name not in pooled:
+                continue
+            try:
+                pooled[name].bind(template)
+            except NotImplementedError:
+                logger.debug("%s can't be rebound, using a new instance", name)
+            else:
+                pooled[name].translation_key = getattr(adaptors[name], "translation_key", None)
+                try:
+                    pooled[name].adopt_translation(adaptors[name])
+                except NotImplementedError:
+                    logger.debug("%s translates the template again", name)
+                bound[name] = pooled[name]
+        return bound
 
-    def _update_json(self):
-        """ method called by the engine to update the json file that will contain the dictionary of the IDs of the applications
-        and the list of the IDs of its components link to the ID of the app.
+    @property
+    def app_list(self):
+        """ Read-only snapshot of the applications, never changed once published
 
+            Readers take no lock: they keep a consistent view even while a job publishes the next one.
         """
-        data_to_save = dict()
-        if isinstance(self.app_list, dict):
-            for key, value in self.app_list.items():
-                data_to_save.setdefault(key, {})
-                if isinstance(self.app_list[key], dict):
-                    for k, v in self.app_list[key].items():
-                        if "components" in k or "outputs" in k or "dry_run" in k: 
-                            data_to_save[key].setdefault(k,v)
-        if not data_to_save:
-            logger.debug("data to save is empty")
-            data_to_save = {}
+        return self._snapshot
+
+    def _publish_all(self, apps):
+        """ Publish a new snapshot holding apps, replacing every application """
+        with self._publish_lock:
+            self._snapshot = MappingProxyType({app_id: MappingProxyType(dict(app)) for app_id, app in apps.items()})
+
+    def _publish(self, app_id, record):
+        """ Publish a new snapshot with record as the application app_id, or without it if record is None """
+        with self._publish_lock:
+            apps = dict(self._snapshot)
+            if record is None:
+                apps.pop(app_id, None)
+            else:
+                apps[app_id] = MappingProxyType(dict(record))
+            self._snapshot = MappingProxyType(apps)
+
+    def _app_lock(self, app_id):
+        """ Return the lock serializing the writers of app_id """
+        return self._app_locks.setdefault(app_id, threading.RLock())
 
+    @contextmanager
+    def _writing(self, app_id):
+        """ Yield a copy of the record of app_id (a new one for an unknown app), published on exit
+
+            The copy and its output dictionary may be changed freely; nothing is published if the
+            with block raises.
+        """
+        with self._app_lock(app_id):
+            app = dict(self._snapshot.get(app_id) or {})
+            app["output"] = dict(app.get("output") or {})
+            yield app
+            self._publish(app_id, app)
+
+    def reload(self):
+        """ (Re)load the applications from the state store, e.g. when taking over the job queue """
+        self._publish_all(self.store.apps())
+        for app_id in self.pool.apps():
+            if app_id not in self.app_list:
+                self.pool.close(app_id)
+
+    def refresh(self, app_id, record):
+        """ Publish the record of app_id saved by the job runner in another process, None once the
+        app is gone. Its pooled adaptors are closed when the app is gone or its adaptors wrote other
+        files, so that the next query opens them on the files of the runner.
 
+        """
+        with self._app_lock(app_id):
+            previous = self.app_list.get(app_id)
+            if previous is not None and "adaptors_object" in previous:
+                return
+            self._publish(app_id, record)
+        if record is None or previous is None or previous.get("artifacts") != record.get("artifacts"):
+            self.pool.close(app_id)
+
+    def _save_state(self, app_id):
+        """ method called by the engine to save the record of an application in the state store,
+        or to remove it from the store if the application is gone. The record holds the components
+        of the application, its outputs, its dry-run flag, the status of its adaptors and, once
+        compacted, their IDs and the digests of the files they wrote, and the keys of the translations
+        they deployed.
+
+        """
+        if app_id not in self.app_list:
+            self.store.delete_app(app_id)
+            return
+        app = self.app_list[app_id]
+        record = dict(components=app.get("components"),
+                      output=app.get("output", {}),
+                      dry_run=app.get("dry_run"),
+                      status=self.get_status(app_id) or app.get("status", {}),
+                      adaptors=app.get("adaptors", {}),
+                      artifacts=app.get("artifacts", {}),
+                      translations=app.get("translations", {}))
         try:
-            with open(JSON_FILE, 'w') as outfile:
-                json.dump(data_to_save, outfile)
+            self.store.save_app(app_id, record)
         except Exception as e:
-            logger.warning("{}".format(e))
+            logger.warning("%s", e)
 
 
     def _save_file(self, id_app, path):
@@ -0,0 +1,109 @@
+"""
+MiCADO Submitter Engine Events
+------------------------------
+A small publish/subscribe broker carrying the status transitions of the
+applications (adaptor status, job queue position, errors) to the clients
+streaming them, so they do not have to poll the status endpoint.
+
+Every event also bumps a version counter of its application and a global
+one, which the API uses to answer conditional and long-polling requests.
+When the broker is given a state store, the versions are the ones of the
+store instead, so that they are shared by every worker process.
+"""
+import threading
+import queue
+import time
+import logging
+
+logger = logging.getLogger("submitter."+__name__)
+
+EVENT_TYPES = (STATUS, QUEUE, DONE, ERROR) = ("status", "queue", "done", "error")
+STORE_POLL = 0.25
+
+
+class EventBroker(object):
+    """
+    Fan out the events of an application to every subscriber of that application.
+
+    Each subscriber gets its own bounded queue. A subscriber which does not keep up
+    loses its oldest events rather than slowing down the engine publishing them.
+    """
+
+    def __init__(self, backlog=100, store=None):
+        logger.debug("init of the EventBroker")
+        self.backlog = backlog
+        self.store = store
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._subscribers = dict()
+        self._versions = dict()
+        self._version = 0
+
+    def version(self, app_id=None):
+        """ Return the version of app_id, or the global version if app_id is None """
+        if self.store:
+            return self.store.version(app_id)
+        with self._lock:
+            return self._get_version(app_id)
+
+    def wait(self, app_id, version, timeout):
+        """ Block until the version of app_id (or the global one) differs from version
+
+        Returns the current version, which is unchanged if the timeout expired.
+        With a store, changes made by other processes are seen within STORE_POLL seconds.
+        """
+        if not self.store:
+            with self._changed:
+                self._changed.wait_for(lambda: self._get_version(app_id) != version, timeout)
+                return self._get_version(app_id)
+
+        deadline = time.time() + timeout
+        current = self.store.version(app_id)
+        while current == version and time.time() < deadline:
+            with self._changed:
+                self._changed.wait(min(STORE_POLL, max(deadline - time.time(), 0)))
+            current = self.store.version(app_id)
+        return current
+
+    def _get_version(self, app_id):
+        if app_id is None:
+            return self._version
+        return self._versions.get(app_id, 0)
+
+    def subscribe(self, app_id):
+        """ Return a queue receiving every event published for app_id """
+        events = queue.Queue(maxsize=self.backlog)
+        with self._lock:
+            self._subscribers.setdefault(app_id, []).append(events)
+        return events
+
+    def unsubscribe(self, app_id, events):
+        """ Stop delivering the events of app_id to the given queue """
+        with self._lock:
+            subscribers = self._subscribers.get(app_id, [])
+            if events in subscribers:
+                subscribers.remove(events)
+            if not subscribers:
+                self._subscribers.pop(app_id, None)
+
+    def publish(self, app_id, event_type, **data):
+        """ Deliver an event to the subscribers of app_id, never blocking the caller """
+        if app_id is None:
+            return
+        event = dict(event=event_type, id=app_id, time=time.time(), **data)
+        with self._changed:
+            self._version += 1
+            self._versions[app_id] = self._versions.get(app_id, 0) + 1
+            self._changed.notify_all()
+            subscribers = list(self._subscribers.get(app_id, []))
+        for events in subscribers:
+            while True:
+                try:
+                    events.put_nowait(event)
+                except queue.Full:
+                    try:
+                        events.get_nowait()
+                    except queue.Empty:
+                        pass
+                    continue
+                break
@@ -0,0 +1,110 @@
+"""
+MiCADO Submitter Engine Logging
+-------------------------------
+Set up of the logging of the submitter. The threads logging only put the
+records on a queue, and a listener thread formats and writes them to the log
+file and the console, so a slow disk never holds up a job or a request.
+
+The records can be written as JSON lines, and a module logging more than
+its share in a burst has its records dropped, with a count of the dropped
+ones logged once the burst is over.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+
+TEXT_FORMAT = "%(asctime)s - %(lineno)d - %(name)s - %(levelname)s - %(message)s"
+CONSOLE_FORMAT = "%(name)-12s: %(levelname)-8s %(message)s"
+FORMATS = (TEXT, JSON) = ("text", "json")
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """ Format a record as a JSON object on one line """
+
+    def format(self, record):
+        document = dict(time=self.formatTime(record), level=record.levelname, logger=record.name,
+                        line=record.lineno, thread=record.threadName, message=record.getMessage())
+        if record.exc_info:
+            document["exception"] = self.formatException(record.exc_info)
+        return json.dumps(document, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """ Let at most rate records per second through for each logger, with bursts of up to burst records """
+
+    def __init__(self, rate, burst=None):
+        super(RateLimitFilter, self).__init__()
+        self.rate = float(rate)
+        self.burst = float(burst or rate * 10)
+        self._buckets = dict()
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.ERROR:
+            return True
+        now = time.time()
+        with self._lock:
+            tokens, last, dropped = self._buckets.get(record.name, (self.burst, now, 0))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens < 1:
+                self._buckets[record.name] = (tokens, now, dropped + 1)
+                return False
+            self._buckets[record.name] = (tokens - 1, now, 0)
+        if dropped:
+            record.msg = "[%s records dropped by rate limit] " % dropped + str(record.msg)
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """ Queue the records as they are, leaving the formatting to the listener thread """
+
+    def prepare(self, record):
+        return record
+
+
+def setup(level, filename, log_format=TEXT, rate_limit=0):
+    """ Send the records of every logger through a queue to the log file and the console
+
+        Called again, it replaces the previous set up.
+    """
+    global _listener
+    formatter = JsonFormatter() if log_format == JSON else logging.Formatter(TEXT_FORMAT)
+    file_handler = logging.FileHandler(filename)
+    file_handler.setFormatter(formatter)
+    console = logging.StreamHandler()
+    console.setLevel(level)
+    console.setFormatter(JsonFormatter() if log_format == JSON else logging.Formatter(CONSOLE_FORMAT))
+
+    records = queue.Queue(-1)
+    handler = _QueueHandler(records)
+    if rate_limit:
+        handler.addFilter(RateLimitFilter(rate_limit))
+
+    shutdown()
+    root = logging.getLogger('')
+    root.setLevel(level)
+    root.addHandler(handler)
+    _listener = logging.handlers.QueueListener(records, file_handler, console, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+@atexit.register
+def shutdown():
+    """ Write out the queued records and stop the listener thread """
+    global _listener
+    root = logging.getLogger('')
+    for old in list(root.handlers):
+        if isinstance(old, _QueueHandler):
+            root.removeHandler(old)
+    if _listener:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
@@ -0,0 +1,176 @@
+"""
+MiCADO Submitter Engine Memory
+------------------------------
+Memory accounting of the jobs: the resident set size before and after each
+phase of a job and its peak during the phase and, when turned on, tracemalloc
+snapshots diffed around each phase to show which lines allocated what.
+
+tracemalloc and the process peak cover the whole process, so a phase running
+alongside another job's phase is charged with its allocations too.
+
+With a state store, the settings are cached until refresh() reloads them, and
+the report of a job is saved to the store once the job is done.
+"""
+import resource
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+import logging
+
+logger = logging.getLogger("submitter."+__name__)
+
+SETTING = "tracemalloc"
+REPORTS = "memory"
+DEFAULTS = dict(enabled=False, frames=1, top=10)
+KEEP_REPORTS = 50
+
+
+def rss():
+    """ Return the current and the peak resident set size of the process in kB """
+    current = peak = None
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    current = int(line.split()[1])
+                elif line.startswith("VmHWM:"):
+                    peak = int(line.split()[1])
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return current, peak
+
+
+def reset_peak():
+    """ Reset the peak resident set size of the process, return False if the kernel does not allow it """
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        return False
+    return True
+
+
+class MemoryTracker(object):
+    """ Account for the memory of each phase of the jobs, keeping the report of the last job of each app """
+
+    def __init__(self, store=None):
+        self.store = store
+        self._settings = dict(DEFAULTS)
+        self._reports = dict()
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def configure(self, enabled, frames=None, top=None):
+        """ Turn the tracemalloc snapshots on or off, for the next jobs of every worker process """
+        settings = dict(self.settings(), enabled=bool(enabled))
+        if frames:
+            settings["frames"] = int(frames)
+        if top:
+            settings["top"] = int(top)
+        if self.store:
+            self.store.update_setting(SETTING, lambda old: settings, DEFAULTS)
+        self._settings = settings
+        return settings
+
+    def settings(self):
+        return dict(self._settings)
+
+    def refresh(self):
+        """ Reload the settings from the state store, once another process changed them """
+        if self.store:
+            self._settings = dict(DEFAULTS, **self.store.setting(SETTING, DEFAULTS))
+
+    def start_job(self, app_id):
+        """ Forget the report of the previous job of app_id, and apply the tracemalloc setting """
+        settings = self.settings()
+        if settings["enabled"] and not tracemalloc.is_tracing():
+            tracemalloc.start(settings["frames"])
+            logger.info("tracemalloc started")
+        elif not settings["enabled"] and tracemalloc.is_tracing():
+            tracemalloc.stop()
+            logger.info("tracemalloc stopped")
+        with self._lock:
+            self._reports[app_id] = dict(started=time.time(), phases={})
+
+    @contextmanager
+    def phase(self, app_id, phase):
+        """ Account for the memory of the with block as a phase of the job of app_id """
+        top = self.settings()["top"] if tracemalloc.is_tracing() else 0
+        before = tracemalloc.take_snapshot() if top else None
+        peak_reset = reset_peak()
+        rss_before, _ = rss()
+        try:
+            yield
+        finally:
+            rss_after, peak = rss()
+            entry = dict(rss_before=rss_before, rss_after=rss_after,
+                         rss_delta=rss_after - rss_before if rss_after and rss_before else None,
+                         peak_rss=peak, peak_is_phase=peak_reset)
+            if before is not None and tracemalloc.is_tracing():
+                entry["allocations"] = _diff(before, tracemalloc.take_snapshot(), top)
+            self._add(app_id, phase, entry)
+
+    def _add(self, app_id, phase, entry):
+        with self._lock:
+            report = self._reports.setdefault(app_id, dict(started=time.time(), phases={}))
+            phases = report["phases"]
+            if phase in phases:
+                entry["rss_before"] = phases[phase]["rss_before"]
+                entry["peak_rss"] = max(phases[phase]["peak_rss"] or 0, entry["peak_rss"] or 0)
+            phases[phase] = entry
+            report["peak_rss"] = max(item["peak_rss"] or 0 for item in phases.values())
+
+    def save(self, app_id):
+        """ Save the report of the job of app_id to the state store, for every worker process """
+        with self._lock:
+            if app_id not in self._reports:
+                return
+            report = dict(self._reports[app_id], phases=dict(self._reports[app_id]["phases"]))
+        if self.store:
+            try:
+                self.store.update_setting(REPORTS, lambda reports: _keep(reports, app_id, report), {})
+            except Exception as e:
+                logger.warning("cannot save the memory report of %s: %s", app_id, e)
+
+    def report(self, app_id):
+        """ Return the memory report of the last job of app_id, or an empty dictionary """
+        with self._lock:
+            if app_id in self._reports:
+                return dict(self._reports[app_id])
+        return self.reports().get(app_id, {})
+
+    def reports(self):
+        """ Return the reports of the last job of every app, from every worker process """
+        if self.store:
+            return self.store.setting(REPORTS, {})
+        with self._lock:
+            return dict(self._reports)
+
+    def process(self):
+        """ Return the memory of this process, and what tracemalloc traces if it is on """
+        current, peak = rss()
+        info = dict(rss=current, peak_rss=peak, tracemalloc=tracemalloc.is_tracing())
+        if tracemalloc.is_tracing():
+            traced, traced_peak = tracemalloc.get_traced_memory()
+            info.update(traced_kb=traced // 1024, traced_peak_kb=traced_peak // 1024)
+        return info
+
+
+def _diff(before, after, top):
+    """ Return the lines which allocated the most between two snapshots """
+    ignore = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__))
+    stats = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "lineno")
+    return [dict(where="{}:{}".format(stat.traceback[0].filename, stat.traceback[0].lineno),
+                 size_kb=round(stat.size_diff / 1024, 1), count=stat.count_diff)
+            for stat in stats[:top] if stat.size_diff]
+
+
+def _keep(reports, app_id, report):
+    """ Add the report of app_id, keeping the most recent ones """
+    reports = dict(reports or {})
+    reports.pop(app_id, None)
+    reports[app_id] = report
+    for old in sorted(reports, key=lambda key: reports[key].get("started", 0))[:-KEEP_REPORTS]:
+        reports.pop(old)
+    return reports
@@ -0,0 +1,239 @@
+"""
+MiCADO Submitter Engine Metrics
+-------------------------------
+Counters, gauges and histograms of the submitter (engine phases, adaptor
+operations, job queue, API requests), rendered in the Prometheus text
+exposition format without any external service or library.
+
+With several worker processes, each process dumps its counters and
+histograms to a directory from time to time, and the process answering
+the scrape adds up its own values with the dumps of the other live ones.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+import logging
+
+logger = logging.getLogger("submitter."+__name__)
+
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+METRIC_TYPES = (COUNTER, GAUGE, HISTOGRAM) = ("counter", "gauge", "histogram")
+
+
+class Metric(object):
+    """ Base class of the metrics, holding one value per set of label values """
+    type = None
+
+    def __init__(self, name, documentation, labels=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = dict()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError("{} expects the labels {}".format(self.name, self.labels))
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def samples(self):
+        """ Return a list of (label values, value) """
+        with self._lock:
+            return [(key, _copy(value)) for key, value in self._values.items()]
+
+    def combine(self, value, other):
+        """ Return the value of this process added to the value of another process """
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """ A value which only goes up """
+    type = COUNTER
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def combine(self, value, other):
+        return (value or 0) + other
+
+
+class Gauge(Metric):
+    """ A value which goes up and down, only reported by the process answering the scrape """
+    type = GAUGE
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def combine(self, value, other):
+        return value
+
+
+class Histogram(Metric):
+    """ Observations counted in cumulative buckets, with their sum and count """
+    type = HISTOGRAM
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super(Histogram, self).__init__(name, documentation, labels, registry)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            counts = [bucket_count + (1 if value <= bound else 0)
+                      for bucket_count, bound in zip(counts, self.buckets)]
+            self._values[key] = (counts, total + value, count + 1)
+
+    @contextmanager
+    def time(self, **labels):
+        """ Observe the time spent in the with block """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.observe(time.time() - start, **labels)
+
+    def combine(self, value, other):
+        counts, total, count = value or ([0] * len(self.buckets), 0.0, 0)
+        other_counts, other_total, other_count = other
+        return ([a + b for a, b in zip(counts, other_counts)], total + other_total, count + other_count)
+
+
+class Registry(object):
+    """ The set of metrics of the process """
+
+    def __init__(self):
+        self._metrics = []
+        self.directory = None
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def export(self):
+        """ Return the counters and histograms of this process as a JSON-able dictionary """
+        return {metric.name: [[list(key), value] for key, value in metric.samples()]
+                for metric in self._metrics if metric.type != GAUGE}
+
+    def dump(self):
+        """ Write the export of this process to the metrics directory, if one is set """
+        if not self.directory:
+            return
+        path = os.path.join(self.directory, "{}.json".format(os.getpid()))
+        try:
+            with open(path + ".tmp", "w") as dump:
+                json.dump(self.export(), dump)
+            os.rename(path + ".tmp", path)
+        except OSError as e:
+            logger.warning("cannot dump the metrics: %s", e)
+
+    def render(self):
+        """ Return every metric in the Prometheus text format, with the other processes added up """
+        metrics = {metric.name: metric for metric in self._metrics}
+        merged = {metric.name: dict(metric.samples()) for metric in self._metrics}
+        for export in self._other_exports():
+            for name, samples in export.items():
+                if name not in metrics:
+                    continue
+                for key, value in samples:
+                    key = tuple(key)
+                    if metrics[name].type != GAUGE:
+                        merged[name][key] = metrics[name].combine(merged[name].get(key), value)
+
+        lines = []
+        for metric in self._metrics:
+            lines.append("# HELP {} {}".format(metric.name, metric.documentation))
+            lines.append("# TYPE {} {}".format(metric.name, metric.type))
+            for key, value in sorted(merged[metric.name].items()):
+                labels = list(zip(metric.labels, key))
+                if metric.type == HISTOGRAM:
+                    counts, total, count = value
+                    for bound, bucket_count in zip(metric.buckets, counts):
+                        lines.append(_sample(metric.name + "_bucket", labels + [("le", _number(bound))], bucket_count))
+                    lines.append(_sample(metric.name + "_bucket", labels + [("le", "+Inf")], count))
+                    lines.append(_sample(metric.name + "_sum", labels, total))
+                    lines.append(_sample(metric.name + "_count", labels, count))
+                else:
+                    lines.append(_sample(metric.name, labels, value))
+        return "\n".join(lines) + "\n"
+
+    def _other_exports(self):
+        """ Yield the dumps of the other live processes, removing the ones of dead processes """
+        if not self.directory or not os.path.isdir(self.directory):
+            return
+        for filename in os.listdir(self.directory):
+            pid, extension = os.path.splitext(filename)
+            if extension != ".json" or not pid.isdigit() or int(pid) == os.getpid():
+                continue
+            path = os.path.join(self.directory, filename)
+            if not _alive(int(pid)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(path) as dump:
+                    yield json.load(dump)
+            except (OSError, ValueError) as e:
+                logger.debug("skipping metrics dump %s: %s", path, e)
+
+
+def _copy(value):
+    if isinstance(value, tuple):
+        return (list(value[0]), value[1], value[2])
+    return value
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _number(value):
+    return repr(float(value)) if value != int(value) else "{}.0".format(int(value))
+
+
+def _sample(name, labels, value):
+    if labels:
+        text = ",".join('{}="{}"'.format(label, str(val).replace("\\", "\\\\").replace('"', '\\"'))
+                        for label, val in labels)
+        name = "{}{{{}}}".format(name, text)
+    return "{} {}".format(name, float(value))
+
+
+REGISTRY = Registry()
+
+PHASE_SECONDS = Histogram("submitter_phase_seconds",
+                          "Time spent in each phase of the jobs of the engine", ["phase"])
+ADAPTOR_SECONDS = Histogram("submitter_adaptor_seconds",
+                            "Time spent by each adaptor in each operation", ["adaptor", "operation"])
+ADAPTOR_FAILURES = Counter("submitter_adaptor_failures_total",
+                           "Operations of each adaptor which raised an error", ["adaptor", "operation"])
+JOB_QUEUE_SECONDS = Histogram("submitter_job_queue_seconds",
+                              "Time the jobs waited in the queue before running", ["action"])
+JOBS = Counter("submitter_jobs_total", "Jobs run, by action and result", ["action", "result"])
+QUEUE_DEPTH = Gauge("submitter_queue_depth", "Jobs waiting in the queue")
+RUNNING_APPS = Gauge("submitter_running_apps", "Applications deployed by the submitter")
+HTTP_REQUESTS = Counter("submitter_http_requests_total",
+                        "Requests answered by the API", ["endpoint", "method", "status"])
+HTTP_SECONDS = Histogram("submitter_http_request_seconds",
+                         "Time spent answering the API requests", ["endpoint", "method"],
+                         buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60))
+KUBERNETES_SECONDS = Histogram("submitter_kubernetes_api_seconds",
+                               "Time spent in the Kubernetes API calls applying and deleting objects", ["operation"])
+OCCOPUS_BUILD_SECONDS = Histogram("submitter_occopus_build_seconds",
+                                  "Time spent building the Occopus infrastructure")
+TRANSLATION_CACHE = Counter("submitter_translation_cache_total",
+                            "Lookups of the translation cache, by adaptor and result", ["adaptor", "result"])
@@ -0,0 +1,64 @@
+"""
+MiCADO Submitter Engine Adaptor Pool
+------------------------------------
+One open instance of each adaptor of each application, kept between jobs so
+that queries, updates and undeploys reuse its backend clients (Docker, the
+Kubernetes API, HTTP sessions) instead of setting them up again.
+
+Pooled instances are released once a job is done: they drop their template
+and translated data and keep only what they need to work from their files.
+"""
+import threading
+import logging
+
+logger = logging.getLogger("submitter."+__name__)
+
+
+def close(adaptor):
+    """ Close the clients of an adaptor, logging the errors """
+    try:
+        adaptor.close()
+    except Exception as e:
+        logger.warning("cannot close %s: %s", type(adaptor).__name__, e)
+
+
+class AdaptorPool(object):
+    """ Keep the open adaptor instances of every application, by adaptor name """
+
+    def __init__(self):
+        self._apps = dict()
+        self._locks = dict()
+        self._lock = threading.Lock()
+
+    def lock(self, app_id):
+        """ Return the lock to hold while instantiating the adaptors of app_id """
+        return self._locks.setdefault(app_id, threading.RLock())
+
+    def get(self, app_id):
+        """ Return the pooled adaptors of app_id, by name """
+        with self._lock:
+            return dict(self._apps.get(app_id, {}))
+
+    def put(self, app_id, adaptors):
+        """ Release adaptors and pool them for app_id, closing the instances they replace """
+        for adaptor in adaptors.values():
+            adaptor.release()
+        with self._lock:
+            pooled = self._apps.setdefault(app_id, dict())
+            replaced = [pooled[name] for name, adaptor in adaptors.items()
+                        if name in pooled and pooled[name] is not adaptor]
+            pooled.update(adaptors)
+        for adaptor in replaced:
+            close(adaptor)
+
+    def close(self, app_id):
+        """ Close and forget the adaptors of app_id """
+        with self._lock:
+            adaptors = self._apps.pop(app_id, {})
+        for adaptor in adaptors.values():
+            close(adaptor)
+
+    def apps(self):
+        """ Return the ids of the apps with pooled adaptors """
+        with self._lock:
+            return list(self._apps)
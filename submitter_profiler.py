@@ -0,0 +1,176 @@
+"""
+MiCADO Submitter Engine Profiler
+--------------------------------
+CPU profiling of live jobs, turned on for the next N jobs or for a time
+window without restarting the submitter. Each profiled job leaves a pstats
+file (cProfile) or a collapsed-stack file (sampling, for flame graphs) in
+the profile directory, named after the application and the job stage.
+
+The armed state is a setting of the state store, so that arming it from any
+worker process applies to the process running the jobs. Each process caches
+it until refresh() reloads it.
+"""
+import cProfile
+import collections
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+import logging
+
+logger = logging.getLogger("submitter."+__name__)
+
+MODES = (CPROFILE, SAMPLING) = ("cprofile", "sampling")
+EXTENSIONS = {CPROFILE: ".pstats", SAMPLING: ".collapsed"}
+SAMPLE_INTERVAL = 0.005
+SETTING = "profiling"
+DISARMED = dict(jobs=0, until=0, mode=CPROFILE)
+
+
+class Profiler(object):
+    """ Decide which jobs get profiled and write their profiles to a directory """
+
+    def __init__(self, directory, store=None):
+        self.directory = directory
+        self.store = store
+        self._state = dict(DISARMED)
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def arm(self, jobs=0, seconds=0, mode=CPROFILE):
+        """ Profile the next jobs, or every job for the next seconds, replacing what was armed """
+        if mode not in MODES:
+            raise ValueError("profiling mode must be one of {}".format(", ".join(MODES)))
+        state = dict(jobs=max(int(jobs), 0), until=time.time() + float(seconds) if seconds else 0, mode=mode)
+        self._update(lambda old: state)
+        logger.info("profiling armed: %s", state)
+        return self.state()
+
+    def disarm(self):
+        return self.arm()
+
+    def state(self):
+        """ Return what is armed, and whether the next job would be profiled """
+        state = self._get()
+        return dict(state, active=state["jobs"] > 0 or state["until"] > time.time())
+
+    def claim(self):
+        """ Return the mode to profile the next job with, using up one of the armed jobs, or None """
+        if not self.state()["active"]:
+            return None
+        claimed = []
+
+        def take(state):
+            state = dict(state or DISARMED)
+            if state["until"] > time.time():
+                claimed.append(state["mode"])
+            elif state["jobs"] > 0:
+                state["jobs"] -= 1
+                claimed.append(state["mode"])
+            return state
+        self._update(take)
+        return claimed[0] if claimed else None
+
+    def refresh(self):
+        """ Reload the armed state from the state store, once another process changed it """
+        if self.store:
+            state = self.store.setting(SETTING, DISARMED)
+            with self._lock:
+                self._state = state
+
+    def _get(self):
+        with self._lock:
+            return dict(self._state)
+
+    def _update(self, update):
+        if self.store:
+            state = self.store.update_setting(SETTING, update, DISARMED)
+            with self._lock:
+                self._state = state
+            return state
+        with self._lock:
+            self._state = update(dict(self._state))
+            return self._state
+
+    @contextmanager
+    def profile(self, app_id, stage, mode):
+        """ Profile the with block in the given mode, doing nothing if mode is None """
+        if mode is None:
+            yield
+            return
+        if mode == SAMPLING:
+            profiler = _Sampler(threading.get_ident())
+        else:
+            profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            logger.warning("cannot profile %s of %s: %s", stage, app_id, e)
+            yield
+            return
+        try:
+            yield
+        finally:
+            profiler.disable()
+            self._write(profiler, app_id, stage, mode)
+
+    def _write(self, profiler, app_id, stage, mode):
+        name = "{}_{}_{}".format(app_id, stage, time.strftime("%Y%m%dT%H%M%S"))
+        path = os.path.join(self.directory, re.sub(r"[^A-Za-z0-9_.-]", "_", name) + EXTENSIONS[mode])
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            profiler.dump_stats(path)
+        except OSError as e:
+            logger.error("cannot write the profile of %s of %s: %s", stage, app_id, e)
+        else:
+            logger.info("profile of %s of %s written to %s", stage, app_id, path)
+
+    def profiles(self):
+        """ Return the profile files, newest first """
+        try:
+            names = [name for name in os.listdir(self.directory)
+                     if os.path.splitext(name)[1] in EXTENSIONS.values()]
+        except OSError:
+            return []
+        files = []
+        for name in names:
+            stat = os.stat(os.path.join(self.directory, name))
+            files.append(dict(name=name, size=stat.st_size, time=stat.st_mtime))
+        return sorted(files, key=lambda item: item["time"], reverse=True)
+
+
+class _Sampler(object):
+    """ Sample the stack of one thread at a fixed interval, counting the collapsed stacks """
+
+    def __init__(self, ident, interval=SAMPLE_INTERVAL):
+        self.ident = ident
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def enable(self):
+        self._thread.start()
+
+    def disable(self):
+        self._done.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.ident)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append("{}:{}".format(os.path.basename(code.co_filename), code.co_name))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def dump_stats(self, path):
+        """ Write one 'frame;frame;frame count' line per stack, the input of flamegraph.pl """
+        with open(path, "w") as collapsed:
+            for stack, count in self.stacks.most_common():
+                collapsed.write("{} {}\n".format(stack, count))
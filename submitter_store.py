@@ -0,0 +1,251 @@
+"""
+MiCADO Submitter Engine State Store
+-----------------------------------
+The state of the applications and the job queue, kept in a local SQLite
+database so that several API worker processes can share them.
+
+Every change of an application (its record or one of its jobs) bumps the
+version of that application and a global version, which clients use for
+conditional requests and which the worker processes watch to stream the
+changes made by another process. Every change of a setting bumps a version
+of the settings, which the worker processes watch to reload the settings
+they cache.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import logging
+
+logger = logging.getLogger("submitter."+__name__)
+
+JOB_STATES = (QUEUED, RUNNING, DONE, FAILED) = ("queued", "running", "done", "failed")
+GLOBAL = "*"
+SETTINGS = "@settings"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS apps (id TEXT PRIMARY KEY, record TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS versions (id TEXT PRIMARY KEY, version INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS jobs (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    app_id TEXT NOT NULL,
+    action TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL,
+    queued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, seq);
+"""
+
+
+class StateStore(object):
+    """
+    SQLite backed store of the application records and of the job queue.
+
+    Each thread gets its own connection. The database runs in WAL mode so that
+    readers in any process never wait for the writer.
+    """
+
+    def __init__(self, path):
+        logger.debug("init of the StateStore on %s", path)
+        self.path = path
+        self._local = threading.local()
+        self._connection().executescript(SCHEMA)
+        with self._transaction() as db:
+            row = db.execute("SELECT value FROM meta WHERE key='instance'").fetchone()
+            if row:
+                self.instance_id = row[0]
+            else:
+                self.instance_id = uuid.uuid4().hex[:8]
+                db.execute("INSERT INTO meta VALUES ('instance', ?)", (self.instance_id,))
+
+    def _connection(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _transaction(self):
+        return _Transaction(self._connection())
+
+    def _bump(self, db, app_id, *keys):
+        """ Bump the version of app_id and the global one, or the versions of keys if given """
+        for key in keys or (app_id, GLOBAL):
+            db.execute("INSERT OR IGNORE INTO versions VALUES (?, 0)", (key,))
+            db.execute("UPDATE versions SET version = version + 1 WHERE id = ?", (key,))
+
+    def setting(self, key, default=None):
+        """ Return the JSON value of a setting shared by the worker processes """
+        row = self._connection().execute("SELECT value FROM meta WHERE key = ?", ("setting." + key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def update_setting(self, key, update, default=None):
+        """ Replace the value of a setting with update(value) atomically, and return the new value """
+        with self._transaction() as db:
+            row = db.execute("SELECT value FROM meta WHERE key = ?", ("setting." + key,)).fetchone()
+            value = update(json.loads(row[0]) if row else default)
+            db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", ("setting." + key, json.dumps(value)))
+            self._bump(db, None, SETTINGS)
+        return value
+
+    def settings_version(self):
+        """ Return the version of the settings, bumped by every update_setting() """
+        return self.version(SETTINGS)
+
+    def ping(self):
+        """ Return True if the database answers """
+        try:
+            self._connection().execute("SELECT 1").fetchone()
+        except sqlite3.Error as e:
+            logger.error("state store unavailable: %s", e)
+            return False
+        return True
+
+    def version(self, app_id=None):
+        """ Return the version of app_id, or the global version if app_id is None """
+        row = self._connection().execute("SELECT version FROM versions WHERE id = ?",
+                                          (GLOBAL if app_id is None else app_id,)).fetchone()
+        return row[0] if row else 0
+
+    def versions(self):
+        """ Return a dictionary of the version of every application """
+        rows = self._connection().execute("SELECT id, version FROM versions WHERE id NOT IN (?, ?)",
+                                          (GLOBAL, SETTINGS)).fetchall()
+        return dict(rows)
+
+    def apps(self):
+        """ Return a dictionary of every application record """
+        rows = self._connection().execute("SELECT id, record FROM apps").fetchall()
+        return {app_id: json.loads(record) for app_id, record in rows}
+
+    def app(self, app_id):
+        """ Return the record of app_id, or None """
+        row = self._connection().execute("SELECT record FROM apps WHERE id = ?", (app_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_app(self, app_id, record):
+        """ Create or replace the record of app_id """
+        data = json.dumps(record, default=str)
+        with self._transaction() as db:
+            db.execute("INSERT OR REPLACE INTO apps VALUES (?, ?)", (app_id, data))
+            self._bump(db, app_id)
+
+    def update_status(self, app_id, adaptor, status):
+        """ Set the status of one adaptor in the record of app_id, if the app exists """
+        with self._transaction() as db:
+            row = db.execute("SELECT record FROM apps WHERE id = ?", (app_id,)).fetchone()
+            if row:
+                record = json.loads(row[0])
+                record.setdefault("status", {})[adaptor] = status
+                db.execute("UPDATE apps SET record = ? WHERE id = ?", (json.dumps(record, default=str), app_id))
+            self._bump(db, app_id)
+
+    def delete_app(self, app_id):
+        """ Remove the record of app_id """
+        with self._transaction() as db:
+            db.execute("DELETE FROM apps WHERE id = ?", (app_id,))
+            self._bump(db, app_id)
+
+    def enqueue(self, app_id, action, payload):
+        """ Queue a job and return its sequence number """
+        with self._transaction() as db:
+            cursor = db.execute("INSERT INTO jobs (app_id, action, payload, state, queued_at) "
+                                "VALUES (?, ?, ?, ?, ?)",
+                                (app_id, action, json.dumps(payload, default=str), QUEUED, time.time()))
+            self._bump(db, app_id)
+            return cursor.lastrowid
+
+    def claim(self):
+        """ Mark the oldest runnable job as running and return it, or None
+
+        A job is runnable when no other job of the same application is running,
+        so that the jobs of one application are serialized.
+        """
+        with self._transaction() as db:
+            row = db.execute("SELECT seq, app_id, action, payload, queued_at FROM jobs j "
+                             "WHERE state = ? AND NOT EXISTS (SELECT 1 FROM jobs r "
+                             "WHERE r.app_id = j.app_id AND r.state = ?) "
+                             "ORDER BY seq LIMIT 1", (QUEUED, RUNNING)).fetchone()
+            if not row:
+                return None
+            seq, app_id, action, payload, queued_at = row
+            db.execute("UPDATE jobs SET state = ?, started_at = ? WHERE seq = ?", (RUNNING, time.time(), seq))
+            self._bump(db, app_id)
+        return dict(seq=seq, app_id=app_id, action=action, payload=json.loads(payload), queued_at=queued_at)
+
+    def finish(self, seq, error=None):
+        """ Mark a job as done, or failed if an error is given """
+        with self._transaction() as db:
+            row = db.execute("SELECT app_id FROM jobs WHERE seq = ?", (seq,)).fetchone()
+            db.execute("UPDATE jobs SET state = ?, finished_at = ?, error = ? WHERE seq = ?",
+                       (FAILED if error else DONE, time.time(), str(error) if error else None, seq))
+            if row:
+                self._bump(db, row[0])
+
+    def fail_running(self, error):
+        """ Fail the jobs left running by a runner which is gone, return how many """
+        with self._transaction() as db:
+            rows = db.execute("SELECT seq, app_id FROM jobs WHERE state = ?", (RUNNING,)).fetchall()
+            for seq, app_id in rows:
+                db.execute("UPDATE jobs SET state = ?, finished_at = ?, error = ? WHERE seq = ?",
+                           (FAILED, time.time(), error, seq))
+                self._bump(db, app_id)
+        return len(rows)
+
+    def jobs(self, state):
+        """ Return the jobs in the given state, oldest first """
+        rows = self._connection().execute("SELECT seq, app_id, action, queued_at, started_at FROM jobs "
+                                          "WHERE state = ? ORDER BY seq", (state,)).fetchall()
+        return [dict(seq=seq, app_id=app_id, action=action, queued_at=queued_at, started_at=started_at,
+                     name="{}_{}".format(action, app_id))
+                for seq, app_id, action, queued_at, started_at in rows]
+
+    def count(self, state):
+        """ Return the number of jobs in the given state """
+        return self._connection().execute("SELECT COUNT(*) FROM jobs WHERE state = ?", (state,)).fetchone()[0]
+
+    def last_error(self, app_id=None):
+        """ Return the error of the last finished job (of app_id if given), or '' """
+        query = "SELECT state, error FROM jobs WHERE state IN (?, ?)"
+        params = [DONE, FAILED]
+        if app_id is not None:
+            query += " AND app_id = ?"
+            params.append(app_id)
+        row = self._connection().execute(query + " ORDER BY seq DESC LIMIT 1", params).fetchone()
+        return row[1] if row and row[0] == FAILED else ''
+
+    def prune(self, keep=1000):
+        """ Forget the oldest finished jobs, keeping the last ones """
+        with self._transaction() as db:
+            db.execute("DELETE FROM jobs WHERE state IN (?, ?) AND seq NOT IN "
+                       "(SELECT seq FROM jobs ORDER BY seq DESC LIMIT ?)", (DONE, FAILED, keep))
+
+
+class _Transaction(object):
+    """ BEGIN IMMEDIATE ... COMMIT on an autocommit connection, ROLLBACK on error """
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.db.execute("COMMIT")
+        else:
+            self.db.execute("ROLLBACK")
+        return False
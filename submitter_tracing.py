@@ -0,0 +1,175 @@
+"""
+MiCADO Submitter Engine Tracing
+-------------------------------
+Spans timing each step of a job (parsing, validation, mapping, every adaptor
+operation and the subprocess and HTTP calls they make), written as JSON lines
+to a local file so that the trace of any job can be read back through the API.
+
+A trace is opened around a job with trace(), and spans opened in the same
+thread nest under it. Outside of a trace, span() does nothing.
+"""
+import fcntl
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+import logging
+
+logger = logging.getLogger("submitter."+__name__)
+
+MAX_BYTES = 10 * 1024 * 1024
+
+
+class Span(object):
+    """ A timed step of a trace, with its attributes """
+
+    def __init__(self, trace_id, app_id, name, parent_id=None, attributes=None):
+        self.trace_id = trace_id
+        self.app_id = app_id
+        self.name = name
+        self.parent_id = parent_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.attributes = dict(attributes or {})
+        self.start = time.time()
+        self.end = None
+        self.error = None
+
+    def set(self, **attributes):
+        """ Add attributes to the span """
+        self.attributes.update(attributes)
+
+    def to_dict(self):
+        return dict(trace_id=self.trace_id, span_id=self.span_id, parent_id=self.parent_id,
+                    app_id=self.app_id, name=self.name, start=self.start, end=self.end,
+                    duration=round(self.end - self.start, 6) if self.end else None,
+                    attributes=self.attributes, error=self.error)
+
+
+class _NoSpan(object):
+    """ Stand-in for a span opened outside of any trace """
+
+    def set(self, **attributes):
+        pass
+
+
+NO_SPAN = _NoSpan()
+
+
+class Tracer(object):
+    """ Open spans in the current thread and export the finished ones to a JSON-lines file """
+
+    def __init__(self, path=None, max_bytes=MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def current(self):
+        """ Return the innermost open span of this thread, or None """
+        stack = getattr(self._local, "stack", None)
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def trace(self, app_id, name, trace_id=None, **attributes):
+        """ Open the root span of a job, continuing trace_id if given """
+        root = Span(trace_id or uuid.uuid4().hex, app_id, name, attributes=attributes)
+        with self._open(root):
+            yield root
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """ Open a span under the current one, doing nothing outside of a trace """
+        parent = self.current()
+        if parent is None:
+            yield NO_SPAN
+            return
+        child = Span(parent.trace_id, parent.app_id, name, parent.span_id, attributes)
+        with self._open(child):
+            yield child
+
+    @contextmanager
+    def attach(self, span):
+        """ Make span the current one in this thread, e.g. in a thread started by a traced step """
+        if span is None:
+            yield
+            return
+        stack = self._stack()
+        stack.append(span)
+        try:
+            yield
+        finally:
+            stack.remove(span)
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def _open(self, span):
+        stack = self._stack()
+        stack.append(span)
+        try:
+            yield
+        except Exception as e:
+            span.error = "{}: {}".format(type(e).__name__, e)
+            raise
+        finally:
+            span.end = time.time()
+            stack.remove(span)
+            self._export(span)
+
+    def _export(self, span):
+        """ Append the finished span to the trace file, starting a new file when it is full """
+        if not self.path:
+            return
+        line = json.dumps(span.to_dict(), default=str) + "\n"
+        with self._lock:
+            try:
+                # the workers share the file: the lock sits beside it as rotating replaces the file
+                with open(self.path + ".lock", "a") as lock_file:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                    if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                        os.replace(self.path, self.path + ".1")
+                    with open(self.path, "a") as trace_file:
+                        trace_file.write(line)
+            except OSError as e:
+                logger.warning("cannot export the span %s: %s", span.name, e)
+
+    def traces(self, app_id):
+        """ Return the traces of app_id found in the trace files, oldest first
+
+            Each trace holds its spans ordered by start time.
+        """
+        traces = dict()
+        for path in (self.path + ".1", self.path) if self.path else ():
+            try:
+                with open(path) as trace_file:
+                    for line in trace_file:
+                        try:
+                            span = json.loads(line)
+                        except ValueError:
+                            continue
+                        if span.get("app_id") == app_id:
+                            traces.setdefault(span["trace_id"], []).append(span)
+            except OSError:
+                continue
+        result = []
+        for trace_id, spans in traces.items():
+            spans.sort(key=lambda item: item["start"])
+            start = spans[0]["start"]
+            end = max(item["end"] or start for item in spans)
+            roots = [item["name"] for item in spans if item["parent_id"] is None]
+            result.append(dict(trace_id=trace_id, name=roots[0] if roots else spans[0]["name"],
+                               start=start, duration=round(end - start, 6), spans=spans))
+        result.sort(key=lambda item: item["start"])
+        return result
+
+
+TRACER = Tracer()
+trace = TRACER.trace
+span = TRACER.span
+current = TRACER.current
+attach = TRACER.attach
@@ -0,0 +1,91 @@
+"""
+MiCADO Submitter Engine Webhooks
+--------------------------------
+Deliver the result of a finished launch, update or undeploy job to the
+callback URL given with the request. Delivery happens on a small pool of
+sender threads, retrying with a backoff, so the job worker never waits
+on the receiving end.
+"""
+import threading
+import queue
+import time
+import logging
+from urllib.parse import urlparse
+
+import requests
+
+logger = logging.getLogger("submitter."+__name__)
+
+
+def valid_callback(url):
+    """ Return True if the url can be used as a callback """
+    try:
+        parsed = urlparse(url)
+    except (TypeError, ValueError):
+        return False
+    return parsed.scheme in ("http", "https") and bool(parsed.netloc)
+
+
+class WebhookSender(object):
+    """
+    Pool of threads POSTing JSON documents to callback URLs.
+
+    A delivery is retried on connection errors and 5xx answers, waiting
+    backoff, 2*backoff, 4*backoff... seconds between the attempts.
+    """
+
+    def __init__(self, workers=2, retries=5, backoff=2, timeout=10):
+        logger.debug("init of the WebhookSender")
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._deliveries = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def send(self, url, document):
+        """ Queue the document for delivery to url and return immediately """
+        self._start()
+        self._deliveries.put((url, document))
+
+    def pending(self):
+        """ Return the number of documents waiting for a sender """
+        return self._deliveries.qsize()
+
+    def _start(self):
+        """ Start the sender threads the first time they are needed """
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, daemon=True)
+                thread.setName("webhook_sender_{}".format(len(self._threads)))
+                thread.start()
+                self._threads.append(thread)
+
+    def _run(self):
+        while True:
+            url, document = self._deliveries.get()
+            try:
+                self._deliver(url, document)
+            except Exception as e:
+                logger.error("webhook to %s failed: %s", url, e)
+
+    def _deliver(self, url, document):
+        """ POST the document, retrying on transient failures """
+        for attempt in range(1, self.retries + 1):
+            try:
+                answer = requests.post(url, json=document, timeout=self.timeout)
+            except requests.exceptions.RequestException as e:
+                logger.warning("webhook to %s, try %s of %s: %s", url, attempt, self.retries, e)
+            else:
+                if answer.status_code < 500:
+                    if answer.status_code >= 400:
+                        logger.warning("webhook to %s refused with %s", url, answer.status_code)
+                    else:
+                        logger.debug("webhook delivered to %s", url)
+                    return
+                logger.warning("webhook to %s, try %s of %s: HTTP %s",
+                               url, attempt, self.retries, answer.status_code)
+            if attempt < self.retries:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+        logger.error("giving up on webhook to %s after %s tries", url, self.retries)
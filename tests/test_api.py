@@ -0,0 +1,109 @@
+import fcntl
+import importlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import submitter_engine
+from submitter_events import EventBroker
+from submitter_store import StateStore
+
+class FakeEngine(object):
+    """ Engine with a state store of its own and no adaptors to run """
+
+    def __init__(self):
+        self.store = StateStore(os.path.join(FakeEngine.directory, "submitter.db"))
+        self.events = EventBroker(store=self.store)
+        self.adaptors_class_name = [FakeEngine]
+
+    def reload(self):
+        pass
+
+    def refresh(self, app_id, record):
+        pass
+
+class TestApi(unittest.TestCase):
+    """ UnitTests for the readiness, conditional and long-polling requests of api """
+
+    @classmethod
+    def setUpClass(cls):
+        """ Import the API with a fake engine, its store in a temporary directory
+
+            The job runner lock is only granted once runner_released is set.
+        """
+        FakeEngine.directory = tempfile.mkdtemp()
+        cls.runner_released = threading.Event()
+        flock = fcntl.flock
+        def gated_flock(lock_file, operation):
+            if operation == fcntl.LOCK_EX:
+                cls.runner_released.wait()
+            return flock(lock_file, operation)
+        cls.flock = mock.patch("fcntl.flock", gated_flock)
+        cls.flock.start()
+        with mock.patch.object(submitter_engine, "SubmitterEngine", FakeEngine):
+            cls.api = importlib.import_module("api")
+        cls.client = cls.api.app.test_client()
+        cls.store = cls.api.submitter.store
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.runner_released.set()
+        cls.flock.stop()
+        shutil.rmtree(FakeEngine.directory)
+
+    def setUp(self):
+        self.store.save_app("app", dict(components=["KubernetesAdaptor"], output={}, status={}))
+
+    def test_same_etag_gets_not_modified(self):
+        first = self.client.get("/v1.0/app/app/status")
+        self.assertEqual(200, first.status_code)
+        etag = first.headers["ETag"]
+        second = self.client.get("/v1.0/app/app/status", headers={"If-None-Match": etag})
+        self.assertEqual(304, second.status_code)
+        self.assertEqual(etag, second.headers["ETag"])
+
+    def test_new_version_gets_new_document(self):
+        etag = self.client.get("/v1.0/app/app/status").headers["ETag"]
+        self.store.save_app("app", dict(components=["KubernetesAdaptor"], output={}, status={"k": "done"}))
+        response = self.client.get("/v1.0/app/app/status", headers={"If-None-Match": etag})
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response.headers["ETag"])
+        self.assertDictEqual({"k": "done"}, response.get_json()["data"]["status"])
+
+    def test_queued_job_of_other_app_changes_status(self):
+        etag = self.client.get("/v1.0/app/app/status").headers["ETag"]
+        seq = self.store.enqueue("other", "launch", {})
+        self.addCleanup(self.store.finish, seq)
+        response = self.client.get("/v1.0/app/app/status", headers={"If-None-Match": etag})
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response.headers["ETag"])
+
+    def test_long_poll_wakes_on_version_bump(self):
+        etag = self.client.get("/v1.0/app/app/status").headers["ETag"]
+        threading.Timer(0.3, self.store.save_app, ("app", dict(components=[], output={}, status={}))).start()
+        start = time.time()
+        response = self.client.get("/v1.0/app/app/status?wait=10", headers={"If-None-Match": etag})
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response.headers["ETag"])
+        self.assertLess(time.time() - start, 5)
+
+    def test_long_poll_times_out_not_modified(self):
+        etag = self.client.get("/v1.0/app/app/status").headers["ETag"]
+        response = self.client.get("/v1.0/app/app/status?wait=0.3", headers={"If-None-Match": etag})
+        self.assertEqual(304, response.status_code)
+
+    def test_readyz_waits_for_runner(self):
+        response = self.client.get("/readyz")
+        self.assertEqual(503, response.status_code)
+        self.assertFalse(response.get_json()["checks"]["runner"])
+        self.runner_released.set()
+        deadline = time.time() + 5
+        while self.client.get("/readyz").status_code != 200 and time.time() < deadline:
+            time.sleep(0.1)
+        response = self.client.get("/readyz")
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(all(response.get_json()["checks"].values()))
@@ -0,0 +1,125 @@
+import json
+import os
+import tempfile
+import unittest
+
+from adaptors.k8s_adaptor import KubernetesAdaptor
+
+class Value(object):
+    def __init__(self, value):
+        self.value = value
+
+class Operation(object):
+    def __init__(self, name, inputs):
+        self.name, self.inputs, self.type = name, inputs, "Kubernetes"
+
+class Relationship(object):
+    def __init__(self, type):
+        self.type = type
+
+class Node(object):
+    """ Node template with the attributes the adaptor reads, without parsing any file """
+
+    def __init__(self, name, type, properties, interfaces, related=None, requirements=None, artifact=None):
+        self.name, self.type, self.interfaces = name, type, interfaces
+        self.properties = properties
+        self.related = related or {}
+        self.related_nodes = list(self.related)
+        self.requirements = requirements or []
+        self.entity_tpl = {"artifacts": {"image": {"file": artifact, "repository": "docker_hub"}}} if artifact else {}
+
+    def get_properties(self):
+        return {key: Value(value) for key, value in self.properties.items()}
+
+    def get_property_value(self, key):
+        return self.properties.get(key)
+
+class Repository(object):
+    name, reposit = "docker_hub", "https://hub.docker.com/"
+
+def template():
+    """ A container attached to a volume and hosted on a virtual machine """
+    volume = Node("data", "tosca.nodes.MiCADO.Container.Volume", {"size": "2Gi"},
+                  [Operation("create", {"spec": {"nfs": {"server": "10.0.0.1"}, "accessModes": ["ReadOnlyMany"]}}),
+                   Operation("configure", {"metadata": {"labels": {"tier": "data"}}})])
+    host = Node("worker", "tosca.nodes.MiCADO.Occopus.CloudSigma.Compute", {}, [])
+    web = Node("web", "tosca.nodes.MiCADO.Container.Application.Docker",
+               {"ports": [{"target": 80, "type": "NodePort", "metadata": {"name": "web-svc"}}, {"containerPort": 8080}],
+                "labels": {"app": "web"}, "privileged": True},
+               [Operation("create", {"kind": "Deployment", "metadata": {"labels": {"team": "a"}}, "replicas": 2,
+                                     "hostname": "web"}),
+                Operation("configure", {"metadata": {"labels": {"run": "web"}}, "volumes": [{"name": "extra"}]})],
+               related={volume: Relationship("tosca.relationships.AttachesTo"),
+                        host: Relationship("tosca.relationships.HostedOn")},
+               requirements=[{"volume": {"node": "data", "relationship": {
+                   "type": "tosca.relationships.AttachesTo", "properties": {"location": "/data"}}}}],
+               artifact="nginx")
+    tpl = type("Template", (), {})()
+    tpl.nodetemplates, tpl.repositories, tpl.tpl = [web, volume, host], [Repository()], {"repositories": {}}
+    return tpl
+
+def adaptor(tpl):
+    """ A validating adaptor, which writes no manifest file """
+    kubernetes = KubernetesAdaptor("app_KubernetesAdaptor", {"volume": "/nonexistent/"}, True, validate=True)
+    kubernetes.tpl = tpl
+    return kubernetes
+
+def inputs(tpl):
+    """ Dump the interface inputs and the properties of the nodes """
+    return json.dumps([[operation.inputs for operation in node.interfaces] + [node.properties]
+                       for node in tpl.nodetemplates], sort_keys=True)
+
+class TestK8sAdaptor(unittest.TestCase):
+    """ UnitTests for the translation of k8s_adaptor """
+
+    def setUp(self):
+        self.tpl = template()
+        self.before = inputs(self.tpl)
+        self.adaptor = adaptor(self.tpl)
+        self.adaptor.translate()
+        self.manifests = json.dumps(self.adaptor.manifests, sort_keys=True)
+
+    def test_translation_builds_manifests(self):
+        kinds = sorted(manifest["kind"] for manifest in self.adaptor.manifests)
+        self.assertListEqual(["Deployment", "PersistentVolume", "PersistentVolumeClaim", "Service"], kinds)
+
+    def test_translate_again_with_same_adaptor(self):
+        self.adaptor.translate()
+        self.assertEqual(self.manifests, json.dumps(self.adaptor.manifests, sort_keys=True))
+        self.assertEqual(self.before, inputs(self.tpl))
+
+    def test_translate_again_with_fresh_adaptor(self):
+        fresh = adaptor(self.tpl)
+        fresh.translate()
+        self.assertEqual(self.manifests, json.dumps(fresh.manifests, sort_keys=True))
+        self.assertEqual(self.before, inputs(self.tpl))
+
+    def updating(self, translated):
+        """ A dry-run adaptor updating the manifest of a temporary directory, counting its translations """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        kubernetes = KubernetesAdaptor("app_KubernetesAdaptor", {"volume": directory.name + "/"}, True)
+        kubernetes.tpl = self.tpl
+        kubernetes.translations = 0
+        translate = kubernetes.translate
+        def counted(update=False):
+            kubernetes.translations += 1
+            translate(update)
+        kubernetes.translate = counted
+        if translated:
+            kubernetes.adopt_translation(self.adaptor)
+        return kubernetes
+
+    def test_update_reuses_translation(self):
+        kubernetes = self.updating(translated=True)
+        kubernetes.update()
+        self.assertEqual(0, kubernetes.translations)
+        self.assertTrue(kubernetes.status.startswith("DRY-RUN Update"))
+        self.assertTrue(os.path.exists(kubernetes.manifest_path))
+        self.assertFalse(os.path.exists(kubernetes.manifest_tmp_path))
+
+    def test_update_translates_without_translation(self):
+        kubernetes = self.updating(translated=False)
+        kubernetes.update()
+        self.assertEqual(1, kubernetes.translations)
+        self.assertEqual(self.manifests, json.dumps(kubernetes.manifests, sort_keys=True))
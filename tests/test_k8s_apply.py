@@ -0,0 +1,162 @@
+import time
+import unittest
+
+from kubernetes.client.rest import ApiException
+
+from adaptors import k8s_apply
+
+DEPLOYMENT = {"apiVersion": "apps/v1", "kind": "Deployment",
+              "metadata": {"name": "web", "labels": {"app": "web"}},
+              "spec": {"replicas": 1, "selector": {"matchLabels": {"app": "web"}}}}
+VOLUME = {"apiVersion": "v1", "kind": "PersistentVolume", "metadata": {"name": "data"}}
+
+class FakeApiClient(object):
+    """ ApiClient recording the calls, answering with the given statuses in turn """
+
+    def __init__(self, *statuses):
+        self.calls = []
+        self.statuses = list(statuses)
+
+    def call_api(self, path, method, query_params=None, body=None, header_params=None, **kwargs):
+        self.calls.append((method, path, header_params["Content-Type"], dict(query_params), body))
+        status = self.statuses.pop(0) if self.statuses else 200
+        if status >= 400:
+            raise ApiException(status=status, reason="status {}".format(status))
+        return {}
+
+class FakeCoreApi(object):
+    """ CoreV1Api listing no pod """
+
+    def list_namespaced_pod(self, namespace, label_selector=None):
+        self.listed = (namespace, label_selector)
+        return type("PodList", (), {"items": [], "metadata": None})()
+
+def fake_service(name):
+    return type("Service", (), {"metadata": type("Metadata", (), {"name": name})()})()
+
+class FakeServiceApi(object):
+    """ CoreV1Api listing the services of the default namespace only, recording the reads """
+
+    def __init__(self, listed):
+        self.listed = listed
+        self.reads = []
+
+    def list_namespaced_service(self, namespace, label_selector=None):
+        if namespace != "default":
+            raise ApiException(status=403, reason="Forbidden")
+        return type("ServiceList", (), {"items": [fake_service(name) for name in self.listed]})()
+
+    def read_namespaced_service(self, name, namespace):
+        self.reads.append((namespace, name))
+        if name == "gone":
+            raise ApiException(status=404, reason="Not Found")
+        return fake_service(name)
+
+class TestK8sApply(unittest.TestCase):
+    """ UnitTests for k8s_apply """
+
+    def test_resource_path(self):
+        self.assertEqual("/apis/apps/v1/namespaces/default/deployments/web",
+                         k8s_apply.resource_path(DEPLOYMENT))
+        self.assertEqual("/api/v1/persistentvolumes", k8s_apply.resource_path(VOLUME, collection=True))
+        with self.assertRaises(ValueError):
+            k8s_apply.resource_path({"kind": "Unknown", "metadata": {"name": "x"}})
+
+    def test_server_side_apply(self):
+        client = FakeApiClient()
+        result = k8s_apply.Applier(client).apply(DEPLOYMENT)
+        self.assertEqual(k8s_apply.APPLIED, result["action"])
+        method, path, content_type, query, body = client.calls[0]
+        self.assertEqual("PATCH", method)
+        self.assertEqual("application/apply-patch+yaml", content_type)
+        self.assertDictEqual({"fieldManager": k8s_apply.FIELD_MANAGER, "force": "true"}, query)
+        self.assertIsInstance(body, str)
+
+    def test_fallback_without_server_side_apply(self):
+        client = FakeApiClient(415, 409)
+        applier = k8s_apply.Applier(client)
+        self.assertEqual(k8s_apply.CONFIGURED, applier.apply(DEPLOYMENT)["action"])
+        self.assertListEqual(["PATCH", "POST", "PATCH"], [call[0] for call in client.calls])
+        self.assertEqual(k8s_apply.CREATED, applier.apply(VOLUME)["action"])
+
+    def test_results_and_summary(self):
+        client = FakeApiClient(200, 422)
+        results = k8s_apply.Applier(client).apply_all([VOLUME, DEPLOYMENT])
+        self.assertEqual(1, len(k8s_apply.failures(results)))
+        self.assertEqual("1 applied, 1 failed; Deployment/web: 422 status 422", k8s_apply.summary(results))
+
+    def test_delete_missing_object(self):
+        results = k8s_apply.Applier(FakeApiClient(404)).delete_all([DEPLOYMENT])
+        self.assertEqual(k8s_apply.NOT_FOUND, results[0]["action"])
+        self.assertListEqual([], k8s_apply.failures(results))
+
+    def test_pod_selectors(self):
+        pod = {"kind": "Pod", "metadata": {"name": "db", "namespace": "data", "labels": {"run": "db"}}}
+        job = {"kind": "Job", "metadata": {"name": "batch"},
+               "spec": {"template": {"metadata": {"labels": {"run": "batch", "app": "x"}}}}}
+        selectors = k8s_apply.pod_selectors([DEPLOYMENT, pod, job, VOLUME, DEPLOYMENT])
+        self.assertListEqual([("default", "app=web"), ("data", "run=db"), ("default", "app=x,run=batch")],
+                             selectors)
+
+    def test_no_pod_left_returns_at_once(self):
+        core = FakeCoreApi()
+        start = time.time()
+        self.assertListEqual([], k8s_apply._watch_pods_gone(core, "default", "app=web", start + 60))
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual(("default", "app=web"), core.listed)
+
+    def test_plan_changes_only(self):
+        service = {"apiVersion": "v1", "kind": "Service", "metadata": {"name": "web"}, "spec": {"ports": []}}
+        changed = dict(DEPLOYMENT, spec={"selector": {"matchLabels": {"app": "web"}}, "replicas": 2,
+                                         "minReadySeconds": 5})
+        added = {"apiVersion": "v1", "kind": "ConfigMap", "metadata": {"name": "conf"}}
+        changes = k8s_apply.plan([VOLUME, DEPLOYMENT, service], [changed, dict(reversed(list(service.items()))), added])
+        self.assertListEqual([added], changes["add"])
+        self.assertListEqual([changed], changes["change"])
+        self.assertListEqual([VOLUME], changes["remove"])
+        self.assertListEqual(["Service/default/web"], changes["unchanged"])
+        self.assertListEqual(["+ ConfigMap/default/conf", "~ Deployment/default/web", "- PersistentVolume/data"],
+                             k8s_apply.describe(changes))
+
+    def test_read_services_lists_then_reads_the_rest(self):
+        core = FakeServiceApi(["web", "other"])
+        wanted = {("default", "web"), ("default", "api"), ("data", "db"), ("data", "gone")}
+        found = k8s_apply._read_services(core, wanted, "app=x", 4)
+        self.assertSetEqual(wanted, set(found))
+        self.assertEqual("web", found[("default", "web")].metadata.name)
+        self.assertIsNone(found[("data", "gone")])
+        self.assertSetEqual({("default", "api"), ("data", "db"), ("data", "gone")}, set(core.reads))
+
+    def test_apply_waves_in_dependency_order(self):
+        claim = {"apiVersion": "v1", "kind": "PersistentVolumeClaim", "metadata": {"name": "data"}}
+        service = {"apiVersion": "v1", "kind": "Service", "metadata": {"name": "web"}}
+        self.assertListEqual([[VOLUME], [claim], [service], [DEPLOYMENT]],
+                             k8s_apply.waves([DEPLOYMENT, service, claim, VOLUME]))
+        client = FakeApiClient()
+        config = {"apiVersion": "v1", "kind": "ConfigMap", "metadata": {"name": "conf"}}
+        results = k8s_apply.Applier(client).apply_waves([DEPLOYMENT, service, claim, VOLUME, config])
+        self.assertListEqual(["PersistentVolume", "PersistentVolumeClaim", "Service", "ConfigMap", "Deployment"],
+                             [result["kind"] for result in results])
+        self.assertEqual(5, len(client.calls))
+
+    def test_apply_waves_stops_after_a_failed_wave(self):
+        client = FakeApiClient(422)
+        results = k8s_apply.Applier(client).apply_waves([DEPLOYMENT, VOLUME])
+        self.assertListEqual([("PersistentVolume", k8s_apply.FAILED)],
+                             [(result["kind"], result["action"]) for result in results])
+
+    def test_replicas_only_change_is_scaled(self):
+        scaled = dict(DEPLOYMENT, spec=dict(DEPLOYMENT["spec"], replicas=3))
+        changes = k8s_apply.plan([DEPLOYMENT, VOLUME], [scaled, VOLUME])
+        self.assertListEqual([scaled], changes["scale"])
+        self.assertListEqual([], changes["change"])
+        self.assertListEqual(["^ Deployment/default/web"], k8s_apply.describe(changes))
+        relabelled = dict(scaled, metadata={"name": "web", "labels": {"app": "other"}})
+        self.assertListEqual([relabelled], k8s_apply.plan([DEPLOYMENT], [relabelled])["change"])
+
+        client = FakeApiClient()
+        results = k8s_apply.Applier(client).scale_all(changes["scale"])
+        self.assertEqual(k8s_apply.SCALED, results[0]["action"])
+        method, path, content_type, query, body = client.calls[0]
+        self.assertEqual(("PATCH", "/apis/apps/v1/namespaces/default/deployments/web/scale"), (method, path))
+        self.assertDictEqual({"spec": {"replicas": 3}}, body)
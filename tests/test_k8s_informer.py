@@ -0,0 +1,63 @@
+import unittest
+
+from kubernetes.client.rest import ApiException
+
+from adaptors import k8s_informer
+
+def fake_object(name, version, namespace=None):
+    metadata = type("Metadata", (), {"name": name, "namespace": namespace, "resource_version": version})()
+    return type("Object", (), {"metadata": metadata})()
+
+def list_nodes():
+    return type("List", (), {"items": [fake_object("a", "1"), fake_object("b", "2")],
+                             "metadata": type("ListMeta", (), {"resource_version": "2"})()})()
+
+class FakeInformer(object):
+    """ Informer recording whether it runs, without any thread """
+
+    def __init__(self):
+        self.running = False
+
+    def start(self):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+class TestK8sInformer(unittest.TestCase):
+    """ UnitTests for k8s_informer """
+
+    def setUp(self):
+        self.informer = k8s_informer.Informer("nodes", list_nodes)
+        self.addCleanup(k8s_informer.stop_all)
+
+    def test_list_then_events(self):
+        self.assertFalse(self.informer.freshness()["synced"])
+        self.informer._list()
+        self.assertTrue(self.informer.wait_synced(0))
+        self.informer._handle({"type": "ADDED", "object": fake_object("c", "3")})
+        self.informer._handle({"type": "MODIFIED", "object": fake_object("a", "4")})
+        self.informer._handle({"type": "DELETED", "object": fake_object("b", "5")})
+        items = {item.metadata.name: item.metadata.resource_version for item in self.informer.items()}
+        self.assertDictEqual({"a": "4", "c": "3"}, items)
+        freshness = self.informer.freshness()
+        self.assertEqual("5", freshness["resource_version"])
+        self.assertEqual(1, freshness["lists"])
+        self.assertEqual(3, freshness["events"])
+        self.assertEqual(2, freshness["objects"])
+
+    def test_expired_watch_raises(self):
+        with self.assertRaises(ApiException) as context:
+            self.informer._handle({"type": "ERROR", "raw_object": {"code": 410, "message": "too old"}})
+        self.assertEqual(410, context.exception.status)
+
+    def test_release_stops_informer_of_last_owner(self):
+        informer = k8s_informer.shared("nodes", FakeInformer, owner="first")
+        self.assertIs(informer, k8s_informer.shared("nodes", FakeInformer, owner="second"))
+        self.assertTrue(informer.running)
+        self.assertEqual(0, k8s_informer.release("first"))
+        self.assertTrue(informer.running)
+        self.assertEqual(1, k8s_informer.release("second"))
+        self.assertFalse(informer.running)
+        self.assertNotIn("nodes", k8s_informer.freshness())
+        self.assertIsNot(informer, k8s_informer.shared("nodes", FakeInformer, owner="first"))
@@ -0,0 +1,39 @@
+import unittest
+
+from adaptors import k8s_rollout
+
+DEPLOYMENT = {"apiVersion": "apps/v1", "kind": "Deployment", "metadata": {"name": "web"},
+              "spec": {"replicas": 2}}
+JOB = {"apiVersion": "batch/v1", "kind": "Job", "metadata": {"name": "batch", "namespace": "jobs"}}
+SERVICE = {"apiVersion": "v1", "kind": "Service", "metadata": {"name": "web"}}
+
+class TestK8sRollout(unittest.TestCase):
+    """ UnitTests for k8s_rollout """
+
+    def test_deployment_readiness(self):
+        rolling = dict(DEPLOYMENT, metadata={"name": "web", "generation": 2},
+                       status={"observedGeneration": 2, "replicas": 3, "updatedReplicas": 2, "availableReplicas": 2})
+        self.assertDictEqual(dict(ready=2, desired=2, done=False, failed=False),
+                             k8s_rollout.readiness("Deployment", rolling))
+        rolling["status"]["replicas"] = 2
+        self.assertTrue(k8s_rollout.readiness("Deployment", rolling)["done"])
+        rolling["metadata"]["generation"] = 3
+        self.assertFalse(k8s_rollout.readiness("Deployment", rolling)["done"])
+
+    def test_job_readiness(self):
+        failed = {"spec": {"completions": 2}, "status": {"succeeded": 1,
+                  "conditions": [{"type": "Failed", "status": "True"}]}}
+        self.assertDictEqual(dict(ready=1, desired=2, done=False, failed=True),
+                             k8s_rollout.readiness("Job", failed))
+
+    def test_rollout_reports_changes(self):
+        rollout = k8s_rollout.Rollout(None, [SERVICE, DEPLOYMENT, JOB])
+        self.assertListEqual([("Deployment", "default", "web"), ("Job", "jobs", "batch")], list(rollout.states))
+        self.assertEqual("web 0/?, batch 0/?", rollout.describe())
+        reports = []
+        ready = dict(DEPLOYMENT, status={"updatedReplicas": 2, "availableReplicas": 2, "replicas": 2})
+        rollout.update(("Deployment", "default", "web"), ready, reports.append)
+        rollout.update(("Deployment", "default", "web"), ready, reports.append)
+        self.assertEqual(1, len(reports))
+        self.assertEqual("web 2/2, batch 0/?", rollout.describe())
+        self.assertListEqual(["batch"], [state["name"] for state in rollout.pending()])
@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from submitter_cache import TranslationCache, config_digest
+
+class FakeAdaptor(object):
+    """ Adaptor with an ID and a config, reading no other file """
+
+    def __init__(self, adaptor_id="app_FakeAdaptor", volume="./files/"):
+        self.ID = adaptor_id
+        self.config = {"types": [{"tosca.nodes.MiCADO.Container.Application.Docker": object()}],
+                       "volume": volume}
+
+    def translation_inputs(self):
+        return []
+
+class TestSubmitterCache(unittest.TestCase):
+    """ UnitTests for submitter_cache """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = TranslationCache(self.directory, memory_entries=2, disk_entries=3)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_config_digest_ignores_matched_nodes(self):
+        self.assertEqual(config_digest(FakeAdaptor().config), config_digest(FakeAdaptor().config))
+        self.assertEqual(config_digest(FakeAdaptor().config),
+                         config_digest({"types": ["tosca.nodes.MiCADO.Container.Application.Docker"],
+                                        "volume": "./files/"}))
+
+    def test_key_depends_on_template_id_and_config(self):
+        key = self.cache.key("digest", FakeAdaptor())
+        self.assertEqual(key, self.cache.key("digest", FakeAdaptor()))
+        self.assertNotEqual(key, self.cache.key("other", FakeAdaptor()))
+        self.assertNotEqual(key, self.cache.key("digest", FakeAdaptor("other_FakeAdaptor")))
+        self.assertNotEqual(key, self.cache.key("digest", FakeAdaptor(volume="/tmp/")))
+
+    def test_get_returns_a_copy(self):
+        self.cache.put("key", {"manifests": [{"kind": "Deployment"}]})
+        state = self.cache.get("key")
+        state["manifests"].append({"kind": "Service"})
+        self.assertEqual(1, len(self.cache.get("key")["manifests"]))
+
+    def test_entries_are_shared_through_the_directory(self):
+        self.cache.put("key", {"node_def": {}})
+        other = TranslationCache(self.directory)
+        self.assertDictEqual({"node_def": {}}, other.get("key"))
+        self.assertIsNone(other.get("missing"))
+
+    def test_directory_keeps_newest_entries(self):
+        for index in range(5):
+            self.cache.put("key{}".format(index), index)
+            os.utime(os.path.join(self.directory, "key{}.pickle".format(index)), (index, index))
+        self.assertEqual(3, len(os.listdir(self.directory)))
+        self.assertIsNone(TranslationCache(self.directory).get("key0"))
@@ -1,4 +1,5 @@
 import unittest
+from types import SimpleNamespace
 
 from toscaparser.tosca_template import ToscaTemplate
 
@@ -30,3 +31,36 @@ class TestSubmitterConfig(unittest.TestCase):
 
     #def test_adaptor_config(self):
     #    dic = {}
+
+class FakeTemplate(object):
+    """ Parsed template with nodes of the given types, without parsing any file """
+
+    def __init__(self, *types):
+        self.tpl = {"topology_template": {"node_templates": {}}}
+        self.nodetemplates = [SimpleNamespace(name="node{}".format(i), type=type) for i, type in enumerate(types)]
+        self.policies = []
+        self.parsed_params = None
+        self.inputs = []
+
+    def _get_all_custom_defs(self):
+        return {node.type: {} for node in self.nodetemplates}
+
+class TestSubmitterConfigMapping(unittest.TestCase):
+    """ UnitTests for the adaptors mapping() matches in a template """
+
+    def setUp(self):
+        self.config = SubConfig("tests/configs/key_config.yaml")
+
+    def test_mapping_without_template_matches_nothing(self):
+        self.assertListEqual([], self.config.mapping())
+
+    def test_mapping_returns_matched_adaptors(self):
+        matched = self.config.mapping(FakeTemplate("tosca.nodes.MiCADO.Container.Application.Docker",
+                                                   "tosca.nodes.MiCADO.Occopus.CloudSigma.Compute"))
+        self.assertListEqual(["DockerAdaptor", "OccopusAdaptor"], sorted(matched))
+
+    def test_mapping_of_another_template_leaves_matches(self):
+        docker = self.config.mapping(FakeTemplate("tosca.nodes.MiCADO.Container.Application.Docker"))
+        occopus = self.config.mapping(FakeTemplate("tosca.nodes.MiCADO.Occopus.CloudSigma.Compute"))
+        self.assertListEqual(["DockerAdaptor"], docker)
+        self.assertListEqual(["OccopusAdaptor"], occopus)
@@ -0,0 +1,165 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from types import MappingProxyType, SimpleNamespace
+
+import submitter_metrics as metrics
+from submitter_cache import TranslationCache
+from submitter_engine import SubmitterEngine
+from submitter_pool import AdaptorPool
+from submitter_store import StateStore
+from tests.test_k8s_adaptor import adaptor, template
+
+STEPS = ["SecurityPolicyManagerAdaptor", "KubernetesAdaptor", "OccopusAdaptor", "PkAdaptor"]
+
+class FakeAdaptor(object):
+    """ Adaptor recording the undeploy and cleanup calls, failing them on demand """
+
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    def undeploy(self):
+        self.calls.append("undeploy")
+        if self.fail:
+            raise IOError("cluster unreachable")
+
+    def cleanup(self):
+        self.calls.append("cleanup")
+        if self.fail:
+            raise IOError("file busy")
+
+    def query(self, query):
+        self.calls.append(query)
+        return "answer"
+
+    def open(self):
+        self.calls.append("open")
+
+    def release(self):
+        pass
+
+    def close(self):
+        self.calls.append("close")
+
+class TestSubmitterEngine(unittest.TestCase):
+    """ UnitTests for the adaptor steps of submitter_engine """
+
+    def setUp(self):
+        """ An engine with only the step configuration, no store nor plugins """
+        self.engine = SubmitterEngine.__new__(SubmitterEngine)
+        self.engine.object_config = SimpleNamespace(step_config=dict(undeploy=STEPS, cleanup=STEPS))
+
+    def failures(self):
+        return dict(metrics.ADAPTOR_FAILURES.samples())
+
+    def test_undeploy_skips_adaptors_not_in_app(self):
+        adaptor = FakeAdaptor()
+        before = self.failures()
+        self.engine._undeploy({"KubernetesAdaptor": adaptor})
+        self.assertListEqual(["undeploy"], adaptor.calls)
+        self.assertDictEqual(before, self.failures())
+
+    def test_cleanup_skips_adaptors_not_in_app(self):
+        adaptor = FakeAdaptor()
+        before = self.failures()
+        self.engine._cleanup("app", {"KubernetesAdaptor": adaptor})
+        self.assertListEqual(["cleanup"], adaptor.calls)
+        self.assertDictEqual(before, self.failures())
+
+    def test_undeploy_counts_failing_adaptor_and_goes_on(self):
+        failing, adaptor = FakeAdaptor(fail=True), FakeAdaptor()
+        key = ("KubernetesAdaptor", "undeploy")
+        before = self.failures().get(key, 0)
+        self.engine._undeploy({"KubernetesAdaptor": failing, "PkAdaptor": adaptor})
+        self.assertEqual(before + 1, self.failures()[key])
+        self.assertListEqual(["undeploy"], adaptor.calls)
+
+class TestSubmitterEngineRefresh(unittest.TestCase):
+    """ UnitTests for the applications of submitter_engine seen by a process which is not the runner """
+
+    def setUp(self):
+        """ An engine with a state store of its own, as another process writes it """
+        self.directory = tempfile.mkdtemp()
+        self.engine = SubmitterEngine.__new__(SubmitterEngine)
+        self.engine.store = StateStore(os.path.join(self.directory, "submitter.db"))
+        self.engine._snapshot = MappingProxyType({})
+        self.engine._publish_lock = threading.Lock()
+        self.engine._app_locks = dict()
+        self.engine.pool = AdaptorPool()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_refresh_publishes_record_and_keeps_pool(self):
+        adaptor = FakeAdaptor()
+        self.engine.refresh("app", dict(components=["KubernetesAdaptor"], artifacts={}))
+        self.engine.pool.put("app", {"KubernetesAdaptor": adaptor})
+        self.engine.refresh("app", dict(components=["KubernetesAdaptor"], artifacts={}, status={"k": "done"}))
+        self.assertDictEqual({"k": "done"}, self.engine.app_list["app"]["status"])
+        self.assertNotIn("close", adaptor.calls)
+
+    def test_refresh_closes_pool_when_files_change_or_app_is_gone(self):
+        adaptor = FakeAdaptor()
+        self.engine.refresh("app", dict(components=["KubernetesAdaptor"], artifacts={}))
+        self.engine.pool.put("app", {"KubernetesAdaptor": adaptor})
+        self.engine.refresh("app", dict(components=["KubernetesAdaptor"], artifacts={"KubernetesAdaptor": {"f": "1"}}))
+        self.assertIn("close", adaptor.calls)
+        self.engine.refresh("app", None)
+        self.assertNotIn("app", self.engine.app_list)
+
+    def test_query_reads_app_saved_by_runner(self):
+        adaptor = FakeAdaptor()
+        self.engine._instantiate_adaptors = lambda app_id, dry_run=False, names=None: {"KubernetesAdaptor": adaptor}
+        self.engine.store.save_app("app", dict(components=["KubernetesAdaptor"], artifacts={}))
+        self.assertEqual("answer", self.engine.query("nodes", "app"))
+        self.assertListEqual(["KubernetesAdaptor"], self.engine.app_list["app"]["components"])
+        self.assertListEqual(["open", "nodes"], adaptor.calls)
+        self.assertIs(adaptor, self.engine.pool.get("app")["KubernetesAdaptor"])
+
+class TestSubmitterEngineTranslate(unittest.TestCase):
+    """ UnitTests for the translations of submitter_engine when updating an application """
+
+    def setUp(self):
+        """ An engine translating with the Kubernetes adaptor, its translation cache in a temporary directory """
+        self.directory = tempfile.mkdtemp()
+        self.engine = SubmitterEngine.__new__(SubmitterEngine)
+        self.engine.object_config = SimpleNamespace(step_config=dict(translate=["KubernetesAdaptor"]))
+        self.engine.translations = TranslationCache(self.directory)
+        self.engine._snapshot = MappingProxyType({})
+        self.engine._publish_lock = threading.Lock()
+        self.engine._app_locks = dict()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_update_translates_only_changed_nodes(self):
+        deployed = template()
+        first = adaptor(deployed)
+        self.engine._translate({"KubernetesAdaptor": first}, deployed, "app")
+        self.engine._publish("app", dict(translations={"KubernetesAdaptor": first.translation_key}))
+
+        updated = template()
+        updated.tpl = {"repositories": {}, "replicas": 3}
+        next(node for node in updated.nodetemplates if node.name == "web").interfaces[0].inputs["replicas"] = 3
+        fresh = adaptor(updated)
+        translated = []
+        translate_node = fresh._translate_node
+        def counted(node, repositories):
+            translated.append(node.name)
+            return translate_node(node, repositories)
+        fresh._translate_node = counted
+        self.engine._translate({"KubernetesAdaptor": fresh}, updated, "app")
+
+        self.assertListEqual(["web"], translated)
+        deployment = next(manifest for manifest in fresh.manifests if manifest["kind"] == "Deployment")
+        self.assertEqual(3, deployment["spec"]["replicas"])
+
+    def test_release_drops_node_memo(self):
+        kubernetes = adaptor(template())
+        kubernetes.translate()
+        self.assertTrue(kubernetes.node_memo)
+        kubernetes.release()
+        self.assertDictEqual({}, kubernetes.node_memo)
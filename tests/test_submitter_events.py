@@ -0,0 +1,50 @@
+import threading
+import time
+import unittest
+
+from submitter_events import EventBroker, STATUS, DONE
+
+class TestSubmitterEvents(unittest.TestCase):
+    """ UnitTests for submitter_events """
+
+    def setUp(self):
+        self.broker = EventBroker(backlog=3)
+
+    def test_publish_fans_out_to_every_subscriber_of_app(self):
+        first, second = self.broker.subscribe("app"), self.broker.subscribe("app")
+        other = self.broker.subscribe("other")
+        self.broker.publish("app", STATUS, status={"KubernetesAdaptor": "Executed"})
+        for events in (first, second):
+            event = events.get_nowait()
+            self.assertEqual(STATUS, event["event"])
+            self.assertEqual("app", event["id"])
+            self.assertDictEqual({"KubernetesAdaptor": "Executed"}, event["status"])
+        self.assertTrue(other.empty())
+
+    def test_unsubscribed_queue_gets_nothing(self):
+        events = self.broker.subscribe("app")
+        self.broker.unsubscribe("app", events)
+        self.broker.publish("app", DONE, action="launch")
+        self.assertTrue(events.empty())
+
+    def test_full_queue_drops_oldest_event(self):
+        events = self.broker.subscribe("app")
+        for position in range(5):
+            self.broker.publish("app", STATUS, position=position)
+        self.assertEqual(3, events.qsize())
+        self.assertListEqual([2, 3, 4], [events.get_nowait()["position"] for _ in range(3)])
+
+    def test_publish_bumps_app_and_global_versions(self):
+        self.broker.publish("app", STATUS)
+        self.broker.publish("other", STATUS)
+        self.assertEqual(1, self.broker.version("app"))
+        self.assertEqual(2, self.broker.version())
+
+    def test_wait_wakes_on_publish(self):
+        threading.Timer(0.1, self.broker.publish, ("app", STATUS)).start()
+        start = time.time()
+        self.assertEqual(1, self.broker.wait("app", 0, timeout=5))
+        self.assertLess(time.time() - start, 5)
+
+    def test_wait_returns_same_version_on_timeout(self):
+        self.assertEqual(0, self.broker.wait("app", 0, timeout=0.1))
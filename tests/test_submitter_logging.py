@@ -0,0 +1,52 @@
+import json
+import logging
+import os
+import tempfile
+import time
+import unittest
+
+import submitter_logging
+from submitter_logging import JsonFormatter, RateLimitFilter
+
+def record(name="submitter.test", level=logging.INFO, msg="deployed %s", args=("app",)):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+class TestSubmitterLogging(unittest.TestCase):
+    """ UnitTests for submitter_logging """
+
+    def test_json_formatter_writes_one_object(self):
+        document = json.loads(JsonFormatter().format(record()))
+        self.assertEqual(document["message"], "deployed app")
+        self.assertEqual(document["logger"], "submitter.test")
+        self.assertEqual(document["level"], "INFO")
+
+    def test_rate_limit_drops_burst_per_logger(self):
+        limit = RateLimitFilter(rate=0.001, burst=2)
+        passed = [limit.filter(record()) for _ in range(5)]
+        self.assertEqual(passed, [True, True, False, False, False])
+        self.assertTrue(limit.filter(record(name="submitter.other")))
+
+    def test_rate_limit_lets_errors_through(self):
+        limit = RateLimitFilter(rate=0.001, burst=1)
+        limit.filter(record())
+        self.assertTrue(limit.filter(record(level=logging.ERROR)))
+
+    def test_rate_limit_counts_dropped_records(self):
+        limit = RateLimitFilter(rate=100, burst=1)
+        limit.filter(record())
+        self.assertFalse(limit.filter(record()))
+        time.sleep(0.05)
+        late = record()
+        self.assertTrue(limit.filter(late))
+        self.assertEqual(late.getMessage(), "[1 records dropped by rate limit] deployed app")
+
+    def test_setup_writes_through_listener(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "submitter.log")
+            submitter_logging.setup(logging.INFO, path, submitter_logging.JSON)
+            logging.getLogger("submitter.test").debug("hidden %s", "debug")
+            logging.getLogger("submitter.test").info("launched %s", "app")
+            submitter_logging.shutdown()
+            with open(path) as log:
+                lines = [json.loads(line) for line in log]
+        self.assertEqual([line["message"] for line in lines], ["launched app"])
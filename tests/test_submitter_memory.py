@@ -0,0 +1,80 @@
+import os
+import tempfile
+import tracemalloc
+import unittest
+
+from submitter_memory import MemoryTracker, REPORTS
+from submitter_store import StateStore
+
+class TestSubmitterMemory(unittest.TestCase):
+    """ UnitTests for submitter_memory """
+
+    def setUp(self):
+        """ Setup a tracker without state store """
+        self.memory = MemoryTracker()
+
+    def tearDown(self):
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def test_phase_records_rss(self):
+        self.memory.start_job("app")
+        with self.memory.phase("app", "translate"):
+            pass
+        phase = self.memory.report("app")["phases"]["translate"]
+        self.assertGreater(phase["rss_after"], 0)
+        self.assertNotIn("allocations", phase)
+
+    def test_repeated_phase_keeps_first_rss_before(self):
+        self.memory.start_job("app")
+        with self.memory.phase("app", "translate"):
+            pass
+        first = self.memory.report("app")["phases"]["translate"]["rss_before"]
+        with self.memory.phase("app", "translate"):
+            pass
+        self.assertEqual(self.memory.report("app")["phases"]["translate"]["rss_before"], first)
+
+    def test_tracemalloc_diff_shows_allocating_line(self):
+        self.memory.configure(True, top=5)
+        self.memory.start_job("app")
+        with self.memory.phase("app", "parse"):
+            data = [bytearray(1024) for _ in range(500)]
+        self.assertEqual(500, len(data))
+        allocations = self.memory.report("app")["phases"]["parse"]["allocations"]
+        self.assertTrue(any("test_submitter_memory.py" in item["where"] and item["size_kb"] > 400
+                            for item in allocations))
+        self.assertTrue(self.memory.process()["tracemalloc"])
+
+    def test_start_job_stops_tracemalloc_when_turned_off(self):
+        self.memory.configure(True)
+        self.memory.start_job("app")
+        self.memory.configure(False)
+        self.memory.start_job("app")
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertEqual(self.memory.report("app")["phases"], {})
+
+    def test_store_gets_report_once_job_is_saved(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        store = StateStore(os.path.join(directory.name, "submitter.db"))
+        memory = MemoryTracker(store=store)
+        memory.start_job("app")
+        version = store.settings_version()
+        for phase in ("parse", "translate", "execute"):
+            with memory.phase("app", phase):
+                pass
+        self.assertEqual(version, store.settings_version())
+        self.assertEqual({}, store.setting(REPORTS, {}))
+        memory.save("app")
+        self.assertListEqual(["execute", "parse", "translate"], sorted(store.setting(REPORTS)["app"]["phases"]))
+
+    def test_settings_cached_until_refresh(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        store = StateStore(os.path.join(directory.name, "submitter.db"))
+        memory, other = MemoryTracker(store=store), MemoryTracker(store=store)
+        other.configure(True, top=3)
+        self.assertFalse(memory.settings()["enabled"])
+        memory.refresh()
+        self.assertTrue(memory.settings()["enabled"])
+        self.assertEqual(3, memory.settings()["top"])
@@ -0,0 +1,67 @@
+import json
+import os
+import tempfile
+import unittest
+
+import submitter_metrics as metrics
+
+class TestSubmitterMetrics(unittest.TestCase):
+    """ UnitTests for submitter_metrics """
+
+    def setUp(self):
+        """ Setup a registry of its own with one metric of each type """
+        self.registry = metrics.Registry()
+        self.counter = metrics.Counter("test_total", "A counter", ["adaptor"], registry=self.registry)
+        self.gauge = metrics.Gauge("test_depth", "A gauge", registry=self.registry)
+        self.histogram = metrics.Histogram("test_seconds", "A histogram", ["phase"],
+                                           buckets=(1, 5), registry=self.registry)
+
+    def test_counter_renders_sum_per_label(self):
+        self.counter.inc(adaptor="KubernetesAdaptor")
+        self.counter.inc(2, adaptor="KubernetesAdaptor")
+        text = self.registry.render()
+        self.assertIn("# TYPE test_total counter", text)
+        self.assertIn('test_total{adaptor="KubernetesAdaptor"} 3.0', text)
+
+    def test_gauge_renders_last_value(self):
+        self.gauge.set(4)
+        self.gauge.set(2)
+        self.assertIn("test_depth 2.0", self.registry.render())
+
+    def test_histogram_renders_cumulative_buckets(self):
+        for value in (0.5, 3, 10):
+            self.histogram.observe(value, phase="translate")
+        text = self.registry.render()
+        self.assertIn('test_seconds_bucket{phase="translate",le="1.0"} 1.0', text)
+        self.assertIn('test_seconds_bucket{phase="translate",le="5.0"} 2.0', text)
+        self.assertIn('test_seconds_bucket{phase="translate",le="+Inf"} 3.0', text)
+        self.assertIn('test_seconds_sum{phase="translate"} 13.5', text)
+        self.assertIn('test_seconds_count{phase="translate"} 3.0', text)
+
+    def test_wrong_labels_raise(self):
+        with self.assertRaises(ValueError):
+            self.counter.inc(phase="translate")
+
+    def test_render_adds_up_other_processes(self):
+        self.counter.inc(adaptor="OccopusAdaptor")
+        self.gauge.set(1)
+        with tempfile.TemporaryDirectory() as directory:
+            self.registry.directory = directory
+            other = {"test_total": [[["OccopusAdaptor"], 4]],
+                     "test_seconds": [[["execute"], [[1, 1], 0.5, 1]]]}
+            with open(os.path.join(directory, "{}.json".format(os.getppid())), "w") as dump:
+                json.dump(other, dump)
+            text = self.registry.render()
+        self.assertIn('test_total{adaptor="OccopusAdaptor"} 5.0', text)
+        self.assertIn('test_seconds_count{phase="execute"} 1.0', text)
+        self.assertIn("test_depth 1.0", text)
+
+    def test_dump_writes_export_of_the_process(self):
+        self.histogram.observe(2, phase="parse")
+        with tempfile.TemporaryDirectory() as directory:
+            self.registry.directory = directory
+            self.registry.dump()
+            with open(os.path.join(directory, "{}.json".format(os.getpid()))) as dump:
+                export = json.load(dump)
+        self.assertEqual(export["test_seconds"], [[["parse"], [[0, 1], 2.0, 1]]])
+        self.assertNotIn("test_depth", export)
@@ -0,0 +1,53 @@
+import unittest
+
+from submitter_pool import AdaptorPool
+
+class FakeAdaptor(object):
+    """ Adaptor recording its lifecycle calls """
+
+    def __init__(self, fail_close=False):
+        self.calls = []
+        self.fail_close = fail_close
+
+    def release(self):
+        self.calls.append("release")
+
+    def close(self):
+        self.calls.append("close")
+        if self.fail_close:
+            raise IOError("connection lost")
+
+class TestSubmitterPool(unittest.TestCase):
+    """ UnitTests for submitter_pool """
+
+    def setUp(self):
+        self.pool = AdaptorPool()
+
+    def test_put_releases_and_keeps_instances(self):
+        adaptor = FakeAdaptor()
+        self.pool.put("app", {"KubernetesAdaptor": adaptor})
+        self.assertIs(self.pool.get("app")["KubernetesAdaptor"], adaptor)
+        self.assertListEqual(["release"], adaptor.calls)
+        self.assertListEqual(["app"], self.pool.apps())
+
+    def test_put_closes_replaced_instance_only(self):
+        old, kept = FakeAdaptor(), FakeAdaptor()
+        self.pool.put("app", {"KubernetesAdaptor": old, "PkAdaptor": kept})
+        new = FakeAdaptor()
+        self.pool.put("app", {"KubernetesAdaptor": new, "PkAdaptor": kept})
+        self.assertIn("close", old.calls)
+        self.assertNotIn("close", kept.calls)
+        self.assertIs(self.pool.get("app")["KubernetesAdaptor"], new)
+
+    def test_close_forgets_app_despite_errors(self):
+        first, second = FakeAdaptor(fail_close=True), FakeAdaptor()
+        self.pool.put("app", {"OccopusAdaptor": first, "PkAdaptor": second})
+        self.pool.close("app")
+        self.assertIn("close", second.calls)
+        self.assertDictEqual({}, self.pool.get("app"))
+        self.assertListEqual([], self.pool.apps())
+
+    def test_get_returns_a_copy(self):
+        self.pool.put("app", {"PkAdaptor": FakeAdaptor()})
+        self.pool.get("app").clear()
+        self.assertIn("PkAdaptor", self.pool.get("app"))
@@ -0,0 +1,76 @@
+import os
+import pstats
+import tempfile
+import time
+import unittest
+
+from submitter_profiler import Profiler, CPROFILE, SAMPLING
+from submitter_store import StateStore
+
+def busy(seconds):
+    end = time.time() + seconds
+    while time.time() < end:
+        sum(range(1000))
+
+class TestSubmitterProfiler(unittest.TestCase):
+    """ UnitTests for submitter_profiler """
+
+    def setUp(self):
+        """ Setup a profiler writing to a temporary directory """
+        self.directory = tempfile.TemporaryDirectory()
+        self.profiler = Profiler(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_disarmed_profiler_claims_nothing(self):
+        self.assertIsNone(self.profiler.claim())
+
+    def test_armed_jobs_are_used_up(self):
+        self.profiler.arm(jobs=2, mode=SAMPLING)
+        self.assertEqual(self.profiler.claim(), SAMPLING)
+        self.assertEqual(self.profiler.claim(), SAMPLING)
+        self.assertIsNone(self.profiler.claim())
+
+    def test_time_window_does_not_use_up_jobs(self):
+        self.profiler.arm(seconds=60)
+        for _ in range(3):
+            self.assertEqual(self.profiler.claim(), CPROFILE)
+        self.profiler.disarm()
+        self.assertFalse(self.profiler.state()["active"])
+
+    def test_unknown_mode_raises(self):
+        with self.assertRaises(ValueError):
+            self.profiler.arm(jobs=1, mode="perf")
+
+    def test_cprofile_writes_pstats(self):
+        with self.profiler.profile("app/1", "launch", CPROFILE):
+            busy(0.01)
+        profiles = self.profiler.profiles()
+        self.assertEqual(len(profiles), 1)
+        self.assertTrue(profiles[0]["name"].startswith("app_1_launch_"))
+        pstats.Stats(os.path.join(self.directory.name, profiles[0]["name"]))
+
+    def test_sampling_writes_collapsed_stacks(self):
+        with self.profiler.profile("app", "update", SAMPLING):
+            busy(0.1)
+        name = self.profiler.profiles()[0]["name"]
+        self.assertTrue(name.endswith(".collapsed"))
+        with open(os.path.join(self.directory.name, name)) as collapsed:
+            self.assertIn("busy", collapsed.read())
+
+    def test_no_mode_writes_nothing(self):
+        with self.profiler.profile("app", "undeploy", None):
+            pass
+        self.assertEqual(self.profiler.profiles(), [])
+
+    def test_state_cached_until_refresh(self):
+        store = StateStore(os.path.join(self.directory.name, "submitter.db"))
+        profiler, other = Profiler(self.directory.name, store=store), Profiler(self.directory.name, store=store)
+        other.arm(jobs=1)
+        self.assertFalse(profiler.state()["active"])
+        profiler.refresh()
+        self.assertTrue(profiler.state()["active"])
+        self.assertEqual(profiler.claim(), CPROFILE)
+        # the job was used up in the store, not only in the cache of this process
+        self.assertIsNone(other.claim())
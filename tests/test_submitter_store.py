@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from submitter_store import StateStore, RUNNING, DONE, FAILED
+
+class TestSubmitterStore(unittest.TestCase):
+    """ UnitTests for submitter_store """
+
+    def setUp(self):
+        """ Setup a store in a temporary directory """
+        self.directory = tempfile.mkdtemp()
+        self.store = StateStore(os.path.join(self.directory, "submitter.db"))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_claim_serializes_jobs_of_app(self):
+        first = self.store.enqueue("app", "launch", {})
+        second = self.store.enqueue("app", "update", {})
+        other = self.store.enqueue("other", "launch", {})
+        self.assertEqual(first, self.store.claim()["seq"])
+        # the update waits for the launch of the same app, not the launch of another app
+        self.assertEqual(other, self.store.claim()["seq"])
+        self.assertIsNone(self.store.claim())
+        self.store.finish(first)
+        self.assertEqual(second, self.store.claim()["seq"])
+
+    def test_claim_returns_payload(self):
+        self.store.enqueue("app", "launch", {"dry_run": True})
+        job = self.store.claim()
+        self.assertEqual(("app", "launch"), (job["app_id"], job["action"]))
+        self.assertDictEqual({"dry_run": True}, job["payload"])
+        self.assertEqual(1, self.store.count(RUNNING))
+
+    def test_fail_running_on_takeover(self):
+        self.store.enqueue("app", "launch", {})
+        self.store.claim()
+        version = self.store.version("app")
+        self.assertEqual(1, self.store.fail_running("interrupted"))
+        self.assertListEqual([], self.store.jobs(RUNNING))
+        self.assertEqual(1, self.store.count(FAILED))
+        self.assertEqual("interrupted", self.store.last_error("app"))
+        self.assertGreater(self.store.version("app"), version)
+        # the next job of the app is no longer held back by the interrupted one
+        seq = self.store.enqueue("app", "undeploy", {})
+        self.assertEqual(seq, self.store.claim()["seq"])
+
+    def test_finish_without_error_is_done(self):
+        seq = self.store.enqueue("app", "launch", {})
+        self.store.claim()
+        self.store.finish(seq)
+        self.assertEqual(1, self.store.count(DONE))
+        self.assertEqual("", self.store.last_error("app"))
+
+    def test_setting_bumps_settings_version_only(self):
+        self.store.save_app("app", {})
+        versions, version = self.store.versions(), self.store.version()
+        settings = self.store.settings_version()
+        self.store.update_setting("profiling", lambda old: dict(jobs=1), {})
+        self.assertGreater(self.store.settings_version(), settings)
+        self.assertDictEqual(versions, self.store.versions())
+        self.assertEqual(version, self.store.version())
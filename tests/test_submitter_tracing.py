@@ -0,0 +1,74 @@
+import fcntl
+import os
+import tempfile
+import threading
+import unittest
+
+from submitter_tracing import Tracer, NO_SPAN
+
+class TestSubmitterTracing(unittest.TestCase):
+    """ UnitTests for submitter_tracing """
+
+    def setUp(self):
+        """ Setup a tracer exporting to a temporary file """
+        self.directory = tempfile.TemporaryDirectory()
+        self.tracer = Tracer(os.path.join(self.directory.name, "traces.jsonl"))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_span_outside_trace_does_nothing(self):
+        with self.tracer.span("kubectl") as span:
+            self.assertIs(span, NO_SPAN)
+        self.assertEqual(self.tracer.traces(None), [])
+
+    def test_spans_nest_under_the_trace(self):
+        with self.tracer.trace("app", "launch") as root:
+            with self.tracer.span("translate") as parent:
+                with self.tracer.span("kubectl", command="kubectl create") as child:
+                    child.set(file_size=10)
+        trace = self.tracer.traces("app")[0]
+        spans = {span["name"]: span for span in trace["spans"]}
+        self.assertEqual(trace["name"], "launch")
+        self.assertEqual(spans["translate"]["parent_id"], root.span_id)
+        self.assertEqual(spans["kubectl"]["parent_id"], parent.span_id)
+        self.assertEqual(spans["kubectl"]["attributes"], {"command": "kubectl create", "file_size": 10})
+
+    def test_error_is_recorded_and_raised(self):
+        with self.assertRaises(ValueError):
+            with self.tracer.trace("app", "update"):
+                raise ValueError("bad template")
+        span = self.tracer.traces("app")[0]["spans"][0]
+        self.assertEqual(span["error"], "ValueError: bad template")
+
+    def test_trace_continues_with_trace_id(self):
+        with self.tracer.trace("app", "launch", stage="validate") as request:
+            pass
+        with self.tracer.trace("app", "launch", trace_id=request.trace_id, stage="run"):
+            pass
+        with self.tracer.trace("other", "launch"):
+            pass
+        traces = self.tracer.traces("app")
+        self.assertEqual(len(traces), 1)
+        self.assertEqual(len(traces[0]["spans"]), 2)
+
+    def test_full_file_is_rotated(self):
+        self.tracer.max_bytes = 1
+        for action in ("launch", "update", "undeploy"):
+            with self.tracer.trace("app", action):
+                pass
+        self.assertTrue(os.path.exists(self.tracer.path + ".1"))
+        self.assertEqual([trace["name"] for trace in self.tracer.traces("app")], ["update", "undeploy"])
+
+    def test_export_waits_for_lock_held_by_other_process(self):
+        def launch():
+            with self.tracer.trace("app", "launch"):
+                pass
+        exporting = threading.Thread(target=launch)
+        with open(self.tracer.path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            exporting.start()
+            exporting.join(0.2)
+            self.assertFalse(os.path.exists(self.tracer.path))
+        exporting.join(5)
+        self.assertEqual([trace["name"] for trace in self.tracer.traces("app")], ["launch"])
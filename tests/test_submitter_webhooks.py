@@ -0,0 +1,57 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import requests
+
+from submitter_webhooks import WebhookSender, valid_callback
+
+URL = "http://callback.example/done"
+
+class TestSubmitterWebhooks(unittest.TestCase):
+    """ UnitTests for submitter_webhooks """
+
+    def setUp(self):
+        self.sender = WebhookSender(retries=3, backoff=2)
+        self.sleeps = []
+        patcher = mock.patch("submitter_webhooks.time.sleep", self.sleeps.append)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def deliver(self, *answers):
+        """ Deliver a document, the POSTs answering in turn each of answers (a status or an exception) """
+        answers = list(answers)
+        def post(url, json=None, timeout=None):
+            answer = answers.pop(0)
+            if isinstance(answer, Exception):
+                raise answer
+            return SimpleNamespace(status_code=answer)
+        with mock.patch("submitter_webhooks.requests.post", side_effect=post) as posted:
+            self.sender._deliver(URL, {"id": "app"})
+        return posted
+
+    def test_delivered_first_time_does_not_wait(self):
+        posted = self.deliver(200)
+        self.assertEqual(1, posted.call_count)
+        self.assertListEqual([], self.sleeps)
+
+    def test_retries_with_backoff_until_delivered(self):
+        posted = self.deliver(requests.exceptions.ConnectionError("refused"), 503, 200)
+        self.assertEqual(3, posted.call_count)
+        self.assertListEqual([2, 4], self.sleeps)
+
+    def test_client_error_is_not_retried(self):
+        posted = self.deliver(404)
+        self.assertEqual(1, posted.call_count)
+
+    def test_gives_up_after_last_try(self):
+        with self.assertLogs("submitter.submitter_webhooks", level="ERROR") as logs:
+            posted = self.deliver(500, 502, 503)
+        self.assertEqual(3, posted.call_count)
+        self.assertListEqual([2, 4], self.sleeps)
+        self.assertIn("giving up", logs.output[0])
+
+    def test_valid_callback(self):
+        self.assertTrue(valid_callback(URL))
+        self.assertFalse(valid_callback("ftp://callback.example/done"))
+        self.assertFalse(valid_callback(None))
@@ -3,6 +3,7 @@ import string
 import ruamel.yaml as yaml
 from six.moves import urllib
 import codecs
+import hashlib
 import logging
 logger=logging.getLogger("submitter."+__name__)
 
@@ -27,15 +28,27 @@ def dump_list_yaml(data, path):
 
 def get_yaml_data(path):
     """ Retrieve the yaml dictionary form a yaml file and return it """
-    logger.debug("{}".format(path))
+    logger.debug("%s", path)
     try:
         f = urllib.request.urlopen(str(path))
     except ValueError as exc:
-        logger.error("file is local: {}".format(exc))
+        logger.error("file is local: %s", exc)
         f = codecs.open(path, encoding='utf-8', errors='strict')
     return yaml.round_trip_load(f.read())
 
 
+def file_digest(path):
+    """ Return the sha256 of a file, or None if it cannot be read """
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(65536), b''):
+                digest.update(block)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
 def id_generator(size=8, chars=string.ascii_uppercase + string.digits):
     """ Generate an ID """
     return ''.join(random.choice(chars) for _ in range(size))